@@ -4,8 +4,9 @@ Grid actions.
 Should be used in replay and undo features.
 """
 
-from dataclasses import dataclass, field
-from layer_util import Layer
+from array import array
+from dataclasses import dataclass
+from layer_util import Layer, get_layers
 from grid import Grid
 
 @dataclass
@@ -23,25 +24,58 @@ class PaintStep:
         sq.add(self.affected_layer)
 
 
-@dataclass
+@dataclass(init=False)
 class PaintAction:
+    """
+    A set of paint steps (or a special), undone and redone as one.
+
+    Steps are stored packed as (x, y, layer index) triples of unsigned ints,
+    12 bytes per step; `steps` rebuilds them as PaintStep objects on demand,
+    as a tuple, since changing it would not change the action (use add_step).
+    """
 
-    steps: list[PaintStep] = field(default_factory=list)
+    packed_steps: array
     is_special: bool = False
 
+    # rough size of the action object itself and of the header of its array, in bytes
+    OVERHEAD_BYTES = 200
+
+    def __init__(self, steps: list[PaintStep] | None = None, is_special: bool = False):
+        self.packed_steps = array("I")
+        self.is_special = is_special
+        if steps is not None:
+            for step in steps:
+                self.add_step(step)
+
+    @property
+    def steps(self) -> tuple[PaintStep, ...]:
+        layers = get_layers()
+        packed = self.packed_steps
+        return tuple(
+            PaintStep((packed[i], packed[i+1]), layers[packed[i+2]])
+            for i in range(0, len(packed), 3)
+        )
+
+    def step_count(self) -> int:
+        return len(self.packed_steps) // 3
+
+    def estimated_bytes(self) -> int:
+        return self.OVERHEAD_BYTES + self.packed_steps.itemsize * len(self.packed_steps)
+
     def undo_apply(self, grid: Grid):
         if self.is_special:
             grid.special()
             return
-        for step in self.steps:
-            step.undo_apply(grid)
+        grid.erase_packed(self.packed_steps)
 
     def redo_apply(self, grid: Grid):
         if self.is_special:
             grid.special()
             return
-        for step in self.steps:
-            step.redo_apply(grid)
+        grid.add_packed(self.packed_steps)
 
     def add_step(self, step: PaintStep):
-        self.steps.append(step)
+        self.add_square(step.affected_grid_square[0], step.affected_grid_square[1], step.affected_layer.index)
+
+    def add_square(self, x: int, y: int, layer_index: int):
+        self.packed_steps.extend((x, y, layer_index))
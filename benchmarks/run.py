@@ -0,0 +1,289 @@
+"""
+Benchmarks of the hot paths, for every draw style and a range of grid sizes, written as JSON:
+
+    python -m benchmarks.run --sizes 32 64 128 --repeat 7 --output results.json
+
+Every benchmark is timed `repeat` times (after one warm-up run), and reported in seconds per operation
+with the median, percentiles, minimum and maximum of the samples. The benchmarks are:
+- construct      Grid(style, size, size), with no pooled stores to reuse
+- composite      get_color of every square of a grid covered by one layer (per layer)
+- paint          PaintSession.on_paint in the middle of the grid (per brush size)
+- stroke         a mouse stroke across the grid, traced as the window does in try_draw
+                 (trace_line between mouse positions, one on_paint_stroke per position)
+- special        Grid.special on a painted grid
+- undo / redo    PaintSession.on_undo / on_redo, N times
+- undo_many / redo_many  the same N actions at once
+- replay         PaintSession replaying N actions, on a virtual clock so the frame budget never runs out
+Sizes above a few hundred squares a side take minutes per draw style: choose them with --sizes.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import platform
+import sys
+from time import perf_counter
+from brush import trace_line
+from clock import VirtualClock
+from grid import Grid
+from layer_util import get_layers
+from paint_session import PaintSession
+from replay import ReplayTracker
+import layers  # registers the layers
+
+SIZES = (32, 64, 128, 256, 512, 1024)
+BRUSH_SIZES = (0, 1, 2, 4, 8, 16, 32, 64)
+PERCENTILES = (10, 25, 75, 90, 99)
+BENCHMARKS = ("construct", "composite", "paint", "stroke", "special", "undo", "redo", "undo_many", "redo_many", "replay")
+BG = (255, 255, 255)
+# mouse positions per stroke
+STROKE_POINTS = 32
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    """The p-th percentile of sorted samples, interpolating linearly between the closest two."""
+    position = (len(ordered) - 1) * p / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    summary = {
+        "samples": len(ordered),
+        "median": percentile(ordered, 50),
+        "min": ordered[0],
+        "max": ordered[-1],
+        "mean": sum(ordered) / len(ordered),
+    }
+    for p in PERCENTILES:
+        summary["p{0}".format(p)] = percentile(ordered, p)
+    return summary
+
+
+def measure(run, repeat: int, operations: int = 1, setup=None) -> list[float]:
+    """
+    Times run() repeat times, after a warm-up run; setup() is called before every run, untimed.
+    Returns the seconds per operation of every run.
+    """
+    samples = []
+    for index in range(repeat + 1):
+        if setup is not None:
+            setup()
+        start = perf_counter()
+        run()
+        elapsed = perf_counter() - start
+        if index > 0:
+            samples.append(elapsed / operations)
+    return samples
+
+
+def layer_list() -> list:
+    return [layer for layer in get_layers() if layer is not None]
+
+
+def cover(grid: Grid, layer) -> None:
+    """Adds a layer to every square of a grid."""
+    for x in range(grid.num_of_cols):
+        for y in range(grid.num_of_rows):
+            grid[x][y].add(layer)
+
+
+def bench_construct(style: str, size: int, repeat: int) -> list[tuple[dict, list[float]]]:
+    grids = []
+
+    def run():
+        grids.append(Grid(style, size, size))
+
+    return [({}, measure(run, repeat, setup=grids.clear))]
+
+
+def bench_composite(style: str, size: int, repeat: int) -> list[tuple[dict, list[float]]]:
+    results = []
+    grid = Grid(style, size, size)
+    for layer in layer_list():
+        grid.clear()
+        cover(grid, layer)
+
+        def run():
+            for x in range(size):
+                column = grid[x]
+                for y in range(size):
+                    column[y].get_color(BG, 1.5, x, y)
+
+        results.append(({"layer": layer.name}, measure(run, repeat, size * size)))
+    grid.release()
+    return results
+
+
+def bench_paint(session: PaintSession, size: int, repeat: int, brush_sizes: list[int]) -> list[tuple[dict, list[float]]]:
+    results = []
+    layer = layer_list()[0]
+    for brush_size in brush_sizes:
+        session.reset()
+        session.grid.brush_size = brush_size
+
+        def run():
+            session.on_paint(layer, size // 2, size // 2)
+
+        # every paint is undone before the next one, so they all paint the same empty squares
+        results.append(({"brush": brush_size}, measure(run, repeat, setup=session.on_undo)))
+    return results
+
+
+def bench_stroke(session: PaintSession, size: int, repeat: int) -> list[tuple[dict, list[float]]]:
+    layer = layer_list()[0]
+    # mouse positions in grid squares, from one corner to the other along a curve
+    points = [(size * i / STROKE_POINTS, size * (i / STROKE_POINTS) ** 2) for i in range(STROKE_POINTS + 1)]
+
+    def run():
+        session.on_stroke_start()
+        prev = None
+        for x, y in points:
+            if prev is None:
+                path = [(int(x), int(y))]
+            else:
+                path = trace_line(prev[0], prev[1], x, y)
+            path = [(px, py) for px, py in path if 0 <= px < size and 0 <= py < size]
+            if len(path) != 0:
+                session.on_paint_stroke(layer, path)
+            prev = (x, y)
+        session.on_stroke_end()
+
+    session.reset()
+    session.grid.brush_size = Grid.DEFAULT_BRUSH_SIZE
+    # every stroke is undone before the next one, as a single action
+    return [({"points": len(points)}, measure(run, repeat, setup=session.on_undo))]
+
+
+def bench_special(style: str, size: int, repeat: int) -> list[tuple[dict, list[float]]]:
+    grid = Grid(style, size, size)
+    for layer in layer_list()[::2]:
+        cover(grid, layer)
+    samples = measure(grid.special, repeat)
+    grid.release()
+    return [({}, samples)]
+
+
+def paint_actions(session: PaintSession, size: int, count: int) -> None:
+    """Records count paint actions, all over the grid."""
+    session.reset()
+    session.grid.brush_size = Grid.DEFAULT_BRUSH_SIZE
+    layer_cycle = layer_list()
+    for i in range(count):
+        session.on_paint(layer_cycle[i % len(layer_cycle)], i * 7 % size, i * 13 % size)
+
+
+def bench_history(session: PaintSession, size: int, repeat: int, actions: int) -> dict[str, list[tuple[dict, list[float]]]]:
+    paint_actions(session, size, actions)
+    count = session.my_undo_tracker.undo_count()
+    samples = {"undo": [], "redo": [], "undo_many": [], "redo_many": []}
+    for index in range(repeat + 1):
+        # every undo run is followed by the redo run that brings the history back
+        start = perf_counter()
+        for _ in range(count):
+            session.on_undo()
+        undo_time = perf_counter() - start
+        start = perf_counter()
+        for _ in range(count):
+            session.on_redo()
+        redo_time = perf_counter() - start
+        start = perf_counter()
+        session.on_undo_many(count)
+        undo_many_time = perf_counter() - start
+        start = perf_counter()
+        session.on_redo_many(count)
+        redo_many_time = perf_counter() - start
+        if index > 0:
+            samples["undo"].append(undo_time / count)
+            samples["redo"].append(redo_time / count)
+            samples["undo_many"].append(undo_many_time / count)
+            samples["redo_many"].append(redo_many_time / count)
+    return {name: [({"actions": count}, values)] for name, values in samples.items()}
+
+
+def bench_replay(session: PaintSession, size: int, repeat: int, actions: int) -> list[tuple[dict, list[float]]]:
+    paint_actions(session, size, actions)
+    count = session.my_replay_tracker.action_count()
+
+    def run():
+        session.start_replay()
+        while session.replaying:
+            session.update(count * ReplayTracker.ACTION_INTERVAL)
+
+    return [({"actions": count}, measure(run, repeat, count))]
+
+
+def run_benchmarks(sizes, styles, benchmarks, repeat: int, brush_sizes, actions: int, log=None) -> list[dict]:
+    """Runs the chosen benchmarks; returns one result per benchmark, style, size and parameters."""
+    results = []
+
+    def record(name, style, size, entries):
+        for params, samples in entries:
+            result = {"benchmark": name, "style": style, "size": size, "params": params, "unit": "s/op"}
+            result.update(summarize(samples))
+            results.append(result)
+            if log is not None:
+                print("{0:<10} {1:<8} {2:>5} {3:<20} median {4:.3e} s/op".format(
+                    name, style, size, json.dumps(params), result["median"]), file=log)
+
+    for style in styles:
+        for size in sizes:
+            if "construct" in benchmarks:
+                record("construct", style, size, bench_construct(style, size, repeat))
+            if "composite" in benchmarks:
+                record("composite", style, size, bench_composite(style, size, repeat))
+            if "special" in benchmarks:
+                record("special", style, size, bench_special(style, size, repeat))
+            if not set(benchmarks) & {"paint", "stroke", "undo", "redo", "undo_many", "redo_many", "replay"}:
+                continue
+            session = PaintSession(style, size, size, VirtualClock())
+            if "paint" in benchmarks:
+                record("paint", style, size, bench_paint(session, size, repeat, brush_sizes))
+            if "stroke" in benchmarks:
+                record("stroke", style, size, bench_stroke(session, size, repeat))
+            if set(benchmarks) & {"undo", "redo", "undo_many", "redo_many"}:
+                for name, entries in bench_history(session, size, repeat, actions).items():
+                    if name in benchmarks:
+                        record(name, style, size, entries)
+            if "replay" in benchmarks:
+                record("replay", style, size, bench_replay(session, size, repeat, actions))
+            session.my_replay_tracker.my_replay_log.close()
+            session.grid.release()
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks the hot paths of the painter.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="grid sizes (squares a side)")
+    parser.add_argument("--styles", nargs="+", default=Grid.DRAW_STYLE_OPTIONS, choices=Grid.DRAW_STYLE_OPTIONS, help="draw styles")
+    parser.add_argument("--benchmarks", nargs="+", default=BENCHMARKS, choices=BENCHMARKS, help="benchmarks to run")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("--brushes", type=int, nargs="+", default=BRUSH_SIZES, help="brush sizes of the paint benchmark")
+    parser.add_argument("--actions", type=int, default=256, help="actions of the undo / redo and replay benchmarks")
+    parser.add_argument("--output", default="-", help="JSON file to write the results to, - for stdout")
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or args.actions < 1 or min(args.sizes) < 1:
+        parser.error("--repeat, --actions and --sizes must be positive")
+    if not all(Grid.MIN_BRUSH <= size <= Grid.MAX_BRUSH for size in args.brushes):
+        parser.error("--brushes must be between {0} and {1}".format(Grid.MIN_BRUSH, Grid.MAX_BRUSH))
+
+    report = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "repeat": args.repeat,
+        "results": run_benchmarks(args.sizes, args.styles, args.benchmarks, args.repeat, args.brushes, args.actions, sys.stderr),
+    }
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    else:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=1)
+            file.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Brush stencils and stroke rasterisation.
+
+A stencil describes which squares around the brush centre get painted.
+It is stored as row spans: entry dx + radius holds the half-width w of the
+run of squares [y - w, y + w] painted on row x + dx.
+Stencils are built once per (shape, radius) and shared.
+
+Strokes are traced through the grid with a grid-DDA walk, which visits
+every square the segment passes through exactly once.
+"""
+
+from __future__ import annotations
+from math import floor, inf, isqrt
+
+SHAPE_DIAMOND = "DIAMOND"
+SHAPE_SQUARE = "SQUARE"
+SHAPE_DISC = "DISC"
+SHAPE_OPTIONS = (
+    SHAPE_DIAMOND,
+    SHAPE_SQUARE,
+    SHAPE_DISC,
+)
+
+# (shape, radius) -> tuple of half-widths, one per row offset.
+_stencil_cache: dict[tuple[str, int], tuple[int, ...]] = {}
+
+
+def get_stencil(shape: str, radius: int) -> tuple[int, ...]:
+    """
+    Returns the row spans of the brush with the given shape and radius, building and caching them on first use.
+
+    Args:
+    - shape: one of SHAPE_OPTIONS
+    - radius: non-negative brush size
+
+    Raises:
+    - ValueError if the shape is not one of SHAPE_OPTIONS
+
+    Returns:
+    - tuple of length 2 . radius + 1 with the half-width of every row of the stencil
+
+    Complexity:
+    - Worst case: O(radius) the first time a stencil is requested
+    - Best case: O(1) once it is cached
+    """
+
+    cached = _stencil_cache.get((shape, radius))
+    if cached is not None:
+        return cached
+
+    if shape == SHAPE_DIAMOND:
+        spans = tuple(radius - abs(dx) for dx in range(-radius, radius + 1))
+    elif shape == SHAPE_SQUARE:
+        spans = tuple(radius for _ in range(-radius, radius + 1))
+    elif shape == SHAPE_DISC:
+        spans = tuple(isqrt(radius * radius - dx * dx) for dx in range(-radius, radius + 1))
+    else:
+        raise ValueError("Unknown brush shape: {0}".format(shape))
+
+    _stencil_cache[(shape, radius)] = spans
+    return spans
+
+
+def trace_line(x0: float, y0: float, x1: float, y1: float) -> list[tuple[int, int]]:
+    """
+    Returns the squares crossed by the segment from (x0, y0) to (x1, y1), in the order they are crossed.
+    - Coordinates are measured in squares, so (2.5, 0.5) is the centre of square (2, 0)
+    - Consecutive squares always share an edge, so no square between two mouse samples is skipped
+
+    Args:
+    - x0, y0: start of the segment
+    - x1, y1: end of the segment
+
+    Raises:
+    - None
+
+    Returns:
+    - list of the (x, y) squares on the segment, starting with the square of (x0, y0) and ending with the square of (x1, y1)
+
+    Complexity:
+    - Worst case: O(|x1 - x0| + |y1 - y0|)
+    - Best case: O(1), when both points lie in the same square
+    """
+
+    x, y = floor(x0), floor(y0)
+    end_x, end_y = floor(x1), floor(y1)
+    dx, dy = x1 - x0, y1 - y0
+
+    step_x = 1 if dx > 0 else -1
+    step_y = 1 if dy > 0 else -1
+    # Distance along the segment (as a fraction of it) to the next vertical / horizontal grid line.
+    t_max_x = ((x + (step_x > 0)) - x0) / dx if dx != 0 else inf
+    t_max_y = ((y + (step_y > 0)) - y0) / dy if dy != 0 else inf
+    t_delta_x = abs(1 / dx) if dx != 0 else inf
+    t_delta_y = abs(1 / dy) if dy != 0 else inf
+
+    squares = [(x, y)]
+    for _ in range(abs(end_x - x) + abs(end_y - y)):
+        # Guard against rounding taking the walk past the end row / column.
+        if y == end_y or (x != end_x and t_max_x < t_max_y):
+            x += step_x
+            t_max_x += t_delta_x
+        else:
+            y += step_y
+            t_max_y += t_delta_y
+        squares.append((x, y))
+    return squares
@@ -0,0 +1,62 @@
+"""
+Clocks for sessions, windows and replays.
+
+Everything that paces itself on time (the frame budgets of replays and of the command queue of the
+window, and the scripts in visuals/, which wait with clock.sleep) reads it from a Clock, so it can be
+swapped for a VirtualClock: simulated time that only moves when it is advanced, frame by frame,
+with no waiting. Runs on a virtual clock are deterministic and take no longer than the work they do.
+"""
+
+from __future__ import annotations
+import time
+
+
+class Clock:
+    """
+    Wall clock time, the clock used unless another one is given.
+    """
+
+    def now(self) -> float:
+        """Seconds since an arbitrary point."""
+        return time.perf_counter()
+
+    def sleep(self, seconds: float) -> None:
+        """Waits until seconds have passed."""
+        time.sleep(seconds)
+
+
+class VirtualClock(Clock):
+    """
+    Simulated time, starting at 0. It moves forward by one frame_time at a time when advanced,
+    calling every listener with the duration of the frame after each step, e.g. PaintSession.update.
+    """
+
+    FRAME_TIME = 1 / 60
+
+    def __init__(self, frame_time: float = FRAME_TIME) -> None:
+        self.time = 0.0
+        self.frame_time = frame_time
+        # time sleep was asked for beyond the last whole frame, carried over to the next call
+        self.pending = 0.0
+        self.listeners = []
+
+    def now(self) -> float:
+        return self.time
+
+    def add_listener(self, listener) -> None:
+        """Calls listener(delta_time) after every frame the clock moves forward."""
+        self.listeners.append(listener)
+
+    def sleep(self, seconds: float) -> None:
+        """Moves forward by the whole frames in seconds, at once."""
+        self.pending += seconds
+        # a little slack, so sleeping a whole number of frames is not a frame short through rounding errors
+        while self.pending >= self.frame_time * (1 - 1e-9):
+            self.pending -= self.frame_time
+            self.step()
+
+    def step(self) -> None:
+        """Moves forward by one frame."""
+        self.time += self.frame_time
+        for listener in self.listeners:
+            listener(self.frame_time)
@@ -0,0 +1,165 @@
+""" Ring buffer implementation.
+
+Defines a bounded double ended sequence stored in a circular array. When
+it is full, appending a new item evicts the oldest one instead of
+failing. Items are indexed from the oldest (0) to the newest. Also
+defines UnitTests for the class.
+"""
+__docformat__ = 'reStructuredText'
+
+import unittest
+from typing import Generic
+from data_structures.referential_array import ArrayR, T
+
+class RingBuffer(Generic[T]):
+    """ Bounded sequence that evicts its oldest item when full.
+
+    Attributes:
+         length (int): number of elements in the buffer
+         front (int): index in the array of the oldest element
+         array (ArrayR[T]): circular array storing the elements
+
+    ArrayR cannot create empty arrays. So MIN_CAPACITY used to avoid this.
+    """
+    MIN_CAPACITY = 1
+
+    def __init__(self, max_capacity: int) -> None:
+        self.length = 0
+        self.front = 0
+        self.array = ArrayR(max(self.MIN_CAPACITY, max_capacity))
+
+    def __len__(self) -> int:
+        """ Returns the number of elements in the buffer."""
+        return self.length
+
+    def is_empty(self) -> bool:
+        """ True if the buffer is empty. """
+        return len(self) == 0
+
+    def is_full(self) -> bool:
+        """ True if the buffer is full, so appending evicts the oldest element. """
+        return len(self) == len(self.array)
+
+    def clear(self) -> None:
+        """ Clears all elements from the buffer. """
+        self.truncate(0)
+        self.front = 0
+
+    def _position(self, index: int) -> int:
+        """ Array position of the element with the given index.
+        :raises IndexError: if the index is out of range
+        """
+        if not 0 <= index < len(self):
+            raise IndexError("Index out of range")
+        return (self.front + index) % len(self.array)
+
+    def __getitem__(self, index: int) -> T:
+        """ Returns the element with the given index, 0 being the oldest.
+        :complexity: O(1)
+        """
+        return self.array[self._position(index)]
+
+    def __setitem__(self, index: int, item: T) -> None:
+        """ Replaces the element with the given index, 0 being the oldest.
+        :complexity: O(1)
+        """
+        self.array[self._position(index)] = item
+
+    def append(self, item: T) -> T:
+        """ Adds an element after the newest one.
+        Returns the oldest element if it had to be evicted to make room, None otherwise.
+        :complexity: O(1)
+        """
+        evicted = None
+        if self.is_full():
+            evicted = self.serve()
+        self.array[(self.front + self.length) % len(self.array)] = item
+        self.length += 1
+        return evicted
+
+    def pop(self) -> T:
+        """ Deletes and returns the newest element.
+        :pre: buffer is not empty
+        :raises Exception: if the buffer is empty
+        """
+        if self.is_empty():
+            raise Exception("Buffer is empty")
+        position = self._position(self.length - 1)
+        item = self.array[position]
+        self.array[position] = None
+        self.length -= 1
+        return item
+
+    def serve(self) -> T:
+        """ Deletes and returns the oldest element.
+        :pre: buffer is not empty
+        :raises Exception: if the buffer is empty
+        """
+        if self.is_empty():
+            raise Exception("Buffer is empty")
+        item = self.array[self.front]
+        self.array[self.front] = None
+        self.front = (self.front + 1) % len(self.array)
+        self.length -= 1
+        return item
+
+    def truncate(self, length: int) -> None:
+        """ Deletes the newest elements until only the given number is left.
+        :complexity: O(number of deleted elements), references are dropped
+        """
+        while len(self) > length:
+            self.pop()
+
+
+class TestRingBuffer(unittest.TestCase):
+    """ Tests for the above class."""
+    CAPACITY = 5
+
+    def setUp(self):
+        self.buffer = RingBuffer(self.CAPACITY)
+
+    def test_init(self):
+        self.assertTrue(self.buffer.is_empty())
+        self.assertFalse(self.buffer.is_full())
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_append_and_index(self):
+        for i in range(self.CAPACITY):
+            self.assertIsNone(self.buffer.append(i))
+        self.assertTrue(self.buffer.is_full())
+        for i in range(self.CAPACITY):
+            self.assertEqual(self.buffer[i], i)
+        with self.assertRaises(IndexError):
+            self.buffer[self.CAPACITY]
+
+    def test_evicts_oldest(self):
+        for i in range(self.CAPACITY):
+            self.buffer.append(i)
+        self.assertEqual(self.buffer.append(self.CAPACITY), 0)
+        self.assertEqual(self.buffer.append(self.CAPACITY + 1), 1)
+        self.assertEqual(len(self.buffer), self.CAPACITY)
+        self.assertEqual([self.buffer[i] for i in range(self.CAPACITY)], [2, 3, 4, 5, 6])
+
+    def test_pop_and_serve(self):
+        for i in range(self.CAPACITY + 2):
+            self.buffer.append(i)
+        self.assertEqual(self.buffer.pop(), 6)
+        self.assertEqual(self.buffer.serve(), 2)
+        self.assertEqual(len(self.buffer), 3)
+        self.buffer[0] = 10
+        self.assertEqual([self.buffer[i] for i in range(3)], [10, 4, 5])
+
+    def test_truncate_and_clear(self):
+        for i in range(self.CAPACITY):
+            self.buffer.append(i)
+        self.buffer.truncate(2)
+        self.assertEqual([self.buffer[i] for i in range(len(self.buffer))], [0, 1])
+        self.buffer.clear()
+        self.assertTrue(self.buffer.is_empty())
+        with self.assertRaises(Exception):
+            self.buffer.pop()
+
+if __name__ == '__main__':
+    testtorun = TestRingBuffer()
+    suite = unittest.TestLoader().loadTestsFromModule(testtorun)
+    unittest.TextTestRunner().run(suite)
@@ -0,0 +1,121 @@
+""" Single producer / single consumer ring.
+
+Defines a bounded FIFO queue stored in a circular array, that one thread
+can append to while another one serves from it, without a lock. Also
+defines UnitTests for the class.
+"""
+__docformat__ = 'reStructuredText'
+
+import unittest
+from threading import Thread
+from time import sleep
+from typing import Generic
+from data_structures.referential_array import ArrayR, T
+
+class SPSCRing(Generic[T]):
+    """ Bounded queue shared by one producer thread and one consumer thread.
+
+    Attributes:
+         head (int): number of elements served so far, only written by the consumer
+         tail (int): number of elements appended so far, only written by the producer
+         mask (int): capacity - 1, the capacity being a power of two
+         array (ArrayR[T]): circular array storing the elements
+
+    No lock is needed because each counter has a single writer, and the
+    producer only publishes the new tail once the element is stored (the
+    consumer likewise frees a slot only once it has read it). Assigning a
+    counter or an array slot is atomic under the GIL.
+    """
+    MIN_CAPACITY = 1
+
+    def __init__(self, max_capacity: int) -> None:
+        capacity = self.MIN_CAPACITY
+        while capacity < max_capacity:
+            capacity *= 2
+        self.head = 0
+        self.tail = 0
+        self.mask = capacity - 1
+        self.array = ArrayR(capacity)
+
+    def __len__(self) -> int:
+        """ Returns the number of elements in the ring."""
+        return self.tail - self.head
+
+    def is_empty(self) -> bool:
+        """ True if the ring is empty. """
+        return self.tail == self.head
+
+    def is_full(self) -> bool:
+        """ True if the ring is full and no element can be appended. """
+        return self.tail - self.head == len(self.array)
+
+    def append(self, item: T) -> bool:
+        """ Adds an element at the rear; producer thread only.
+        Returns False, and leaves the ring as it was, if the ring is full.
+        :complexity: O(1)
+        """
+        tail = self.tail
+        if tail - self.head == len(self.array):
+            return False
+        self.array[tail & self.mask] = item
+        self.tail = tail + 1
+        return True
+
+    def serve(self) -> T:
+        """ Deletes and returns the element at the front; consumer thread only.
+        :pre: ring is not empty
+        :raises Exception: if the ring is empty
+        :complexity: O(1)
+        """
+        head = self.head
+        if head == self.tail:
+            raise Exception("Ring is empty")
+        position = head & self.mask
+        item = self.array[position]
+        self.array[position] = None
+        self.head = head + 1
+        return item
+
+
+class TestSPSCRing(unittest.TestCase):
+    """ Tests for the above class."""
+
+    def test_init(self):
+        ring = SPSCRing(5)
+        self.assertEqual(len(ring.array), 8)
+        self.assertTrue(ring.is_empty())
+
+    def test_append_and_serve(self):
+        ring = SPSCRing(4)
+        for i in range(4):
+            self.assertTrue(ring.append(i))
+        self.assertTrue(ring.is_full())
+        self.assertFalse(ring.append(4))
+        self.assertEqual(ring.serve(), 0)
+        self.assertTrue(ring.append(4))
+        self.assertEqual([ring.serve() for _ in range(4)], [1, 2, 3, 4])
+        self.assertRaises(Exception, ring.serve)
+
+    def test_threads(self):
+        ring = SPSCRing(16)
+        count = 20000
+
+        def produce():
+            for i in range(count):
+                while not ring.append(i):
+                    sleep(0)
+
+        producer = Thread(target=produce)
+        producer.start()
+        served = []
+        while len(served) < count:
+            if ring.is_empty():
+                sleep(0)
+            else:
+                served.append(ring.serve())
+        producer.join()
+        self.assertEqual(served, list(range(count)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,11 @@
 from __future__ import annotations
+import sys
+from array import array
 from data_structures.referential_array import ArrayR
 from layer_store import LayerStore
 from layer_store import SetLayerStore , AdditiveLayerStore , SequenceLayerStore
-from layer_util import get_layers
+from layer_util import get_layers, Layer
+from brush import SHAPE_DIAMOND, SHAPE_SQUARE, SHAPE_DISC, SHAPE_OPTIONS, get_stencil
 
 
 class Grid:
@@ -15,24 +18,34 @@ class Grid:
         DRAW_STYLE_SEQUENCE
     )
 
+    BRUSH_SHAPE_DIAMOND = SHAPE_DIAMOND
+    BRUSH_SHAPE_SQUARE = SHAPE_SQUARE
+    BRUSH_SHAPE_DISC = SHAPE_DISC
+    BRUSH_SHAPE_OPTIONS = SHAPE_OPTIONS
+
     DEFAULT_BRUSH_SIZE = 2
-    MAX_BRUSH = 5
+    DEFAULT_BRUSH_SHAPE = BRUSH_SHAPE_DIAMOND
+    MAX_BRUSH = 128
     MIN_BRUSH = 0
 
 
-    def __init__(self, draw_style : DRAW_STYLE_OPTIONS, x : int, y : int) -> None:
+    def __init__(self, draw_style : DRAW_STYLE_OPTIONS, x : int, y : int, store_pool: dict[str, list[LayerStore]] = None) -> None:
         
         """
         Defining the magic method : __init__ 
         - This initialises an object of the Grid class 
             1. initialises the instance variables based on the input parameters
             2. creates an instance of a LayerStore for each grid square based on the draw style
+            3. owns the stores, so my_hash (see state_hash) is updated by every change of them
+        - Given a store pool, stores released to it by grids of the same draw style are reused, empty, before new ones
+          are created, and release gives the stores of this grid back to it
 
         Args:
         - self
         - draw style that is one of set, add or sequence - (DRAW_STYLE_OPTIONS)
         - x - number of coloumns in the grid
         - y - number of rows in the grid
+        - store_pool: released LayerStores by draw style, owned by the caller (e.g. a PaintSession), or None
 
         Raises:
         - None
@@ -49,15 +62,22 @@ class Grid:
         self.num_of_rows = y
         self.my_draw_style = draw_style
         self.brush_size = self.DEFAULT_BRUSH_SIZE
+        self.brush_shape = self.DEFAULT_BRUSH_SHAPE
+        self.my_hash = 0
 
         self.store_array = ArrayR(self.num_of_rows)
 
+        self.my_store_pool = store_pool
+        temp_pool = [] if store_pool is None else store_pool.get(self.my_draw_style, [])
+
         for row_index in range(self.num_of_rows):
             temp_layer_store_array = ArrayR(self.num_of_cols)
             self.store_array[row_index] = temp_layer_store_array
 
             for col_index in range(self.num_of_cols):
-                if self.my_draw_style == self.DRAW_STYLE_SET:
+                if len(temp_pool) > 0:
+                    temp_layer_store = temp_pool.pop()
+                elif self.my_draw_style == self.DRAW_STYLE_SET:
                     temp_layer_store=SetLayerStore()
                 elif self.my_draw_style == self.DRAW_STYLE_ADD:
                     temp_layer_store = AdditiveLayerStore()
@@ -65,6 +85,7 @@ class Grid:
                     temp_layer_store = SequenceLayerStore()
                     
 
+                temp_layer_store.set_owner(self, row_index * self.num_of_cols + col_index + 1)
                 temp_layer_store_array[col_index] = temp_layer_store
 
 
@@ -94,6 +115,29 @@ class Grid:
         return self.store_array[Index]
                 
                 
+    def add_is_idempotent(self) -> bool:
+
+        """
+        Whether painting a layer twice on a square of this grid is the same as painting it once,
+        which depends on the LayerStore used by the draw style
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - ADD_IS_IDEMPOTENT of the LayerStore of the grid squares
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        return self.store_array[0][0].ADD_IS_IDEMPOTENT
+
+
     def increase_brush_size(self):
 
         """
@@ -140,6 +184,399 @@ class Grid:
             self.brush_size = self.brush_size - 1
 
 
+    def change_brush_shape(self):
+
+        """
+        Cycles the brush shape through BRUSH_SHAPE_OPTIONS: diamond -> square -> disc -> diamond
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(len(BRUSH_SHAPE_OPTIONS) . comp)
+        - Best case: O(comp)
+        """
+
+        shape_index = self.BRUSH_SHAPE_OPTIONS.index(self.brush_shape)
+        self.brush_shape = self.BRUSH_SHAPE_OPTIONS[(shape_index + 1) % len(self.BRUSH_SHAPE_OPTIONS)]
+
+
+    def fill_span(self, layer: Layer, x: int, y_start: int, y_end: int, changed: list[tuple[int, int]]) -> None:
+
+        """
+        Adds the layer to every square of row x between y_start and y_end (both inclusive)
+        - The span is clipped to the grid, so it can safely hang over the edges
+        - Every square whose LayerStore was actually changed is appended to changed
+
+        Args:
+        - self
+        - layer of Layer class
+        - x: row of the span
+        - y_start: first square of the span
+        - y_end: last square of the span
+        - changed: list collecting the squares that were changed
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(y_end - y_start . other_function), where other_function is the complexity of add of the LayerStore
+        - Best case: O(comp), when the span lies outside of the grid
+        """
+
+        if x < 0 or x >= self.num_of_rows:
+            return
+
+        row = self.store_array[x]
+        for y in range(max(y_start, 0), min(y_end, self.num_of_cols - 1) + 1):
+            if row[y].add(layer):
+                changed.append((x, y))
+
+
+    def paint(self, layer: Layer, px: int, py: int) -> list[tuple[int, int]]:
+
+        """
+        Paints the layer with the current brush centred on the square (px, py)
+        - Squares outside of the grid are ignored
+
+        Args:
+        - self
+        - layer of Layer class
+        - px: x position of the brush
+        - py: y position of the brush
+
+        Raises:
+        - None
+
+        Returns:
+        - The squares whose LayerStore was actually changed, in row order
+
+        Complexity:
+        - Worst case: O(other_function) - from paint_path
+        - Best case: O(other_function)
+        """
+
+        return self.paint_path(layer, [(px, py)])
+
+
+    def paint_path(self, layer: Layer, path: list[tuple[int, int]]) -> list[tuple[int, int]]:
+
+        """
+        Paints the layer with the current brush along a path of squares, as a single footprint
+        - The cached stencil of the brush is placed on every square of the path, and the row spans it covers are
+          merged per row, so every square of the union is painted exactly once however much the stamps overlap
+        - No per-square distance checks are needed, and squares outside of the grid are ignored
+
+        Args:
+        - self
+        - layer of Layer class
+        - path: list of (x, y) squares the brush is centred on
+
+        Raises:
+        - None
+
+        Returns:
+        - The squares whose LayerStore was actually changed, in row order
+
+        Complexity:
+        - Worst case: O(len(path) . brush_size . log(len(path)) + painted_squares . other_function),
+          where other_function is the complexity of add of the LayerStore
+        - Best case: O(len(path) . brush_size), when the footprint lies outside of the grid
+        """
+
+        spans = get_stencil(self.brush_shape, self.brush_size)
+
+        # row -> list of [start, end] spans covered in that row
+        row_spans: dict[int, list[tuple[int, int]]] = {}
+        for px, py in path:
+            for dx in range(-self.brush_size, self.brush_size + 1):
+                x = px + dx
+                if x < 0 or x >= self.num_of_rows:
+                    continue
+                half_width = spans[dx + self.brush_size]
+                row_spans.setdefault(x, []).append((py - half_width, py + half_width))
+
+        changed = []
+        for x in sorted(row_spans):
+            merged_start, merged_end = None, None
+            for y_start, y_end in sorted(row_spans[x]):
+                if merged_end is not None and y_start <= merged_end + 1:
+                    merged_end = max(merged_end, y_end)
+                    continue
+                if merged_end is not None:
+                    self.fill_span(layer, x, merged_start, merged_end, changed)
+                merged_start, merged_end = y_start, y_end
+            self.fill_span(layer, x, merged_start, merged_end, changed)
+        return changed
+
+
+    def add_packed(self, packed_steps: array) -> None:
+
+        """
+        Adds the layers of a batch of packed paint steps to their squares, in order
+        - packed_steps holds one (x, y, layer index) triple per step, as stored by PaintAction
+
+        Args:
+        - self
+        - packed_steps: flat array of (x, y, layer index) triples
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(len(packed_steps) . other_function), where other_function is the complexity of add of the LayerStore
+        - Best case: O(len(packed_steps) . other_function)
+        """
+
+        layers = get_layers()
+        rows = self.store_array
+        for step_index in range(0, len(packed_steps), 3):
+            rows[packed_steps[step_index]][packed_steps[step_index + 1]].add(layers[packed_steps[step_index + 2]])
+
+
+    def erase_packed(self, packed_steps: array) -> None:
+
+        """
+        Erases the layers of a batch of packed paint steps from their squares, in order
+        - packed_steps holds one (x, y, layer index) triple per step, as stored by PaintAction
+
+        Args:
+        - self
+        - packed_steps: flat array of (x, y, layer index) triples
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(len(packed_steps) . other_function), where other_function is the complexity of erase of the LayerStore
+        - Best case: O(len(packed_steps) . other_function)
+        """
+
+        layers = get_layers()
+        rows = self.store_array
+        for step_index in range(0, len(packed_steps), 3):
+            rows[packed_steps[step_index]][packed_steps[step_index + 1]].erase(layers[packed_steps[step_index + 2]])
+
+
+    def snapshot(self) -> tuple[tuple, ...]:
+
+        """
+        Returns a compact copy of the contents of the whole grid
+        - snapshot[x][y] is the snapshot of the LayerStore of square (x, y), made of ints and tuples only
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - tuple of rows, each a tuple of LayerStore snapshots
+
+        Complexity:
+        - Worst case: O(x . y . other_function), where other_function is the complexity of snapshot of the LayerStore
+        - Best case: O(x . y . other_function)
+        """
+
+        return tuple(
+            tuple(self.store_array[row_index][col_index].snapshot() for col_index in range(self.num_of_cols))
+            for row_index in range(self.num_of_rows)
+        )
+
+
+    @staticmethod
+    def snapshot_bytes(snapshot: tuple[tuple, ...] | None) -> int:
+
+        """
+        Returns the estimated size in bytes of a snapshot
+        - Small ints are shared by every snapshot, so only the states made for this one are counted
+
+        Args:
+        - snapshot: value returned by snapshot, or None
+
+        Raises:
+        - None
+
+        Returns:
+        - int, 0 for None
+
+        Complexity:
+        - Worst case: O(x . y)
+        - Best case: O(1), for None
+        """
+
+        if snapshot is None:
+            return 0
+
+        temp_bytes = sys.getsizeof(snapshot)
+        for row in snapshot:
+            temp_bytes += sys.getsizeof(row)
+            for state in row:
+                if not isinstance(state, int) or not -5 <= state <= 256:
+                    temp_bytes += sys.getsizeof(state)
+        return temp_bytes
+
+
+    def restore(self, snapshot: tuple[tuple, ...] | None) -> None:
+
+        """
+        Sets the contents of the whole grid back to a snapshot
+        - A snapshot of None stands for a freshly created grid
+
+        Args:
+        - self
+        - snapshot: value returned by snapshot, or None
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(x . y . other_function), where other_function is the complexity of restore of the LayerStore
+        - Best case: O(x . y . other_function)
+        """
+
+        if snapshot is None:
+            self.clear()
+            return
+
+        for row_index in range(self.num_of_rows):
+            row = self.store_array[row_index]
+            for col_index in range(self.num_of_cols):
+                row[col_index].restore(snapshot[row_index][col_index])
+
+
+    def clear(self) -> None:
+
+        """
+        Empties every square of the grid in place, as if the grid was freshly created
+        - The LayerStores are cleared rather than created again, so no objects or arrays are allocated
+        - Only the contents are cleared, the brush is kept (restore(None) uses this, e.g. when seeking in the history)
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(x . y . other_function), where other_function is the complexity of clear of the LayerStore
+        - Best case: O(x . y . other_function)
+        """
+
+        for row_index in range(self.num_of_rows):
+            row = self.store_array[row_index]
+            for col_index in range(self.num_of_cols):
+                row[col_index].clear()
+        self.my_hash = 0
+
+
+    def release(self) -> None:
+
+        """
+        Gives the LayerStores of the grid back to the pool of its draw style, for the next grid of that style to reuse
+        - Used when a grid is replaced by one of another style (a mode change): switching back then allocates nothing
+        - The pool of a style holds at most one grid's worth of stores; without a pool, the stores are just dropped
+        - The grid must not be used afterwards
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(x . y . other_function), where other_function is the complexity of clear of the LayerStore
+        - Best case: O(x . y . other_function)
+        """
+
+        if self.my_store_pool is not None:
+            temp_pool = self.my_store_pool.setdefault(self.my_draw_style, [])
+            for row_index in range(self.num_of_rows):
+                row = self.store_array[row_index]
+                for col_index in range(self.num_of_cols):
+                    if len(temp_pool) >= self.num_of_rows * self.num_of_cols:
+                        break
+                    row[col_index].set_owner(None, 0)
+                    row[col_index].clear()
+                    temp_pool.append(row[col_index])
+        self.my_store_pool = None
+        self.store_array = None
+        self.num_of_rows = 0
+        self.num_of_cols = 0
+        self.my_hash = 0
+
+
+    def state_hash(self) -> int:
+
+        """
+        Returns a 64 bit fingerprint of the contents of the grid
+        - Zobrist-style: the XOR over the squares of the hash of their LayerStore times a multiplier of the square,
+          which every add, erase, special and restore of a store updates incrementally; an empty grid hashes to 0
+        - Grids with the same draw style, size and contents have the same hash, across runs too
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - int
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        return self.my_hash
+
+
+    def square_count(self) -> int:
+
+        """
+        Returns the number of squares of the grid
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - x . y
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        return self.num_of_rows * self.num_of_cols
+
+
     def special(self):
         
         """
@@ -162,10 +599,3 @@ class Grid:
         for row_index in range(self.num_of_rows):
             for col_index in range(self.num_of_cols):      
                 self.store_array[row_index][col_index].special()
-
-
-
-
-
-
-                
\ No newline at end of file
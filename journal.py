@@ -0,0 +1,271 @@
+"""
+On-disk undo journal.
+
+Every action of an UndoTracker is appended to a file of fixed size records,
+which is memory-mapped so any action can be read back without keeping it in RAM.
+All records are 4 little-endian uint32 (16 bytes):
+- HEADER   (kind, version, draw style, x << 16 | y), the first record of the file: the grid the history applies to,
+  as a code of the caller (0 if unknown) and its number of columns and rows (version 1 left them 0)
+- STEP     (kind, x, y, layer index), one per paint step, written before the action they belong to
+- ACTION   (kind, parent id + 1, flags, step count), commits the steps just before it as action number `id`,
+  the history then being at the state after it
+- POSITION (kind, id + 1, 0, 0), the history moved to the state after action id (0 for the root)
+- DROP     (kind, id + 1, 0, 0), the branch starting with action id was evicted
+- ROOT     (kind, id + 1, 0, 0), the history was rebased on action id, older actions were evicted
+The file ends at the first record of kind 0 (space grown but not written yet), so steps of an
+action that was never committed (e.g. after a crash) are ignored and written over.
+"""
+
+from __future__ import annotations
+import mmap
+import os
+import sys
+from array import array
+from action import PaintAction
+
+RECORD_SIZE = 16
+VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+
+KIND_END = 0
+KIND_HEADER = 1
+KIND_STEP = 2
+KIND_ACTION = 3
+KIND_POSITION = 4
+KIND_DROP = 5
+KIND_ROOT = 6
+
+FLAG_SPECIAL = 1
+
+
+def _to_bytes(words: array) -> bytes:
+    """Encodes uint32 words in the little-endian layout of the file."""
+    if sys.byteorder == "big":
+        words = array("I", words)
+        words.byteswap()
+    return words.tobytes()
+
+
+def _from_bytes(data) -> array:
+    """Decodes little-endian uint32 words from the file."""
+    words = array("I")
+    words.frombytes(data)
+    if sys.byteorder == "big":
+        words.byteswap()
+    return words
+
+
+class UndoJournal:
+    """
+    Append-only journal of the actions and moves of an UndoTracker, memory-mapped for random access.
+
+    Opening an existing file reads back what was committed to it (see recovered_*), so an UndoTracker can
+    rebuild its history after the application was closed or crashed.
+    """
+
+    # the file grows by at least this many bytes at a time, so it is not remapped on every action
+    GROW_BYTES = 1 << 20
+    # records decoded at once while scanning an existing file
+    SCAN_RECORDS = 1 << 16
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self.map = None
+        self.size = 0
+        self.end = 0
+
+        # per action id: offset of its ACTION record, its parent id + 1, its flags and its step count
+        self.offsets = array("Q")
+        self.parents = array("I")
+        self.flags = array("B")
+        self.step_counts = array("I")
+        # what the last POSITION / ROOT records said, and the ids of every DROP record
+        self.recovered_position = 0
+        self.recovered_root = 0
+        self.recovered_drops = []
+        # the grid of the header
+        self.draw_style = 0
+        self.size_x = 0
+        self.size_y = 0
+
+        if os.fstat(self.fd).st_size < RECORD_SIZE:
+            self.reset()
+        else:
+            self._remap(os.fstat(self.fd).st_size)
+            self._scan()
+
+    def __len__(self) -> int:
+        """Number of actions in the journal."""
+        return len(self.offsets)
+
+    def _remap(self, size: int) -> None:
+        """Grows the file to size bytes (if needed) and maps all of it."""
+        if self.map is not None:
+            self.map.close()
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+        self.size = size
+        self.map = mmap.mmap(self.fd, size)
+
+    def _reserve(self, count: int) -> None:
+        """Makes room for count more records after the end."""
+        needed = self.end + count * RECORD_SIZE
+        if needed > self.size:
+            self._remap(max(needed, self.size + self.GROW_BYTES, 2 * self.size))
+
+    def _write(self, words: array) -> None:
+        """Appends whole records, given as 4 uint32 words each."""
+        self._reserve(len(words) // 4)
+        data = _to_bytes(words)
+        self.map[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def _scan(self) -> None:
+        """Reads back the committed records of an existing file, and sets the end after the last of them."""
+        words = _from_bytes(self.map[0:RECORD_SIZE])
+        if words[0] != KIND_HEADER or words[1] not in SUPPORTED_VERSIONS:
+            raise ValueError("Not an undo journal: {0}".format(self.path))
+        self.draw_style = words[2]
+        self.size_x = words[3] >> 16
+        self.size_y = words[3] & 0xFFFF
+
+        offset = RECORD_SIZE
+        committed_end = offset
+        pending_steps = 0
+        finished = False
+        while not finished and offset < self.size:
+            chunk_end = min(self.size, offset + self.SCAN_RECORDS * RECORD_SIZE)
+            words = _from_bytes(self.map[offset:chunk_end])
+            for word_index in range(0, len(words), 4):
+                kind, first = words[word_index], words[word_index + 1]
+                if kind == KIND_STEP:
+                    pending_steps += 1
+                elif kind == KIND_ACTION and words[word_index + 3] == pending_steps:
+                    self.offsets.append(offset + word_index * 4)
+                    self.parents.append(first)
+                    self.flags.append(words[word_index + 2])
+                    self.step_counts.append(pending_steps)
+                    self.recovered_position = len(self.offsets)
+                    pending_steps = 0
+                elif kind == KIND_POSITION and pending_steps == 0:
+                    self.recovered_position = first
+                elif kind == KIND_DROP and pending_steps == 0:
+                    self.recovered_drops.append(first - 1)
+                elif kind == KIND_ROOT and pending_steps == 0:
+                    self.recovered_root = first
+                else:
+                    # end of the written records, or a torn write
+                    finished = True
+                    break
+                if pending_steps == 0:
+                    committed_end = offset + (word_index + 4) * 4
+            offset = chunk_end
+
+        self.end = committed_end
+        # wipe whatever follows, so a later scan stops at the same place
+        self.map[self.end:self.size] = bytes(self.size - self.end)
+
+    def reset(self, draw_style: int = 0, x: int = 0, y: int = 0) -> None:
+        """Empties the journal, for the history of a grid of the given draw style code, columns and rows (0 if unknown)."""
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        os.ftruncate(self.fd, 0)
+        self._remap(self.GROW_BYTES)
+        self.end = 0
+        self.offsets = array("Q")
+        self.parents = array("I")
+        self.flags = array("B")
+        self.step_counts = array("I")
+        self.recovered_position = 0
+        self.recovered_root = 0
+        self.recovered_drops = []
+        self.draw_style = draw_style
+        self.size_x = x
+        self.size_y = y
+        self._write(array("I", (KIND_HEADER, VERSION, draw_style, x << 16 | y)))
+
+    def append_action(self, action: PaintAction, parent: int) -> int:
+        """
+        Writes an action at the end of the journal.
+
+        Args:
+        - action: the PaintAction to write
+        - parent: id of the action it follows in the history, -1 for the root
+
+        Returns:
+        - the id of the action in the journal
+
+        Complexity:
+        - Worst case: O(action.step_count()), plus a remap when the file has to grow
+        - Best case: O(action.step_count())
+        """
+        packed = action.packed_steps
+        step_count = len(packed) // 3
+        words = array("I", bytes(4 * 4 * (step_count + 1)))
+        words[0:4 * step_count:4] = array("I", [KIND_STEP]) * step_count
+        words[1:4 * step_count:4] = packed[0::3]
+        words[2:4 * step_count:4] = packed[1::3]
+        words[3:4 * step_count:4] = packed[2::3]
+        words[4 * step_count:] = array("I", (KIND_ACTION, parent + 1, FLAG_SPECIAL if action.is_special else 0, step_count))
+        self._write(words)
+
+        self.offsets.append(self.end - RECORD_SIZE)
+        self.parents.append(parent + 1)
+        self.flags.append(FLAG_SPECIAL if action.is_special else 0)
+        self.step_counts.append(step_count)
+        return len(self.offsets) - 1
+
+    def read_action(self, action_id: int) -> PaintAction:
+        """
+        Reads an action back from the journal.
+
+        Complexity:
+        - Worst case: O(step count)
+        - Best case: O(step count)
+        """
+        header = self.offsets[action_id]
+        start = header - self.step_counts[action_id] * RECORD_SIZE
+        words = _from_bytes(self.map[start:header])
+        action = PaintAction([], bool(self.flags[action_id] & FLAG_SPECIAL))
+        packed = array("I", bytes(4 * 3 * self.step_counts[action_id]))
+        packed[0::3] = words[1::4]
+        packed[1::3] = words[2::4]
+        packed[2::3] = words[3::4]
+        action.packed_steps = packed
+        return action
+
+    def is_special(self, action_id: int) -> bool:
+        """Whether the given action is a special, without reading it back."""
+        return bool(self.flags[action_id] & FLAG_SPECIAL)
+
+    def parent_of(self, action_id: int) -> int:
+        """Id of the action before the given one in the history, -1 for the root."""
+        return self.parents[action_id] - 1
+
+    def record_position(self, action_id: int) -> None:
+        """Records that the history moved to the state after the given action, -1 for the root."""
+        self._write(array("I", (KIND_POSITION, action_id + 1, 0, 0)))
+
+    def record_drop(self, action_id: int) -> None:
+        """Records that the branch starting with the given action was evicted."""
+        self._write(array("I", (KIND_DROP, action_id + 1, 0, 0)))
+
+    def record_root(self, action_id: int) -> None:
+        """Records that the history was rebased on the given action."""
+        self._write(array("I", (KIND_ROOT, action_id + 1, 0, 0)))
+
+    def flush(self) -> None:
+        """Writes the mapped changes through to the disk."""
+        self.map.flush()
+
+    def close(self) -> None:
+        """Flushes and closes the journal, if it is still open; the file is kept for recovery."""
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.map = None
+        if self.fd != -1:
+            os.close(self.fd)
+            self.fd = -1
@@ -1,5 +1,6 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
+from random import Random
 from layer_util import Layer , LAYERS , get_layers
 from layers import invert, lighten , darken
 from data_structures.queue_adt import CircularQueue
@@ -8,12 +9,83 @@ from data_structures.array_sorted_list import ArraySortedList
 from data_structures.sorted_list_adt import ListItem
 
 
+# Zobrist keys of the layers by index, and of special for SetLayerStore, for the incremental hash of a store;
+# they are fixed so hashes can be saved and compared across runs
+HASH_MODULUS = (1 << 61) - 1
+_HASH_KEY_SOURCE = Random(0x5A17)
+LAYER_KEYS = tuple(_HASH_KEY_SOURCE.randrange(1, HASH_MODULUS) for _ in range(len(LAYERS)))
+SPECIAL_KEY = _HASH_KEY_SOURCE.randrange(1, HASH_MODULUS)
+# AdditiveLayerStore hashes its ordered layers as a polynomial in HASH_BASE
+HASH_BASE = 0x1D872B41C6A3F5E9 % HASH_MODULUS
+HASH_BASE_INVERSE = pow(HASH_BASE, HASH_MODULUS - 2, HASH_MODULUS)
+HASH_MASK = (1 << 64) - 1
+
+
+HASH_POWERS = [1]
+
+
+def square_multiplier(seed: int) -> int:
+    """
+    Odd 64 bit multiplier of the grid square with the given seed (splitmix64 of it): a store with hash h in that
+    square adds h . multiplier (mod 2^64) to the XOR of its grid, so equal stores in different squares do not cancel
+    out, and an empty store (h = 0) adds nothing.
+    """
+    temp_value = (seed * 0x9E3779B97F4A7C15) & HASH_MASK
+    temp_value = ((temp_value ^ (temp_value >> 30)) * 0xBF58476D1CE4E5B9) & HASH_MASK
+    temp_value = ((temp_value ^ (temp_value >> 27)) * 0x94D049BB133111EB) & HASH_MASK
+    return (temp_value ^ (temp_value >> 31)) | 1
+
+
+def hash_power(exponent: int) -> int:
+    """
+    HASH_BASE ^ exponent mod HASH_MODULUS, from a table grown as needed.
+    """
+    while len(HASH_POWERS) <= exponent:
+        HASH_POWERS.append(HASH_POWERS[-1] * HASH_BASE % HASH_MODULUS)
+    return HASH_POWERS[exponent]
+
 
 class LayerStore(ABC):
 
+    # Whether adding a layer that was just added is guaranteed to change nothing,
+    # so repeated (square, layer) paint steps can be merged away.
+    ADD_IS_IDEMPOTENT = False
+    # Same for erasing a layer that was just erased.
+    ERASE_IS_IDEMPOTENT = False
+    # Whether applying special twice in a row is guaranteed to change nothing.
+    SPECIAL_IS_INVOLUTION = False
+
+    # snapshot of a freshly created store
+    EMPTY_STATE = None
+
+    # incremental hash of the contents, 0 when empty; the owner (a Grid) keeps the XOR over its stores of
+    # my_hash . my_multiplier (see square_multiplier)
+    my_hash = 0
+    my_owner = None
+    my_multiplier = 1
+
     def __init__(self) -> None:
         pass
 
+    def set_owner(self, owner, seed: int) -> None:
+        """
+        Makes the store keep owner.my_hash up to date as its contents change, as the square with the given seed.
+        An owner of None detaches the store.
+        """
+        self.my_owner = owner
+        if owner is None:
+            return
+        self.my_multiplier = square_multiplier(seed)
+        owner.my_hash ^= (self.my_hash * self.my_multiplier) & HASH_MASK
+
+    def _set_hash(self, value: int) -> None:
+        """
+        Sets the hash of the store to a new value, and updates the hash of the owner with the change.
+        """
+        if self.my_owner is not None:
+            self.my_owner.my_hash ^= ((self.my_hash * self.my_multiplier) ^ (value * self.my_multiplier)) & HASH_MASK
+        self.my_hash = value
+
     @abstractmethod
     def add(self, layer: Layer) -> bool:
         """
@@ -44,6 +116,37 @@ class LayerStore(ABC):
         """
         pass
 
+    @abstractmethod
+    def clear(self) -> None:
+        """
+        Empties the store in place, as if it was freshly created.
+        """
+        pass
+
+    @abstractmethod
+    def snapshot(self):
+        """
+        Returns a compact copy of the contents of the store, made of ints and tuples only.
+        """
+        pass
+
+    @abstractmethod
+    def restore(self, state) -> None:
+        """
+        Sets the contents of the store back to a snapshot.
+        """
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def diff_states(before, after) -> tuple[list[int], list[int], bool]:
+        """
+        Returns how to turn a store with snapshot `before` into one with snapshot `after`:
+        the layer indices to erase (in order), then the layer indices to add (in order),
+        and whether special has to be applied at the end.
+        """
+        pass
+
 
 
 class SetLayerStore(LayerStore):
@@ -59,6 +162,12 @@ class SetLayerStore(LayerStore):
     
     is_special = False
 
+    ADD_IS_IDEMPOTENT = True
+    ERASE_IS_IDEMPOTENT = True
+    SPECIAL_IS_INVOLUTION = True
+
+    EMPTY_STATE = 0
+
     # implementing abstract methods given
 
     def __init__(self) -> None:
@@ -107,7 +216,9 @@ class SetLayerStore(LayerStore):
         """
 
         if self.my_layer != layer:
+            temp_old_key = 0 if self.my_layer is None else LAYER_KEYS[self.my_layer.index]
             self.my_layer = layer
+            self._set_hash(self.my_hash ^ temp_old_key ^ LAYER_KEYS[layer.index])
             return True
 
         #else returns false as it is the same layer and we dont need to reassign
@@ -186,6 +297,7 @@ class SetLayerStore(LayerStore):
         """
         
         if self.my_layer != None:
+            self._set_hash(self.my_hash ^ LAYER_KEYS[self.my_layer.index])
             self.my_layer = None
             return True
         
@@ -211,10 +323,115 @@ class SetLayerStore(LayerStore):
         - Best case: O(1)
         """
 
-        self.is_special = not self.is_special 
+        self.is_special = not self.is_special
+        self._set_hash(self.my_hash ^ SPECIAL_KEY)
+
+
+    def clear(self) -> None:
+
+        """
+        Empties the store in place: no layer, and special mode off
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        if self.my_layer is None and not self.is_special:
+            return
+        self.my_layer = None
+        self.is_special = False
+        self._set_hash(0)
+
+
+    def snapshot(self) -> int:
+        """
+        Returns the contents of the store encoded in a single int: (layer index + 1) . 2 + special,
+        where the layer index + 1 is 0 when there is no layer
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - the encoded contents of the store
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        temp_code = 0 if self.my_layer is None else self.my_layer.index + 1
+        return temp_code * 2 + (1 if self.is_special else 0)
+
+
+    def restore(self, state: int) -> None:
+        """
+        Sets the contents of the store back to a snapshot
+
+        Args:
+        - self
+        - state: an int returned by snapshot
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        temp_code = state // 2
+        self.my_layer = None if temp_code == 0 else get_layers()[temp_code - 1]
+        self.is_special = state % 2 == 1
+        self._set_hash((0 if temp_code == 0 else LAYER_KEYS[temp_code - 1]) ^ (SPECIAL_KEY if self.is_special else 0))
+
+
+    @staticmethod
+    def diff_states(before: int, after: int) -> tuple[list[int], list[int], bool]:
+        """
+        Returns how to turn a store with snapshot before into one with snapshot after
+        - erase clears the layer whatever it is, and add replaces it
+
+        Args:
+        - before: snapshot of the store now
+        - after: snapshot the store should end up with
+
+        Raises:
+        - None
+
+        Returns:
+        - the layer indices to erase, the layer indices to add afterwards and whether special has to be applied
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        temp_before_code, temp_after_code = before // 2, after // 2
+        temp_erase, temp_add = [], []
+        if temp_after_code == 0 and temp_before_code != 0:
+            temp_erase.append(temp_before_code - 1)
+        elif temp_after_code != temp_before_code:
+            temp_add.append(temp_after_code - 1)
+        return temp_erase, temp_add, before % 2 != after % 2
+
 
 
-        
 class AdditiveLayerStore(LayerStore):
     """
     Additive layer store. Each added layer applies after all previous ones.
@@ -223,6 +440,12 @@ class AdditiveLayerStore(LayerStore):
     - special: Reverse the order of current layers (first becomes last, etc.)
     """
 
+    SPECIAL_IS_INVOLUTION = True
+    EMPTY_STATE = ()
+
+    # slots allocated for the layers of a new store; the list doubles its array when it gets full
+    INITIAL_CAPACITY = 4
+
     def __init__(self) -> None:
 
         """
@@ -230,6 +453,8 @@ class AdditiveLayerStore(LayerStore):
         - This initialises an object of the AdditiveLayerStore class; 
         - Data structure ArraySortedList is used to store the list of applied layers
         - Counter is a unique key for Listitem used in ArraySortedList. It is incremented by 1 when a new layer is added to the LayerStore 
+        - The layers are hashed in order: my_hash is the sum of LAYER_KEYS[layer] . HASH_BASE ^ age from the oldest,
+          my_reverse_hash the same from the newest, so adding, erasing the oldest and reversing all update them in O(1)
 
         Args:
         - self
@@ -245,10 +470,11 @@ class AdditiveLayerStore(LayerStore):
         - Best case: O(other_function) 
         """
 
-        temp_len = 100 * (len(get_layers()))
+        temp_len = self.INITIAL_CAPACITY
 
         self.my_layer_list = ArraySortedList(temp_len)
         self.counter = 0
+        self.my_reverse_hash = 0
         
  
     def add(self, layer: Layer) -> bool:
@@ -273,6 +499,9 @@ class AdditiveLayerStore(LayerStore):
         """
 
         temp_listitem = ListItem(layer , self.counter)
+        temp_key = LAYER_KEYS[layer.index]
+        self._set_hash((self.my_hash + temp_key * hash_power(len(self.my_layer_list))) % HASH_MODULUS)
+        self.my_reverse_hash = (self.my_reverse_hash * HASH_BASE + temp_key) % HASH_MODULUS
         self.my_layer_list.add(temp_listitem)
         self.counter = self.counter + 1
 
@@ -341,6 +570,9 @@ class AdditiveLayerStore(LayerStore):
         if self.my_layer_list.is_empty():
             return False
 
+        temp_key = LAYER_KEYS[self.my_layer_list[0].value.index]
+        self._set_hash((self.my_hash - temp_key) * HASH_BASE_INVERSE % HASH_MODULUS)
+        self.my_reverse_hash = (self.my_reverse_hash - temp_key * hash_power(len(self.my_layer_list) - 1)) % HASH_MODULUS
         self.my_layer_list.delete_at_index(0)
         return True
 
@@ -374,6 +606,118 @@ class AdditiveLayerStore(LayerStore):
             self.my_layer_list[list_index].value = self.my_layer_list[len(self.my_layer_list) - 1 - list_index].value
             self.my_layer_list[len(self.my_layer_list) - 1 - list_index].value = temp_listitem_layer
 
+        temp_reverse_hash = self.my_reverse_hash
+        self.my_reverse_hash = self.my_hash
+        self._set_hash(temp_reverse_hash)
+
+
+    def clear(self) -> None:
+
+        """
+        Empties the store in place: the list is reset, keeping its array (and the capacity it grew to)
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        if self.my_layer_list.is_empty():
+            return
+        self.my_layer_list.reset()
+        self.counter = 0
+        self.my_reverse_hash = 0
+        self._set_hash(0)
+
+
+    def snapshot(self) -> tuple[int, ...]:
+        """
+        Returns the indices of the layers in the store, from the oldest to the newest
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - tuple of layer indices
+
+        Complexity:
+        - Worst case: O(len(self.my_layer_list))
+        - Best case: O(len(self.my_layer_list))
+        """
+
+        return tuple(self.my_layer_list[list_index].value.index for list_index in range(len(self.my_layer_list)))
+
+
+    def restore(self, state: tuple[int, ...]) -> None:
+        """
+        Sets the contents of the store back to a snapshot
+        - The layers get fresh keys 0, 1, ... in the same order, which keeps their relative ages
+
+        Args:
+        - self
+        - state: a tuple returned by snapshot
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(len(state) . other_function)
+        - Best case: O(len(state) . other_function)
+        """
+
+        temp_layers = get_layers()
+        self.my_layer_list.reset()
+        temp_hash, temp_reverse_hash = 0, 0
+        for temp_key in range(len(state)):
+            self.my_layer_list.add(ListItem(temp_layers[state[temp_key]], temp_key))
+            temp_hash = (temp_hash + LAYER_KEYS[state[temp_key]] * hash_power(temp_key)) % HASH_MODULUS
+            temp_reverse_hash = (temp_reverse_hash * HASH_BASE + LAYER_KEYS[state[temp_key]]) % HASH_MODULUS
+        self.counter = len(state)
+        self.my_reverse_hash = temp_reverse_hash
+        self._set_hash(temp_hash)
+
+
+    @staticmethod
+    def diff_states(before: tuple[int, ...], after: tuple[int, ...]) -> tuple[list[int], list[int], bool]:
+        """
+        Returns how to turn a store with snapshot before into one with snapshot after
+        - erase removes the oldest layer and add appends, so the fewest oldest layers are erased
+          such that the remaining ones are the start of after, and the rest of after is added
+
+        Args:
+        - before: snapshot of the store now
+        - after: snapshot the store should end up with
+
+        Raises:
+        - None
+
+        Returns:
+        - the layer indices to erase, the layer indices to add afterwards and whether special has to be applied (never)
+
+        Complexity:
+        - Worst case: O(len(before) . len(after))
+        - Best case: O(len(after)), when before is the start of after
+        """
+
+        for temp_erased in range(len(before) + 1):
+            temp_kept = len(before) - temp_erased
+            if before[temp_erased:] == after[:temp_kept]:
+                return list(before[:temp_erased]), list(after[temp_kept:]), False
+
 
 
 class SequenceLayerStore(LayerStore):
@@ -386,6 +730,11 @@ class SequenceLayerStore(LayerStore):
         In the event of two layers being the median names, pick the lexicographically smaller one.
     """
 
+    ADD_IS_IDEMPOTENT = True
+    ERASE_IS_IDEMPOTENT = True
+
+    EMPTY_STATE = 0
+
     def __init__(self) -> None:
 
         """
@@ -417,6 +766,9 @@ class SequenceLayerStore(LayerStore):
             if LAYERS[layer_index] != None:
                 temp_listitem = ListItem(temp_apply_status, layer_index)
                 self.my_layer_list.add(temp_listitem)
+
+        # number of applied layers, so an empty store is cleared in O(1)
+        self.my_applied_count = 0
                 
 
     def add(self, layer: Layer) -> bool:
@@ -452,6 +804,8 @@ class SequenceLayerStore(LayerStore):
                         return False
 
                     self.my_layer_list[layer_index].value = True
+                    self.my_applied_count += 1
+                    self._set_hash(self.my_hash ^ LAYER_KEYS[layer_index])
                     return True
 
 
@@ -529,6 +883,8 @@ class SequenceLayerStore(LayerStore):
                         return False
 
                     self.my_layer_list[layer_index].value = False
+                    self.my_applied_count -= 1
+                    self._set_hash(self.my_hash ^ LAYER_KEYS[layer_index])
                     return True
         
     
@@ -579,3 +935,120 @@ class SequenceLayerStore(LayerStore):
                 if LAYERS[layer_index] != None:
                     if name_to_delete == LAYERS[layer_index].name:
                         self.my_layer_list[layer_index].value = False
+                        self.my_applied_count -= 1
+                        self._set_hash(self.my_hash ^ LAYER_KEYS[layer_index])
+
+
+    def clear(self) -> None:
+
+        """
+        Empties the store in place: every layer is set to not applying
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(len(self.my_layer_list))
+        - Best case: O(1), when no layer is applied
+        """
+
+        if self.my_applied_count == 0:
+            return
+        for list_index in range(len(self.my_layer_list)):
+            self.my_layer_list[list_index].value = False
+        self.my_applied_count = 0
+        self._set_hash(0)
+
+
+    def snapshot(self) -> int:
+        """
+        Returns the applied layers encoded in a single int, bit i being set when the layer with index i is applied
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - the bitmask of applied layers
+
+        Complexity:
+        - Worst case: O(len(self.my_layer_list))
+        - Best case: O(len(self.my_layer_list))
+        """
+
+        temp_mask = 0
+        for list_index in range(len(self.my_layer_list)):
+            if self.my_layer_list[list_index].value == True:
+                temp_mask |= 1 << self.my_layer_list[list_index].key
+        return temp_mask
+
+
+    def restore(self, state: int) -> None:
+        """
+        Sets the contents of the store back to a snapshot
+
+        Args:
+        - self
+        - state: an int returned by snapshot
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(len(self.my_layer_list))
+        - Best case: O(len(self.my_layer_list))
+        """
+
+        self.my_applied_count = 0
+        for list_index in range(len(self.my_layer_list)):
+            temp_listitem = self.my_layer_list[list_index]
+            temp_listitem.value = (state >> temp_listitem.key) & 1 == 1
+            if temp_listitem.value:
+                self.my_applied_count += 1
+        temp_hash = 0
+        for layer_index in range(len(LAYERS)):
+            if (state >> layer_index) & 1:
+                temp_hash ^= LAYER_KEYS[layer_index]
+        self._set_hash(temp_hash)
+
+
+    @staticmethod
+    def diff_states(before: int, after: int) -> tuple[list[int], list[int], bool]:
+        """
+        Returns how to turn a store with snapshot before into one with snapshot after
+        - every layer is applied / not applied independently
+
+        Args:
+        - before: snapshot of the store now
+        - after: snapshot the store should end up with
+
+        Raises:
+        - None
+
+        Returns:
+        - the layer indices to erase, the layer indices to add afterwards and whether special has to be applied (never)
+
+        Complexity:
+        - Worst case: O(len(LAYERS))
+        - Best case: O(len(LAYERS))
+        """
+
+        temp_erase, temp_add = [], []
+        for layer_index in range(len(LAYERS)):
+            temp_before_bit, temp_after_bit = (before >> layer_index) & 1, (after >> layer_index) & 1
+            if temp_before_bit and not temp_after_bit:
+                temp_erase.append(layer_index)
+            elif temp_after_bit and not temp_before_bit:
+                temp_add.append(layer_index)
+        return temp_erase, temp_add, False
@@ -1,16 +1,17 @@
+import time
 import arcade
 import arcade.key as keys
-import math
 from grid import Grid
-from layer_util import get_layers, Layer
+from brush import trace_line
+from layer_util import get_layers
 from layers import lighten
-from action import PaintAction, PaintStep
-from undo import UndoTracker
-from replay import ReplayTracker
+from paint_session import PaintSession
+from clock import Clock
+from data_structures.spsc_ring import SPSCRing
 
 
 class MyWindow(arcade.Window):
-    """ Painter Window """
+    """ Painter Window, a view over a PaintSession """
 
     SCREEN_WIDTH = 800
     SCREEN_HEIGHT = 700
@@ -18,7 +19,24 @@ class MyWindow(arcade.Window):
     BUTTONS_HEIGHT = 100
     SCREEN_TITLE = "Paint"
 
-    REPLAY_TIMER_DELTA = 0.05
+    # Holding Ctrl+Z / Ctrl+Y repeats every KEY_REPEAT_DELTA seconds, after KEY_REPEAT_DELAY;
+    # the number of actions per repeat doubles every KEY_REPEAT_ACCELERATION seconds held, up to KEY_REPEAT_MAX_BATCH
+    KEY_REPEAT_DELAY = 0.5
+    KEY_REPEAT_DELTA = 0.05
+    KEY_REPEAT_ACCELERATION = 1
+    KEY_REPEAT_MAX_BATCH = 4096
+
+    # History timeline in the sidebar, between the layer buttons and the action buttons
+    TIMELINE_MARGIN = 20
+    TIMELINE_WIDTH = 6
+    TIMELINE_HANDLE_RADIUS = 8
+
+    # Calls queued by other threads (see CommandProxy) are made in on_update, for at most COMMAND_FRAME_BUDGET seconds per frame
+    COMMAND_QUEUE_SIZE = 1 << 16
+    COMMAND_FRAME_BUDGET = 1 / 240
+
+    # Ctrl+S saves the replay of the session to this file (see session.py)
+    SESSION_PATH = "session.pses"
 
     GRID_SIZE_X = 32
     GRID_SIZE_Y = 32
@@ -28,41 +46,64 @@ class MyWindow(arcade.Window):
     # SCAFFOLD PART
     # Unless you're adding new features, you shouldn't need to touch this.
 
-    def __init__(self) -> None:
-        """Initialise visual and logic variables."""
+    def __init__(self, clock: Clock = None) -> None:
+        """Initialise visual and logic variables; budgets are measured on clock (wall clock time if None)."""
         super().__init__(self.SCREEN_WIDTH, self.SCREEN_HEIGHT, self.SCREEN_TITLE)
         arcade.set_background_color(self.BG)
-        self.grid: Grid = None
-        self.draw_style = Grid.DRAW_STYLE_SET
+        self.session = PaintSession(Grid.DRAW_STYLE_SET, self.GRID_SIZE_X, self.GRID_SIZE_Y, clock)
+        self.commands = SPSCRing(self.COMMAND_QUEUE_SIZE)
         self.z_pressed = False
         self.y_pressed = False
         self.z_timer = 0
         self.y_timer = 0
-        self.enable_ui = True
-        self.replay_timer = 0   #O(1)
-        self.on_init()
+        self.z_held = 0
+        self.y_held = 0
+
+    def __getattr__(self, name):
+        """The painting operations (on_paint, on_undo, ...) and state (grid, timestamp, ...) of the session."""
+        session = self.__dict__.get("session")
+        if session is None:
+            raise AttributeError(name)
+        return getattr(session, name)
+
+    @property
+    def enable_ui(self) -> bool:
+        """Whether the UI takes input, i.e. no replay is in progress."""
+        return not self.session.replaying
 
     def reset(self) -> None:
-        """Reset the screen."""
-        self.grid = Grid(self.draw_style, self.GRID_SIZE_X, self.GRID_SIZE_Y)
-        self.timestamp = 0
+        """Reset the session and the screen."""
+        self.session.reset()
+        self.reset_view()
 
+    def reset_view(self) -> None:
+        """Reset the screen."""
         self.selected_layer_index = -1
         self.dragging = None
         self.prev_drawn = None
         self.prev_pos = None
+        self.motion_points = []
+        self.scrubbing = False
+        self.scrub_target = None
         self.draw_size = 2
 
-        # Visual calculations
+        # Visual calculations, for the size of the grid of the session (recovered from an undo journal, it may differ);
+        # grid[x][y] is square (x, y), x running over the rows of the grid
+        self.GRID_SIZE_X = self.session.grid.num_of_rows
+        self.GRID_SIZE_Y = self.session.grid.num_of_cols
         self.DRAW_PANEL = self.SCREEN_WIDTH - self.SIDEBAR_WIDTH
         self.GRID_SQ_WIDTH = self.DRAW_PANEL / self.GRID_SIZE_X
         self.GRID_SQ_HEIGHT = self.SCREEN_HEIGHT / self.GRID_SIZE_Y
         self.LAYER_BUTTON_SIZE = self.SIDEBAR_WIDTH / 2
+        layer_rows = (sum(1 for layer in get_layers() if layer is not None) + 1) // 2
+        self.TIMELINE_X = self.DRAW_PANEL + self.SIDEBAR_WIDTH / 2
+        self.TIMELINE_BOTTOM = 3 * self.LAYER_BUTTON_SIZE + self.TIMELINE_MARGIN
+        self.TIMELINE_TOP = self.SCREEN_HEIGHT - layer_rows * self.LAYER_BUTTON_SIZE - self.TIMELINE_MARGIN
         # Action button sprites
         self.action_buttons = arcade.SpriteList()
         self.draw_mode_button = arcade.Sprite(
-            "img/on_off.png" if self.draw_style == Grid.DRAW_STYLE_SET else (
-                "img/additive.png" if self.draw_style == Grid.DRAW_STYLE_ADD else "img/sequence.png"
+            "img/on_off.png" if self.session.draw_style == Grid.DRAW_STYLE_SET else (
+                "img/additive.png" if self.session.draw_style == Grid.DRAW_STYLE_ADD else "img/sequence.png"
             ),
             scale=50/48,
         )
@@ -98,11 +139,9 @@ class MyWindow(arcade.Window):
         self.special_button.center_y = 5 * self.LAYER_BUTTON_SIZE / 2
         self.action_buttons.append(self.special_button)
 
-        self.on_reset()
-
     def setup(self) -> None:
         """Set up the game and initialize the variables."""
-        self.reset()
+        self.reset_view()
 
     def on_draw(self) -> None:
         """Draw everything"""
@@ -124,6 +163,18 @@ class MyWindow(arcade.Window):
             arcade.draw_text(str(i), xstart, (ystart+yend)/2, (0, 0, 0), 18, width=xend-xstart, align="center", bold=True, anchor_y="center")
         # UI - Draw Modes / Action buttons
         self.action_buttons.draw()
+        # UI - History timeline
+        start, end, position = self.history_range()
+        track_color = (160, 160, 160) if self.enable_ui else (220, 220, 220)
+        arcade.draw_line(self.TIMELINE_X, self.TIMELINE_BOTTOM, self.TIMELINE_X, self.TIMELINE_TOP, track_color, self.TIMELINE_WIDTH)
+        fraction = (position - start) / (end - start) if end > start else 1
+        handle_y = self.TIMELINE_BOTTOM + fraction * (self.TIMELINE_TOP - self.TIMELINE_BOTTOM)
+        arcade.draw_circle_filled(self.TIMELINE_X, handle_y, self.TIMELINE_HANDLE_RADIUS, (0, 0, 0) if self.enable_ui else track_color)
+        # In verify mode, the first replayed action that did not give the recorded grid is marked on the timeline
+        divergence = self.session.my_replay_tracker.first_divergence()
+        if self.session.replaying and divergence is not None and end > start:
+            divergence_y = self.TIMELINE_BOTTOM + (divergence + 1 - start) / (end - start) * (self.TIMELINE_TOP - self.TIMELINE_BOTTOM)
+            arcade.draw_line(self.TIMELINE_X - self.TIMELINE_HANDLE_RADIUS, divergence_y, self.TIMELINE_X + self.TIMELINE_HANDLE_RADIUS, divergence_y, (255, 0, 0), 2)
         # Grid
         for x in range(self.GRID_SIZE_X):
             for y in range(self.GRID_SIZE_Y):
@@ -132,13 +183,25 @@ class MyWindow(arcade.Window):
                     self.GRID_SQ_WIDTH * (x+1),
                     self.GRID_SQ_HEIGHT * (y+1),
                     self.GRID_SQ_HEIGHT * y,
-                    self.grid[x][y].get_color(self.BG[:], self.timestamp, x, y),
+                    self.session.grid[x][y].get_color(self.BG[:], self.session.timestamp, x, y),
                 )
 
+    def on_close(self) -> None:
+        """Called when the window is closed: the files of the session are closed first."""
+        self.session.close()
+        super().on_close()
+
     def on_mouse_press(self, x: int, y: int, button: int, modifiers: int) -> None:
         """Called when the mouse buttons are pressed."""
+        # Motion queued for the next frame is drawn first, so it is not drawn after what this press does
+        self.flush_motion()
         if x > self.DRAW_PANEL:
             if not self.enable_ui:
+                # During a replay, the timeline seeks in the replay
+                if self.TIMELINE_BOTTOM - self.TIMELINE_MARGIN <= y < self.TIMELINE_TOP + self.TIMELINE_MARGIN:
+                    self.scrubbing = True
+                    self.scrub_to(y)
+                    self.flush_scrub()
                 return
             # Buttons
             for i, layer in enumerate(get_layers()):
@@ -162,57 +225,96 @@ class MyWindow(arcade.Window):
             ystart = self.LAYER_BUTTON_SIZE
             yend = 0
             if xstart <= x < xend and yend <= y < ystart:
-                self.start_replay()
+                self.session.start_replay()
             xstart = self.DRAW_PANEL
             xend = self.LAYER_BUTTON_SIZE + self.DRAW_PANEL
             ystart = 2 * self.LAYER_BUTTON_SIZE
             yend = self.LAYER_BUTTON_SIZE
             if xstart <= x < xend and yend <= y < ystart:
-                self.on_increase_brush_size()
+                self.session.on_increase_brush_size()
             xstart = self.LAYER_BUTTON_SIZE + self.DRAW_PANEL
             xend = 2 * self.LAYER_BUTTON_SIZE + self.DRAW_PANEL
             ystart = 2 * self.LAYER_BUTTON_SIZE
             yend = self.LAYER_BUTTON_SIZE
             if xstart <= x < xend and yend <= y < ystart:
-                self.on_decrease_brush_size()
+                self.session.on_decrease_brush_size()
             xstart = self.DRAW_PANEL
             xend = 1 * self.LAYER_BUTTON_SIZE + self.DRAW_PANEL
             ystart = 3 * self.LAYER_BUTTON_SIZE
             yend = 2 * self.LAYER_BUTTON_SIZE
             if xstart <= x < xend and yend <= y < ystart:
-                self.on_special()
+                self.session.on_special()
+            # History timeline
+            if self.TIMELINE_BOTTOM - self.TIMELINE_MARGIN <= y < self.TIMELINE_TOP + self.TIMELINE_MARGIN:
+                self.session.on_stroke_end()
+                self.scrubbing = True
+                self.scrub_to(y)
+                self.flush_scrub()
         else:
             self.dragging = True
+            self.session.on_stroke_start()
             self.try_draw(x, y)
 
     def on_mouse_release(self, x: int, y: int, button: int, modifiers: int):
         """Called when the mouse buttons are released."""
+        self.flush_motion()
+        self.flush_scrub()
+        self.session.on_stroke_end()
+        self.scrubbing = False
         self.dragging = False
         self.prev_drawn = None
         self.prev_pos = None
 
     def on_mouse_motion(self, x, y, dx, dy) -> None:
         """Called when the mouse moves."""
+        if self.scrubbing:
+            # Seeking is deferred to on_update as well, so only the last position of each frame is sought.
+            self.scrub_to(y)
+            return
         if not self.dragging:
             return
         if not(0 <= self.selected_layer_index < len(get_layers())):
             return
         if x > self.DRAW_PANEL:
             return
-        self.try_draw(x, y)
+        # Painting is deferred to on_update, so a burst of motion events becomes one stroke per frame.
+        self.motion_points.append((x, y))
 
     def on_key_press(self, symbol: int, modifiers: int) -> None:
         """Called when a keyboard key is pressed."""
+        # Motion queued for the next frame is drawn first, so e.g. an undo takes back the whole stroke so far
+        self.flush_motion()
         if not self.enable_ui:
+            if keys.F == symbol:
+                self.session.on_replay_fast_forward()
+            if keys.R == symbol:
+                self.session.on_replay_reverse()
             return
         self.z_pressed = keys.Z == symbol and (modifiers & keys.MOD_CTRL)
         self.y_pressed = keys.Y == symbol and (modifiers & keys.MOD_CTRL)
         if self.z_pressed:
-            self.on_undo()
-            self.z_timer = 0.5
+            self.session.on_undo()
+            self.z_timer = self.KEY_REPEAT_DELAY
+            self.z_held = 0
         if self.y_pressed:
-            self.on_redo()
-            self.y_timer = 0.5
+            self.session.on_redo()
+            self.y_timer = self.KEY_REPEAT_DELAY
+            self.y_held = 0
+        if keys.B == symbol:
+            self.session.on_change_brush_shape()
+        if keys.TAB == symbol:
+            self.session.on_switch_branch()
+        if keys.S == symbol and (modifiers & keys.MOD_CTRL):
+            self.save_session()
+
+    def save_session(self) -> None:
+        """Save the replay of the session to SESSION_PATH; the title bar tells whether it worked."""
+        try:
+            count = self.session.save(self.SESSION_PATH)
+        except OSError as error:
+            self.set_caption("{0} - could not save {1}: {2}".format(self.SCREEN_TITLE, self.SESSION_PATH, error.strerror or error))
+            return
+        self.set_caption("{0} - saved {1} actions to {2}".format(self.SCREEN_TITLE, count, self.SESSION_PATH))
 
     def on_key_release(self, symbol: int, modifiers: int) -> None:
         """Called when a keyboard key is released."""
@@ -221,342 +323,131 @@ class MyWindow(arcade.Window):
 
     def try_draw(self, x, y) -> None:
         """Attempt to draw at a position, but safely fail if an invalid square."""
+        self.try_draw_polyline([(x, y)])
+
+    def try_draw_polyline(self, points) -> None:
+        """Attempt to draw along a polyline of positions continuing from the previous one, as a single stroke."""
         if self.selected_layer_index == -1:
             return
         layer = get_layers()[self.selected_layer_index]
-        if self.prev_pos is not None:
-            # Try draw in increments of 0.5 to avoid skipping squares.
-            mhat_dist = abs(x - self.prev_pos[0]) + abs(y - self.prev_pos[1])
-            increment = 0.5
-            points_to_draw = []
-            for d in range(1, math.ceil(mhat_dist/increment)+1):
-                distance = min(d * increment / mhat_dist, 1)
-                nx = distance * (x - self.prev_pos[0]) + self.prev_pos[0]
-                ny = distance * (y - self.prev_pos[1]) + self.prev_pos[1]
-                nx_pos = int(nx // self.GRID_SQ_WIDTH)
-                ny_pos = int(ny // self.GRID_SQ_HEIGHT)
-                points_to_draw.append((nx_pos, ny_pos))
-        else:
-            x_pos = int(x // self.GRID_SQ_WIDTH)
-            y_pos = int(y // self.GRID_SQ_HEIGHT)
-            points_to_draw = [
-                (x_pos, y_pos)
-            ]
+        points_to_draw = []
+        for x, y in points:
+            if self.prev_pos is not None:
+                # Walk every square between the last and current mouse positions, so none are skipped.
+                points_to_draw.extend(trace_line(
+                    self.prev_pos[0] / self.GRID_SQ_WIDTH, self.prev_pos[1] / self.GRID_SQ_HEIGHT,
+                    x / self.GRID_SQ_WIDTH, y / self.GRID_SQ_HEIGHT,
+                ))
+            else:
+                x_pos = int(x // self.GRID_SQ_WIDTH)
+                y_pos = int(y // self.GRID_SQ_HEIGHT)
+                points_to_draw.append((x_pos, y_pos))
+            self.prev_pos = (x, y)
+        path = []
         for px, py in points_to_draw:
             if self.prev_drawn is None or (px, py) != self.prev_drawn:
                 if 0 <= px < self.GRID_SIZE_X and 0 <= py < self.GRID_SIZE_Y:
-                    self.on_paint(layer, px, py)
+                    path.append((px, py))
                     self.prev_drawn = (px, py)
-        self.prev_pos = (x, y)
+        if len(path) != 0:
+            self.session.on_paint_stroke(layer, path)
 
-    def start_replay(self) -> None:
-        """Begin the replay mode."""
-        self.enable_ui = False
-        self.grid = Grid(self.draw_style, self.GRID_SIZE_X, self.GRID_SIZE_Y)
-        self.replay_timer = self.REPLAY_TIMER_DELTA
-        self.on_replay_start()
+    def flush_motion(self) -> None:
+        """Draw the mouse motion accumulated since the last frame as one polyline."""
+        if len(self.motion_points) == 0:
+            return
+        points = self.motion_points
+        self.motion_points = []
+        if self.dragging:
+            self.try_draw_polyline(points)
+
+    def history_range(self) -> tuple[int, int, int]:
+        """The range of history positions the timeline covers, and the current position."""
+        return self.session.history_range()
+
+    def scrub_to(self, y) -> None:
+        """Set the history position under a height on the timeline as the next one to seek to."""
+        start, end, _ = self.history_range()
+        fraction = (y - self.TIMELINE_BOTTOM) / (self.TIMELINE_TOP - self.TIMELINE_BOTTOM)
+        fraction = min(1, max(0, fraction))
+        self.scrub_target = start + round(fraction * (end - start))
+
+    def flush_scrub(self) -> None:
+        """Seek to the last position the timeline was dragged to, if it moved."""
+        if self.scrub_target is None:
+            return
+        target = self.scrub_target
+        self.scrub_target = None
+        self.session.seek_history(target)
 
     def on_update(self, delta_time) -> None:
         """Movement and game logic."""
-        self.timestamp += delta_time
+        self.drain_commands()
+        self.flush_motion()
+        self.flush_scrub()
         if self.z_pressed:
+            self.z_held += delta_time
             self.z_timer -= delta_time
-            if self.z_timer <= 0:
-                self.on_undo()
-                self.z_timer += 0.05
+            repeats = 0
+            while self.z_timer <= 0:
+                repeats += 1
+                self.z_timer += self.KEY_REPEAT_DELTA
+            if repeats > 0:
+                # All the repeats of this frame are undone together, in one pass over the grid.
+                self.session.on_undo_many(repeats * self.key_repeat_batch(self.z_held))
         if self.y_pressed:
+            self.y_held += delta_time
             self.y_timer -= delta_time
-            if self.y_timer <= 0:
-                self.on_redo()
-                self.y_timer += 0.05
-        if not self.enable_ui:
-            self.replay_timer -= delta_time
-            if self.replay_timer <= 0:
-                self.replay_timer += self.REPLAY_TIMER_DELTA
-                finished = self.on_replay_next_step()
-                if finished:
-                    self.enable_ui = True
+            repeats = 0
+            while self.y_timer <= 0:
+                repeats += 1
+                self.y_timer += self.KEY_REPEAT_DELTA
+            if repeats > 0:
+                self.session.on_redo_many(repeats * self.key_repeat_batch(self.y_held))
+        self.session.update(delta_time)
+
+    def drain_commands(self) -> None:
+        """Make the calls queued by a CommandProxy, until the queue is empty or the frame budget is spent."""
+        clock = self.session.clock
+        deadline = clock.now() + self.COMMAND_FRAME_BUDGET
+        while not self.commands.is_empty():
+            name, args, kwargs = self.commands.serve()
+            getattr(self, name)(*args, **kwargs)
+            if clock.now() >= deadline:
+                break
+
+    def key_repeat_batch(self, held) -> int:
+        """Number of actions undone / redone per key repeat, after holding the key for some seconds."""
+        return min(self.KEY_REPEAT_MAX_BATCH, 2 ** int(held / self.KEY_REPEAT_ACCELERATION))
 
     def change_draw_mode(self) -> None:
         """Changes the draw mode of the application, and resets the window."""
-        if self.draw_style == Grid.DRAW_STYLE_SET:
-            self.draw_style = Grid.DRAW_STYLE_ADD
-        elif self.draw_style == Grid.DRAW_STYLE_ADD:
-            self.draw_style = Grid.DRAW_STYLE_SEQUENCE
-        elif self.draw_style == Grid.DRAW_STYLE_SEQUENCE:
-            self.draw_style = Grid.DRAW_STYLE_SET
-        self.reset()
-
-    # STUDENT PART
-
-    def on_init(self):
-
-        """
-        Initialisation that occurs after the system initialisation
-        - initialising undo tracker and replay tracker
-
-        Args:
-        - self
-
-        Raises:
-        - None
-
-        Returns:
-        - None
-
-        Complexity:
-        - Worst case: O(other_function) 
-        - Best case: O(other_function)
-        """
-
-        self.my_undo_tracker = UndoTracker()
-        self.my_replay_tracker = ReplayTracker()
-    
-
-    def on_reset(self):
-
-        """
-        Called when a window reset is requested
-        - resets/clears the undo tracker and replay tracker
-
-        Args:
-        - self
-
-        Raises:
-        - None
-
-        Returns:
-        - None
-
-        Complexity:
-        - Worst case: O(other_function) 
-        - Best case: O(other_function)
-        """
-
-        self.my_undo_tracker.clear_undo()
-        self.my_replay_tracker.clear_replay()
-        
-
-    def on_paint(self, layer: Layer, px : int, py : int):
-        """
-        Called when a grid square is clicked on, which should trigger painting in the vicinity.
-        Vicinity squares outside of the range [0, GRID_SIZE_X) or [0, GRID_SIZE_Y) can be safely ignored
-        - Vicinity is defined by the Manhattan distance of the grid square at (px, py) at a max distance d, where d is the current brush size
-
-        Args:
-        - self
-        - layer: The layer being applied from Layer class
-        - px: x position of the brush.
-        - py: y position of the brush.
-
-        Raises:
-        - None
-
-        Returns:
-        - None
-
-        Complexity:
-        - Worst case: O((other_function + (brush_size . comp) . (brush_size . comp)) + comp + other_function + (comp . other_function)) + comp . other_function)     
-        - Best case: O((other_function + (brush_size . comp) . (brush_size . comp)) + comp + other_function + (comp . other_function)) + comp . other_function)
-        """
-
-        temp_action = PaintAction([],False) 
-
-
-        for row_paint in range (px - self.grid.brush_size , px + self.grid.brush_size + 1): 
-            if row_paint < 0 or row_paint > self.grid.num_of_rows -1 :
-                continue
-           
-            for col_paint in range (py - self.grid.brush_size , py + self.grid.brush_size + 1): 
-                if col_paint < 0 or col_paint > self.grid.num_of_cols - 1 :
-                    continue
-                
-                #calculating Manhattan distance between (row_paint , col_paint) and (px , py)
-                man_dist = abs(row_paint - px) + abs(col_paint - py)
-                 
-                if man_dist > self.grid.brush_size:     
-                    continue
-                
-                temp_add = self.grid[row_paint][col_paint].add(layer)
-
-              
-                if temp_add == True:
-                    temp_step = PaintStep((row_paint, col_paint),layer)
-                    temp_action.add_step(temp_step)
-
-        temp_len = len(temp_action.steps)
-
-        if temp_len != 0:
-            self.my_undo_tracker.add_action(temp_action)
-       
-            self.my_replay_tracker.add_action(temp_action , False)
-
-
-        
-    def on_undo(self):
-
-        """
-        Called when an undo is requested
-        - If UndoTracker returns a valid action, it is added to the ReplayTracker, with the undo flag - true
-
-        Args:
-        - self
-
-        Raises:
-        - None
-
-        Returns:
-        - None
-
-        Complexity:
-        - Worst case: O(other_function + (comp . other_function)) 
-        - Best case: O(other_function + (comp . other_function))
-        """
-
-        temp_action = self.my_undo_tracker.undo(self.grid)
-
-        if temp_action != None:
-            self.my_replay_tracker.add_action(temp_action , True)
-
-
-    def on_redo(self):
-
-        """
-        Called when a redo is requested
-        - If UndoTracker returns a valid action, it is added to the ReplayTracker
-        
-        Args:
-        - self
-
-        Raises:
-        - None
-
-        Returns:
-        - None
-
-        Complexity:
-        - Worst case: O(other_function + (comp . other_function)) 
-        - Best case: O(other_function + (comp . other_function))
-        
-        """
-        temp_action = self.my_undo_tracker.redo(self.grid)
-
-        if temp_action != None:
-            self.my_replay_tracker.add_action(temp_action , False)
-        
-
-    def on_special(self):
-
-        """
-        Called when the special action is requested
-
-        Args:
-        - self
-
-        Raises:
-        - None
-
-        Returns:
-        - None
-
-        Complexity:
-        - Worst case: O(other_function) 
-        - Best case: O(other_function)
-        """
-
-        self.grid.special()
-        self.my_undo_tracker.add_action(PaintAction([], True))
-        self.my_replay_tracker.add_action(PaintAction([], True) , False)
-
-
-    def on_replay_start(self):
-
-        """
-        Called when the replay starting is requested
-
-        Args:
-        - self
-
-        Raises:
-        - None
-
-        Returns:
-        - None
-
-        Complexity:
-        - Worst case: O(1) 
-        - Best case: O(1)
-        """
-
-        self.my_replay_tracker.start_replay()
-
-
-    def on_replay_next_step(self) -> bool:
-
-        """
-        Called when the next step of the replay is requested.
-        Returns whether the replay is finished or not
-
-        Args:
-        - self
-
-        Raises:
-        - None
-
-        Returns:
-        - None
-
-        Complexity:
-        - Worst case: O(other_function + (comp . other_function)) - from replay.py
-        - Best case: O(other_function + (comp . other_function))
-        """
-
-        return self.my_replay_tracker.play_next_action(self.grid)
-        
-
-    def on_increase_brush_size(self):
-
-        """
-        Called when an increase to the brush size is requested
-
-        Args:
-        - self
-
-        Raises:
-        - None
-
-        Returns:
-        - None
-
-        Complexity:
-        - Worst case: O(comp) - from grid.py
-        - Best case: O(comp)
-        """
-
-        self.grid.increase_brush_size()
-
+        self.session.change_draw_mode()
+        self.reset_view()
 
-    def on_decrease_brush_size(self):
 
-        """
-        Called when a decrease to the brush size is requested
-        
-        Args:
-        - self
+class CommandProxy:
+    """
+    Stands in for a window in another thread than the one running arcade: calling a method of the window
+    (on_paint, on_undo, start_replay, ...) queues the call instead, and the window makes it in on_update,
+    between two frames. Other attributes are read from the window as they are.
+    """
 
-        Raises:
-        - None
+    # seconds to wait before trying again when the queue of the window is full
+    FULL_BACKOFF = 0.001
 
-        Returns:
-        - None
+    def __init__(self, window: MyWindow) -> None:
+        self.window = window
 
-        Complexity:
-        - Worst case: O(comp) - from grid.py
-        - Best case: O(comp)
-        """
-        
-        self.grid.decrease_brush_size()
+    def __getattr__(self, name):
+        value = getattr(self.window, name)
+        if not callable(value):
+            return value
 
+        def enqueue(*args, **kwargs) -> None:
+            while not self.window.commands.append((name, args, kwargs)):
+                time.sleep(self.FULL_BACKOFF)
+        return enqueue
 
 
 def main():
@@ -571,7 +462,7 @@ def run_with_func(func, pause=False):
     window.setup()
     if pause:
         _ = input("Press enter to begin test.")
-    t = Thread(target=func, args=(window,))
+    t = Thread(target=func, args=(CommandProxy(window),))
     t.start()
     arcade.run()
 
@@ -0,0 +1,768 @@
+"""
+Headless painting session.
+
+PaintSession holds everything a painting session is made of: the grid (with its brush), the undo and
+replay trackers and the timestamp the animated layers are drawn at, and all the operations on them:
+painting, undo / redo, the special action and replays. Nothing here imports arcade, so scripts, tests
+and benchmarks can drive a session at full speed without a display; MyWindow (main.py) is a view over one.
+"""
+
+from __future__ import annotations
+from grid import Grid
+from layer_util import Layer
+from action import PaintAction
+from clock import Clock
+from undo import UndoTracker
+from journal import UndoJournal
+from replay import ReplayTracker
+from session import save_session
+
+
+class PaintSession:
+    """ Painting session, without a window """
+
+    # Replay speed (see ReplayTracker.PLAYBACK_OPTIONS); on_replay_fast_forward doubles the speed, on_replay_reverse plays it backwards / forwards
+    REPLAY_PLAYBACK = ReplayTracker.PLAYBACK_MULTIPLIER
+    REPLAY_PLAYBACK_VALUE = 1
+    REPLAY_FRAME_BUDGET = 1 / 120
+    # Check the grid against the hash recorded after every action during replays, and report the first mismatch
+    REPLAY_VERIFY = False
+
+    # Path of an on-disk undo journal (see journal.py), None to keep the history in memory only.
+    # With a journal, the history of the last session is recovered on start.
+    UNDO_JOURNAL_PATH = None
+
+    GRID_SIZE_X = 32
+    GRID_SIZE_Y = 32
+
+    # SCAFFOLD PART
+    # Unless you're adding new features, you shouldn't need to touch this.
+
+    def __init__(self, draw_style: str = Grid.DRAW_STYLE_SET, x: int = GRID_SIZE_X, y: int = GRID_SIZE_Y, clock: Clock = None) -> None:
+        """Initialise a session with an empty grid of x columns and y rows, on a clock (wall clock time if None)."""
+        self.clock = Clock() if clock is None else clock
+        self.grid: Grid = None
+        # stores of the grids of the other draw styles, reused by a mode change (see Grid.release)
+        self.store_pool = {}
+        self.draw_style = draw_style
+        self.size_x = x
+        self.size_y = y
+        self.timestamp = 0
+        self.replaying = False
+        self.on_init()
+        self.reset()
+
+    def reset(self) -> None:
+        """Empty the grid and the history."""
+        self.clear_grid()
+        self.timestamp = 0
+        self.replaying = False
+        self.on_reset()
+
+    def clear_grid(self) -> None:
+        """Empty the grid in place, or swap it for one of the new draw style (reusing pooled stores) or size (dropping the pool)."""
+        if self.grid is not None and (self.grid.my_draw_style, self.grid.num_of_cols, self.grid.num_of_rows) == (self.draw_style, self.size_x, self.size_y):
+            # as if the grid was made again: its brush goes back to the default too
+            self.grid.clear()
+            self.grid.brush_size = Grid.DEFAULT_BRUSH_SIZE
+            self.grid.brush_shape = Grid.DEFAULT_BRUSH_SHAPE
+            return
+        if self.grid is not None and (self.grid.num_of_cols, self.grid.num_of_rows) != (self.size_x, self.size_y):
+            self.store_pool = {}
+        elif self.grid is not None:
+            self.grid.release()
+        self.grid = Grid(self.draw_style, self.size_x, self.size_y, self.store_pool)
+
+    def change_draw_mode(self) -> None:
+        """Changes the draw mode of the session, and resets it."""
+        if self.draw_style == Grid.DRAW_STYLE_SET:
+            self.draw_style = Grid.DRAW_STYLE_ADD
+        elif self.draw_style == Grid.DRAW_STYLE_ADD:
+            self.draw_style = Grid.DRAW_STYLE_SEQUENCE
+        elif self.draw_style == Grid.DRAW_STYLE_SEQUENCE:
+            self.draw_style = Grid.DRAW_STYLE_SET
+        self.reset()
+
+    def start_replay(self) -> None:
+        """Begin the replay mode."""
+        self.on_stroke_end()
+        self.replaying = True
+        self.clear_grid()
+        self.on_replay_start()
+
+    def update(self, delta_time: float) -> bool:
+        """Advance the session by delta_time seconds; returns whether a replay finished in that time."""
+        self.timestamp += delta_time
+        if not self.replaying:
+            return False
+        finished = self.on_replay_frame(delta_time)
+        if finished:
+            self.replaying = False
+        return finished
+
+    def history_range(self) -> tuple[int, int, int]:
+        """The range of history positions (of the replay during a replay), and the current position."""
+        if self.replaying:
+            replay = self.my_replay_tracker
+            return 0, replay.action_count(), replay.position()
+        tracker = self.my_undo_tracker
+        return tracker.seek_start(), tracker.undo_count() + tracker.redo_count(), tracker.undo_count()
+
+    def seek_history(self, index: int) -> None:
+        """Jump to a position of history_range."""
+        if self.replaying:
+            self.on_replay_seek(index)
+        elif index != self.my_undo_tracker.undo_count():
+            self.on_seek(index)
+
+    def save(self, path: str) -> int:
+        """Save the replay of the session to a session file (see session.py); returns the number of actions."""
+        self.on_stroke_end()
+        return save_session(path, self.my_replay_tracker, self.grid)
+
+    def close(self) -> None:
+        """Close the files of the session: the undo journal is flushed and kept for recovery, the replay log is deleted."""
+        self.on_stroke_end()
+        if self.my_undo_tracker.my_journal is not None:
+            self.my_undo_tracker.my_journal.close()
+        self.my_replay_tracker.my_replay_log.close()
+
+    # STUDENT PART
+
+    def on_init(self):
+
+        """
+        Initialisation that occurs after the system initialisation
+        - initialising undo tracker and replay tracker, which measures its frame budget on the clock of the session
+        - the undo tracker writes to a journal on disk if UNDO_JOURNAL_PATH is set
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function) 
+        - Best case: O(other_function)
+        """
+
+        temp_journal = None
+        if self.UNDO_JOURNAL_PATH is not None:
+            temp_journal = UndoJournal(self.UNDO_JOURNAL_PATH)
+        self.my_undo_tracker = UndoTracker(journal=temp_journal)
+        self.my_replay_tracker = ReplayTracker(clock=self.clock)
+        self.my_recovered = temp_journal is None
+        # whether the grid was empty when the replay log was cleared, so the replay can take keyframes from it
+        self.my_replay_from_empty = True
+    
+
+    def on_reset(self):
+
+        """
+        Called when a session reset is requested
+        - resets/clears the undo tracker and replay tracker
+        - the first time, the history in the undo journal (if any) is recovered instead of being cleared,
+          on a grid of the draw style and size it was recorded on
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function) 
+        - Best case: O(other_function)
+        """
+
+        self.my_replay_tracker.clear_replay()
+        if not self.my_recovered:
+            self.my_recovered = True
+            temp_recovered_grid = self.my_undo_tracker.recover_grid()
+            if temp_recovered_grid is not None:
+                self.draw_style, self.size_x, self.size_y = temp_recovered_grid
+                self.clear_grid()
+            if self.my_undo_tracker.recover(self.grid):
+                self.my_replay_from_empty = False
+                return
+        self.my_replay_from_empty = True
+        self.my_undo_tracker.clear_undo(self.grid)
+        
+
+    def on_paint(self, layer: Layer, px : int, py : int):
+        """
+        Called when a grid square is clicked on, which should trigger painting in the vicinity.
+        Vicinity squares outside of the range [0, GRID_SIZE_X) or [0, GRID_SIZE_Y) can be safely ignored
+        - Vicinity is defined by the current brush shape and size centred on the grid square at (px, py); the default diamond brush
+          covers the squares within Manhattan distance d, where d is the current brush size
+
+        Args:
+        - self
+        - layer: The layer being applied from Layer class
+        - px: x position of the brush.
+        - py: y position of the brush.
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function) - from on_paint_stroke
+        - Best case: O(other_function)
+        """
+
+        self.on_paint_stroke(layer, [(px, py)])
+
+
+    def on_paint_stroke(self, layer: Layer, path: list[tuple[int, int]]):
+        """
+        Called when the brush is dragged over a path of grid squares
+        - The brush footprints along the whole path are merged and painted in one pass, so overlapping
+          squares are painted once, and the result is recorded as a single action
+        - Between on_stroke_start and on_stroke_end, it is merged into the action of the whole stroke instead
+
+        Args:
+        - self
+        - layer: The layer being applied from Layer class
+        - path: list of (x, y) squares the brush passed over
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function + painted_squares) - from grid.py
+        - Best case: O(other_function + painted_squares)
+        """
+
+        temp_action = PaintAction([],False) 
+
+        for temp_x, temp_y in self.grid.paint_path(layer, path):
+            temp_action.add_square(temp_x, temp_y, layer.index)
+
+        temp_len = temp_action.step_count()
+
+        if temp_len != 0:
+            self.my_undo_tracker.add_action(temp_action, self.grid)
+
+            # during a stroke, the merged action is only recorded for the replay once the stroke ends
+            if not self.my_undo_tracker.is_action_open():
+                self.my_replay_tracker.add_action(temp_action , False, self.grid.state_hash(), self._keyframe_grid())
+
+
+        
+    def on_stroke_start(self):
+
+        """
+        Called when the mouse button is pressed on the canvas
+        - Opens an action in the UndoTracker, so the whole stroke becomes a single undoable action
+        - A stroke still open (a press without a release) is ended first, so it is recorded for the replay too
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function)
+        - Best case: O(other_function)
+        """
+
+        self.on_stroke_end()
+        self.my_undo_tracker.begin_action(self.grid.add_is_idempotent())
+
+
+    def on_stroke_end(self):
+
+        """
+        Called when the current stroke is finished (or interrupted by another action)
+        - Closes the open action of the UndoTracker and adds the merged stroke to the ReplayTracker
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function)
+        - Best case: O(other_function)
+        """
+
+        temp_action = self.my_undo_tracker.end_action(self.grid)
+
+        if temp_action != None:
+            self.my_replay_tracker.add_action(temp_action , False, self.grid.state_hash(), self._keyframe_grid())
+
+
+    def on_undo(self):
+
+        """
+        Called when an undo is requested
+        - If UndoTracker returns a valid action, it is added to the ReplayTracker, with the undo flag - true
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function + (comp . other_function)) 
+        - Best case: O(other_function + (comp . other_function))
+        """
+
+        self.on_stroke_end()
+        temp_action = self.my_undo_tracker.undo(self.grid)
+
+        if temp_action != None:
+            self.my_replay_tracker.add_action(temp_action , True, self.grid.state_hash(), self._keyframe_grid())
+
+
+    def on_redo(self):
+
+        """
+        Called when a redo is requested
+        - If UndoTracker returns a valid action, it is added to the ReplayTracker
+        
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function + (comp . other_function)) 
+        - Best case: O(other_function + (comp . other_function))
+        
+        """
+        self.on_stroke_end()
+        temp_action = self.my_undo_tracker.redo(self.grid)
+
+        if temp_action != None:
+            self.my_replay_tracker.add_action(temp_action , False, self.grid.state_hash(), self._keyframe_grid())
+        
+
+    def on_undo_many(self, count: int):
+
+        """
+        Called when several undos are requested at once (holding Ctrl+Z)
+        - The UndoTracker applies their net change in one pass; every undone action is still added to the ReplayTracker,
+          with the undo flag - true
+
+        Args:
+        - self
+        - count: number of actions to undo
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function + count . other_function) - from undo.py and replay.py
+        - Best case: O(other_function)
+        """
+
+        self.on_stroke_end()
+        self.record_replay([(temp_action, True) for temp_action in self.my_undo_tracker.undo_many(self.grid, count)])
+
+
+    def on_redo_many(self, count: int):
+
+        """
+        Called when several redos are requested at once (holding Ctrl+Y)
+        - The UndoTracker applies their net change in one pass; every redone action is still added to the ReplayTracker
+
+        Args:
+        - self
+        - count: number of actions to redo
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function + count . other_function) - from undo.py and replay.py
+        - Best case: O(other_function)
+        """
+
+        self.on_stroke_end()
+        self.record_replay([(temp_action, False) for temp_action in self.my_undo_tracker.redo_many(self.grid, count)])
+
+
+    def on_switch_branch(self):
+
+        """
+        Called when switching to another branch of the undo history is requested (Tab)
+        - Redoes into the next branch that continues from the current point; the change is added to the ReplayTracker
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function) - from checkout of the UndoTracker
+        - Best case: O(other_function)
+        """
+
+        self.on_stroke_end()
+        self.record_replay(self.my_undo_tracker.switch_branch(self.grid))
+
+
+    def on_seek(self, index: int):
+
+        """
+        Called when a jump to a point of the undo history is requested
+        - Used by the history timeline; only the squares that differ between the two points are changed
+        - The change is added to the ReplayTracker, so the replay shows the jump
+
+        Args:
+        - self
+        - index: position in the undo history to jump to
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function) - from seek of the UndoTracker
+        - Best case: O(other_function)
+        """
+
+        self.on_stroke_end()
+        self.record_replay(self.my_undo_tracker.seek(self.grid, index))
+
+
+    def record_replay(self, entries: list[tuple[PaintAction, bool]]):
+
+        """
+        Adds the entries of a change made in one pass over the grid to the ReplayTracker
+        - Only the state after the last entry is known, so only that one is recorded with the hash of the grid
+
+        Args:
+        - self
+        - entries: list of (action, is_undo), in the order they have to be replayed
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(len(entries) . other_function) - from replay.py
+        - Best case: O(1)
+        """
+
+        for temp_index in range(len(entries)):
+            temp_action, temp_is_undo = entries[temp_index]
+            # the grid is only in its state after an entry once all of them are applied
+            if temp_index == len(entries) - 1:
+                self.my_replay_tracker.add_action(temp_action , temp_is_undo, self.grid.state_hash(), self._keyframe_grid())
+            else:
+                self.my_replay_tracker.add_action(temp_action , temp_is_undo)
+
+
+    def _keyframe_grid(self) -> Grid|None:
+
+        """
+        Returns the grid for the replay to take keyframes from while recording (see ReplayTracker.add_action)
+        - None after a recovery: the grid did not start empty, so it is not the grid the replay plays
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - the grid of Grid class, or None
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        return self.grid if self.my_replay_from_empty else None
+
+
+    def on_special(self):
+
+        """
+        Called when the special action is requested
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function) 
+        - Best case: O(other_function)
+        """
+
+        self.on_stroke_end()
+        self.grid.special()
+        self.my_undo_tracker.add_action(PaintAction([], True), self.grid)
+        self.my_replay_tracker.add_action(PaintAction([], True) , False, self.grid.state_hash(), self._keyframe_grid())
+
+
+    def on_replay_start(self):
+
+        """
+        Called when the replay starting is requested
+        - The grid is empty, so the replay log is rewound to play the whole session
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(1) 
+        - Best case: O(1)
+        """
+
+        self.my_replay_tracker.set_playback(self.REPLAY_PLAYBACK, self.REPLAY_PLAYBACK_VALUE, self.REPLAY_FRAME_BUDGET)
+        self.my_replay_tracker.rewind()
+        self.my_replay_tracker.set_reverse(False)
+        self.my_replay_tracker.set_verify(self.REPLAY_VERIFY)
+        self.my_replay_tracker.start_replay()
+
+
+    def on_replay_seek(self, index: int):
+
+        """
+        Called when the timeline is dragged during a replay: the replay goes on from the given action
+        - The grid is brought there from the nearest keyframe (see ReplayTracker.seek)
+
+        Args:
+        - self
+        - index: number of actions of the replay log played after the seek
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function) - from replay.py
+        - Best case: O(1)
+        """
+
+        self.my_replay_tracker.seek(self.grid, index)
+        self.my_replay_tracker.start_replay()
+
+
+    def on_replay_next_step(self) -> bool:
+
+        """
+        Called when the next step of the replay is requested.
+        Returns whether the replay is finished or not
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function + (comp . other_function)) - from replay.py
+        - Best case: O(other_function + (comp . other_function))
+        """
+
+        return self.my_replay_tracker.play_next_action(self.grid)
+
+
+    def on_replay_frame(self, delta_time: float) -> bool:
+
+        """
+        Called every frame of the replay, plays the actions due in that frame (see ReplayTracker.play_frame)
+        Returns whether the replay is finished or not
+
+        Args:
+        - self
+        - delta_time: seconds since the previous frame
+
+        Raises:
+        - None
+
+        Returns:
+        - boolean value True if the replay is finished; never while it plays backwards
+
+        Complexity:
+        - Worst case: O(other_function) - from replay.py
+        - Best case: O(other_function)
+        """
+
+        temp_finished = self.my_replay_tracker.play_frame(self.grid, delta_time)
+        if temp_finished and self.my_replay_tracker.is_reverse():
+            # back at the start: the replay goes on forwards, so it ends on the grid of the session
+            self.my_replay_tracker.set_reverse(False)
+            self.my_replay_tracker.start_replay()
+            return False
+        return temp_finished
+
+
+    def on_replay_reverse(self):
+
+        """
+        Called when the direction of the replay is to be switched (R during a replay): from the current point,
+        the replay plays backwards to the start, or forwards again
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        self.my_replay_tracker.set_reverse(not self.my_replay_tracker.is_reverse())
+        self.my_replay_tracker.start_replay()
+
+
+    def on_replay_fast_forward(self):
+
+        """
+        Called when a faster replay is requested (F during a replay): doubles the speed of the replay in progress
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        temp_tracker = self.my_replay_tracker
+        if temp_tracker.my_playback == ReplayTracker.PLAYBACK_MULTIPLIER:
+            temp_tracker.set_playback(temp_tracker.my_playback, 2 * temp_tracker.my_playback_value, temp_tracker.my_frame_budget)
+        elif temp_tracker.my_playback == ReplayTracker.PLAYBACK_DURATION:
+            temp_tracker.my_rate *= 2
+        
+
+    def on_increase_brush_size(self):
+
+        """
+        Called when an increase to the brush size is requested
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(comp) - from grid.py
+        - Best case: O(comp)
+        """
+
+        self.grid.increase_brush_size()
+
+
+    def on_decrease_brush_size(self):
+
+        """
+        Called when a decrease to the brush size is requested
+        
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(comp) - from grid.py
+        - Best case: O(comp)
+        """
+        
+        self.grid.decrease_brush_size()
+
+
+    def on_change_brush_shape(self):
+
+        """
+        Called when a change of the brush shape is requested (B key)
+        - Cycles between the diamond, square and disc brushes
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(comp) - from grid.py
+        - Best case: O(comp)
+        """
+
+        self.grid.change_brush_shape()
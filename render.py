@@ -0,0 +1,228 @@
+"""
+Headless replay renderer.
+
+Renders the replay of a session file (see session.py) to a directory of PNG frames, or to one
+raw RGB24 stream (e.g. to pipe into a video encoder), without opening a window:
+
+    python render.py session.pses frames/
+    python render.py session.pses --raw - --scale 4 | ffmpeg -f rawvideo -pix_fmt rgb24 -s 128x128 -i - out.mp4
+
+The session is played once, taking a keyframe of the grid and the position in the file (see
+SessionReader.tell) at the start of every segment of frames; each segment is then rendered in a
+worker process, from its keyframe and decoding the file from that position only.
+
+run_headless runs a driver function of visuals/ the same way, on a virtual clock (see clock.py).
+"""
+
+from __future__ import annotations
+import argparse
+import multiprocessing
+import os
+import struct
+import sys
+import zlib
+from clock import VirtualClock
+from grid import Grid
+from paint_session import PaintSession
+from replay import ReplayTracker
+from session import SessionReader
+
+BG = (255, 255, 255)
+# segments per worker, so workers that get cheap segments are not left idle
+SEGMENTS_PER_WORKER = 4
+
+
+def frame_size(grid: Grid, scale: int) -> tuple[int, int]:
+    """Width and height in pixels of the frames of a grid: grid[x][y] is drawn at (x, y), x running over its rows."""
+    return grid.num_of_rows * scale, grid.num_of_cols * scale
+
+
+def render_frame(grid: Grid, timestamp: float, scale: int) -> bytes:
+    """The grid as raw RGB24 rows, top row first, each square scale x scale pixels (see frame_size)."""
+    rows = []
+    for y in reversed(range(grid.num_of_cols)):
+        pixels = b"".join(
+            bytes(grid[x][y].get_color(list(BG), timestamp, x, y)) * scale
+            for x in range(grid.num_of_rows)
+        )
+        rows.extend([pixels] * scale)
+    return b"".join(rows)
+
+
+def write_png(path: str, width: int, height: int, rgb: bytes) -> None:
+    """Writes raw RGB24 rows as an 8 bit truecolour PNG."""
+    stride = 3 * width
+    scanlines = b"".join(b"\x00" + rgb[row * stride:(row + 1) * stride] for row in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    with open(path, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        file.write(chunk(b"IDAT", zlib.compress(scanlines, 6)))
+        file.write(chunk(b"IEND", b""))
+
+
+def frame_path(output: str, frame: int) -> str:
+    return os.path.join(output, "frame_{0:06d}.png".format(frame))
+
+
+def _render_segment(task: tuple) -> bytes:
+    """
+    Renders frames [first, last) of a session from the keyframe of the grid before the first one,
+    decoding the file from the position of the first action of the segment.
+    Writes them as PNGs if output is a directory, otherwise returns them as one raw stream.
+    """
+    path, keyframe, position, first, last, every, scale, output = task
+    raw = []
+    with SessionReader(path) as reader:
+        grid = reader.make_grid()
+        grid.restore(keyframe)
+        reader.seek(position)
+        width, height = frame_size(grid, scale)
+        frame = first
+        for index, (action, is_undo) in enumerate(reader, first * every):
+            if is_undo:
+                action.undo_apply(grid)
+            else:
+                action.redo_apply(grid)
+            if (index + 1) % every == 0:
+                frame = _emit(grid, frame, scale, output, width, height, raw)
+                if frame == last:
+                    break
+        if frame < last:
+            # the last frame shows the end of a session whose length is not a multiple of every
+            _emit(grid, frame, scale, output, width, height, raw)
+    return b"".join(raw)
+
+
+def _emit(grid: Grid, frame: int, scale: int, output: str | None, width: int, height: int, raw: list) -> int:
+    rgb = render_frame(grid, frame * ReplayTracker.ACTION_INTERVAL, scale)
+    if output is None:
+        raw.append(rgb)
+    else:
+        write_png(frame_path(output, frame), width, height, rgb)
+    return frame + 1
+
+
+def render_session(path: str, output: str | None = None, raw=None, every: int = 1, scale: int = 8, workers: int = 1) -> int:
+    """
+    Renders one frame every `every` actions of a session (plus one for the end of the session).
+
+    Args:
+    - path: session file
+    - output: directory to write PNG frames to, or None
+    - raw: binary file to write the frames to as one raw RGB24 stream, when output is None
+    - every: actions per frame
+    - scale: pixels per grid square
+    - workers: number of worker processes; 1 renders in this process
+
+    Returns:
+    - the number of frames rendered
+    """
+    with SessionReader(path) as reader:
+        action_count = sum(1 for _ in reader)
+    frames = -(-action_count // every)
+    segment_count = max(1, min(frames, workers * SEGMENTS_PER_WORKER if workers > 1 else 1))
+    bounds = [frames * segment // segment_count for segment in range(segment_count + 1)]
+
+    # play the session up to the start of every segment, keeping the grid and the position in the file there
+    tasks = []
+    with SessionReader(path) as reader:
+        grid = reader.make_grid()
+        actions = iter(reader)
+        index = 0
+        for segment in range(segment_count):
+            while index < bounds[segment] * every:
+                action, is_undo = next(actions)
+                if is_undo:
+                    action.undo_apply(grid)
+                else:
+                    action.redo_apply(grid)
+                index += 1
+            keyframe = None if index == 0 else grid.snapshot()
+            tasks.append((path, keyframe, reader.tell(), bounds[segment], bounds[segment + 1], every, scale, output))
+        grid.release()
+
+    if output is not None:
+        os.makedirs(output, exist_ok=True)
+    if workers > 1 and segment_count > 1:
+        with multiprocessing.Pool(workers) as pool:
+            for data in pool.imap(_render_segment, tasks):
+                if raw is not None:
+                    raw.write(data)
+    else:
+        for task in tasks:
+            data = _render_segment(task)
+            if raw is not None:
+                raw.write(data)
+    return frames
+
+
+def run_headless(func, output: str | None = None, raw=None, every: int = 1, scale: int = 8, frame_time: float = VirtualClock.FRAME_TIME) -> int:
+    """
+    Runs a driver function written for main.run_with_func (e.g. in visuals/) on a PaintSession on a VirtualClock,
+    instead of a window: window.clock.sleep(seconds) plays the frames of those seconds at once.
+
+    Args:
+    - func: driver function, given the session
+    - output: directory to write one frame every `every` frames to as a PNG (numbered from 0), or None
+    - raw: binary file to write those frames to as one raw RGB24 stream, or None
+    - every: frames played per frame rendered
+    - scale: pixels per grid square
+    - frame_time: seconds per frame
+
+    Returns:
+    - the number of frames played
+    """
+    clock = VirtualClock(frame_time)
+    session = PaintSession(clock=clock)
+    frames = 0
+
+    def play_frame(delta_time: float) -> None:
+        nonlocal frames
+        session.update(delta_time)
+        frames += 1
+        if frames % every != 0 or (output is None and raw is None):
+            return
+        grid = session.grid
+        rgb = render_frame(grid, session.timestamp, scale)
+        if output is not None:
+            write_png(frame_path(output, frames // every - 1), *frame_size(grid, scale), rgb)
+        if raw is not None:
+            raw.write(rgb)
+
+    if output is not None:
+        os.makedirs(output, exist_ok=True)
+    clock.add_listener(play_frame)
+    func(session)
+    return frames
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Renders the replay of a session file to frames.")
+    parser.add_argument("session", help="session file to render")
+    parser.add_argument("output", nargs="?", help="directory to write frame_NNNNNN.png files to")
+    parser.add_argument("--raw", help="file to write one raw RGB24 stream to instead, - for stdout")
+    parser.add_argument("--every", type=int, default=1, help="actions per frame")
+    parser.add_argument("--scale", type=int, default=8, help="pixels per grid square")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    args = parser.parse_args(argv)
+    if (args.output is None) == (args.raw is None):
+        parser.error("give either an output directory or --raw")
+    if args.every < 1 or args.scale < 1 or args.workers < 1:
+        parser.error("--every, --scale and --workers must be positive")
+
+    if args.raw is None:
+        frames = render_session(args.session, output=args.output, every=args.every, scale=args.scale, workers=args.workers)
+    elif args.raw == "-":
+        frames = render_session(args.session, raw=sys.stdout.buffer, every=args.every, scale=args.scale, workers=args.workers)
+    else:
+        with open(args.raw, "wb") as raw:
+            frames = render_session(args.session, raw=raw, every=args.every, scale=args.scale, workers=args.workers)
+    print("{0} frames".format(frames), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
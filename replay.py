@@ -1,23 +1,64 @@
 from __future__ import annotations
+from array import array
 from action import PaintAction
+from clock import Clock
 from grid import Grid
-from data_structures.queue_adt import CircularQueue
+from replay_log import ReplayLog
+from data_structures.array_sorted_list import ArraySortedList
+from data_structures.sorted_list_adt import ListItem
 
 class ReplayTracker:
 
-    MAX_CAPACITY = 10000
+    # Playback modes for play_frame, and what their value means:
+    # - MULTIPLIER: speed relative to one action every ACTION_INTERVAL seconds
+    # - DURATION: the whole replay takes this many seconds
+    # - BUDGET: as many actions as fit in the frame budget, every frame
+    PLAYBACK_MULTIPLIER = "MULTIPLIER"
+    PLAYBACK_DURATION = "DURATION"
+    PLAYBACK_BUDGET = "BUDGET"
+    PLAYBACK_OPTIONS = (
+        PLAYBACK_MULTIPLIER,
+        PLAYBACK_DURATION,
+        PLAYBACK_BUDGET,
+    )
+
+    ACTION_INTERVAL = 0.05
+    # seconds of a frame play_frame may spend applying actions, so frames stay steady whatever the mode
+    FRAME_BUDGET = 1 / 120
+
+    # a grid keyframe is recorded every my_keyframe_interval actions played, starting with KEYFRAME_INTERVAL;
+    # past MAX_KEYFRAMES, the interval doubles and every other keyframe is dropped
+    KEYFRAME_INTERVAL = 64
+    MAX_KEYFRAMES = 64
+
+    # stored in my_hashes for actions recorded without the hash of the grid after them
+    NO_HASH = (1 << 64) - 1
 
     my_start_replay = False 
 
-    def __init__ (self) -> None:
+    def __init__ (self, log: ReplayLog = None, clock: Clock = None) -> None:
 
         """
         defining the magic method : __init__ 
         - This initialises an object of the Replaytracker class; 
-        - The data structure used is CircularQueue
+        - The data structure used for the log is ReplayLog, indexed by action and not capped: full chunks are
+          spilled to a segment file and streamed back in while playing, so only a few stay in memory
+        - Playing does not consume the log, a cursor (my_cursor) marks the next action to play, so the log can be
+          rewound and played again
+        - Grid keyframes are kept in an ArraySortedList keyed by the index of the action they were taken before,
+          starting with the empty grid at 0, so seek only has to play a few actions
+        - The hash of the grid after every action (see Grid.state_hash) is kept in an array, 8 bytes per action; in
+          verify mode, playing compares them with the grid and records the first action where they differ
+        - Playing backwards restores a segment from its keyframe when the inverse of an action is not exact; the states
+          of the squares each action of that segment overwrote are kept (my_segment), so the next actions back are
+          taken back exactly without restoring the segment again
+        - The frame budget of play_frame is measured on my_clock, so on a VirtualClock it never runs out and
+          frames are played the same way every time
         
         Args:
         - self
+        - log: ReplayLog to record into, a new one with a temporary segment file if None
+        - clock: Clock the frame budget is measured on, wall clock time if None
         
         Raises:
         - None
@@ -30,13 +71,31 @@ class ReplayTracker:
         - Best case: O(other_function) 
         """
         
-        self.my_replay_queue = CircularQueue(self.MAX_CAPACITY)
+        self.my_replay_log = ReplayLog() if log is None else log
+        self.my_cursor = 0
+        self.my_keyframe_interval = self.KEYFRAME_INTERVAL
+        self.my_keyframes = ArraySortedList(self.MAX_KEYFRAMES + 1)
+        self.my_keyframes.add(ListItem(None, 0))
+        # per action from my_segment_start on, the grid squares it overwrote, as they were before it
+        self.my_segment_start = 0
+        self.my_segment = []
+        self.my_hashes = array("Q")
+        self.my_verify = False
+        self.my_divergence = None
+        self.my_reverse = False
+        self.my_playback = self.PLAYBACK_MULTIPLIER
+        self.my_playback_value = 1
+        self.my_frame_budget = self.FRAME_BUDGET
+        self.my_clock = Clock() if clock is None else clock
+        # actions per second of the DURATION mode, and how many actions play_frame is behind on
+        self.my_rate = 0
+        self.my_due = 0
 
 
     def clear_replay (self) -> None:
 
         """
-        Completely empties the replay queue
+        Completely empties the replay log, and drops its keyframes
 
         Args:
         - self
@@ -52,13 +111,22 @@ class ReplayTracker:
         - Best case: O(other_function) 
         """
 
-        self.my_replay_queue.clear()
+        self.my_replay_log.clear()
+        self.my_cursor = 0
+        self.my_keyframe_interval = self.KEYFRAME_INTERVAL
+        self.my_keyframes.clear()
+        self.my_keyframes.add(ListItem(None, 0))
+        self.my_segment_start = 0
+        self.my_segment = []
+        self.my_hashes = array("Q")
+        self.my_divergence = None
 
 
     def start_replay(self) -> None:
         """
         Called whenever we should stop taking actions, and start playing them back.
         - It indicates the start of the replay
+        - Playing goes on from the cursor: the actions recorded since the last replay, unless the log was rewound or sought
 
         Args:
         - self
@@ -75,9 +143,44 @@ class ReplayTracker:
         """
 
         self.my_start_replay = True
+        self.my_due = 0
+        if self.my_playback == self.PLAYBACK_DURATION:
+            self.my_rate = self._actions_left() / self.my_playback_value
 
 
-    def add_action(self, action: PaintAction, is_undo: bool = False) -> None:
+    def set_playback(self, mode: str, value: float = 1, frame_budget: float = FRAME_BUDGET) -> None:
+
+        """
+        Chooses how fast play_frame plays the replay (see PLAYBACK_OPTIONS); takes effect on the next start_replay
+        for the DURATION mode, straight away for the others
+
+        Args:
+        - self
+        - mode: one of PLAYBACK_OPTIONS
+        - value: the multiplier, or the duration in seconds; ignored by the BUDGET mode
+        - frame_budget: seconds of each frame that may be spent applying actions
+
+        Raises:
+        - ValueError if the mode is not one of PLAYBACK_OPTIONS, or the value is not positive
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        if mode not in self.PLAYBACK_OPTIONS:
+            raise ValueError("Unknown playback mode: {0}".format(mode))
+        if value <= 0:
+            raise ValueError("Playback value must be positive")
+        self.my_playback = mode
+        self.my_playback_value = value
+        self.my_frame_budget = frame_budget
+
+
+    def add_action(self, action: PaintAction, is_undo: bool = False, state_hash: int = None, grid: Grid = None) -> None:
 
         """
         Adds the input action to the ReplayTracker
@@ -85,10 +188,16 @@ class ReplayTracker:
         `is_undo` specifies whether the action was an undo action or not.
         Special, Redo, and Draw all have this is False.
 
+        - Given the grid, in its state after the action as played from an empty grid (e.g. the grid the actions are
+          recorded from), the keyframe due after the action is taken from it, so seek is cheap before the log was
+          ever played
+
         Args:
         - self
         - action of PaintAction class
         - is_undo that is a boolean value
+        - state_hash: Grid.state_hash of the grid after the action, checked in verify mode; None if unknown
+        - grid of Grid class, optional
         
         Raises:
         - None
@@ -97,15 +206,314 @@ class ReplayTracker:
         - None
 
         Complexity:
-        - Worst case: O(comp . other_function)
+        - Worst case: O(comp . other_function), other_function from snapshot of the grid when a keyframe is due
         - Best case: O(comp . other_function) 
         """
 
         if self.my_start_replay == False:
-            self.my_replay_queue.append((action , is_undo))
+            self.my_replay_log.append(action , is_undo)
+            self.my_hashes.append(self.NO_HASH if state_hash is None else state_hash)
+            if grid is not None:
+                self._add_keyframe(grid, len(self.my_replay_log))
+
+
+    def state_hash(self, index: int) -> int | None:
+
+        """
+        Returns the hash of the grid recorded after the action with the given index, None if it was not recorded
+
+        Args:
+        - self
+        - index: index of the action in the log
+
+        Raises:
+        - IndexError if there is no such action
+
+        Returns:
+        - int or None
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        temp_hash = self.my_hashes[index]
+        return None if temp_hash == self.NO_HASH else temp_hash
+
+
+    def set_verify(self, verify: bool) -> None:
+
+        """
+        Turns the verify mode on or off
+        - In verify mode, the hash of the grid is compared with the recorded one after every action played, and
+          the index of the first action after which they differ is kept (see first_divergence)
+        - Turning it on forgets any divergence found before
+
+        Args:
+        - self
+        - verify: boolean value
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        self.my_verify = verify
+        if verify:
+            self.my_divergence = None
+
+
+    def first_divergence(self) -> int | None:
+
+        """
+        Returns the index of the first action after which the grid did not match its recorded hash in verify mode,
+        None if none did
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - int or None
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        return self.my_divergence
+
+
+    def action_count(self) -> int:
+
+        """
+        Returns the number of actions in the replay log
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - int
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        return len(self.my_replay_log)
+
+
+    def remaining_count(self) -> int:
+
+        """
+        Returns the number of actions left to play after the cursor
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - int
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        return len(self.my_replay_log) - self.my_cursor
+
+
+    def set_reverse(self, reverse: bool) -> None:
+
+        """
+        Chooses the direction of playing: in reverse, play_next_action and play_frame walk the log backwards from the
+        cursor, undoing the actions one at a time, and are finished at the start of the log
+
+        Args:
+        - self
+        - reverse: boolean value
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        self.my_reverse = reverse
+
+
+    def is_reverse(self) -> bool:
+
+        """
+        Returns whether the replay plays backwards (see set_reverse)
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - boolean value
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        return self.my_reverse
+
+
+    def position(self) -> int:
+
+        """
+        Returns the number of actions of the log played to get to the grid shown, i.e. the cursor
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - int
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        return self.my_cursor
+
+
+    def _actions_left(self) -> int:
+
+        """
+        Returns the number of actions left to play in the current direction
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - int
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        return self.my_cursor if self.my_reverse else self.remaining_count()
+
+
+    def rewind(self) -> None:
+
+        """
+        Moves the cursor back to the first action, to play the log again on an empty grid; keyframes are kept
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        self.my_cursor = 0
+
+
+    def seek(self, grid: Grid, index: int) -> None:
+
+        """
+        Brings the grid to the state after the first index actions of the log, and moves the cursor there
+        - The nearest keyframe at or before index is restored and the actions after it are played, unless playing on
+          from the cursor is shorter; keyframes are recorded on the way, so seeking again near there is cheap
+        - Keyframes are taken while recording when add_action is given the grid, and while playing; a log that got
+          neither (e.g. one read with load_session) has none yet, so seeking in it is O(distance from the start)
+          until that part was played once
+        - Keyframes hold the grid as played from an empty grid, so the replay has to start from one
+
+        Args:
+        - self
+        - grid of Grid class, in its state at the cursor
+        - index: number of actions played after the seek, clamped to [0, action_count]
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function + my_keyframe_interval . other_function), from restore of the grid and play_next_action,
+          once keyframes were recorded up to index; O(index . other_function) before
+        - Best case: O(1), when already at index
+        """
+
+        index = max(0, min(index, len(self.my_replay_log)))
+        temp_keyframe = self._keyframe_before(index)
+        if not (self.my_cursor <= index and self.my_cursor >= temp_keyframe.key):
+            grid.restore(temp_keyframe.value)
+            self.my_cursor = temp_keyframe.key
+        while self.my_cursor < index:
+            self._play(grid, self.my_cursor)
 
         
 
+    def _keyframe_before(self, index: int) -> ListItem:
+
+        """
+        Returns the nearest keyframe at or before the given index of the log
+
+        Args:
+        - self
+        - index: index of the log
+
+        Raises:
+        - None
+
+        Returns:
+        - ListItem of the grid snapshot, keyed by its index
+
+        Complexity:
+        - Worst case: O(len(self.my_keyframes))
+        - Best case: O(1)
+        """
+
+        temp_keyframe = None
+        for keyframe_index in range(len(self.my_keyframes)):
+            if self.my_keyframes[keyframe_index].key > index:
+                break
+            temp_keyframe = self.my_keyframes[keyframe_index]
+        return temp_keyframe
+
+
     def play_next_action(self, grid: Grid) -> bool:
 
         """
@@ -130,11 +538,41 @@ class ReplayTracker:
         - Best case: O(other_function + (comp . other_function)) 
         """
 
-        if self.my_replay_queue.is_empty():
+        if self._actions_left() == 0:
             self.my_start_replay = False
             return True
 
-        temp_tuple = self.my_replay_queue.serve()
+        if self.my_reverse:
+            self._unplay(grid, self.my_cursor - 1)
+        else:
+            self._play(grid, self.my_cursor)
+        return False
+
+
+    def _play(self, grid: Grid, index: int) -> None:
+
+        """
+        Plays the action with the given index (which has to be the cursor) and moves the cursor past it
+        - Records a keyframe when one is due at the new cursor
+        - In verify mode, records the action as the first divergence if the grid does not match its recorded hash
+
+        Args:
+        - self
+        - grid of Grid class
+        - index: the cursor
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function), from the action and from snapshot of the grid when a keyframe is due
+        - Best case: O(other_function)
+        """
+
+        temp_tuple = self.my_replay_log[index]
         temp_paint_action = temp_tuple [0]
         temp_flag = temp_tuple [1]
 
@@ -144,9 +582,214 @@ class ReplayTracker:
         else:
             temp_paint_action.undo_apply(grid)
 
+        if self.my_verify and self.my_divergence is None:
+            temp_hash = self.my_hashes[index]
+            if temp_hash != self.NO_HASH and temp_hash != grid.state_hash():
+                self.my_divergence = index
+
+        self.my_cursor = index + 1
+        self._add_keyframe(grid, self.my_cursor)
+
+
+    def _add_keyframe(self, grid: Grid, index: int) -> None:
+
+        """
+        Records the grid as the keyframe before the action with the given index, if one is due there and the
+        keyframes do not reach it yet
+
+        Args:
+        - self
+        - grid of Grid class, in its state after the first index actions of the log
+        - index: index of the log
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function + len(self.my_keyframes) ^ 2), from snapshot of the grid and _thin_keyframes
+        - Best case: O(1)
+        """
+
+        if index % self.my_keyframe_interval == 0:
+            temp_last = self.my_keyframes[len(self.my_keyframes) - 1].key
+            if temp_last < index:
+                self.my_keyframes.add(ListItem(grid.snapshot(), index))
+                if len(self.my_keyframes) > self.MAX_KEYFRAMES:
+                    self._thin_keyframes()
+
+
+    def _unplay(self, grid: Grid, index: int) -> None:
+
+        """
+        Takes back the action with the given index (which has to be the one before the cursor) and moves the cursor
+        before it
+        - If the action is in my_segment, the squares it overwrote are set back to their states before it
+        - Otherwise the inverse of the action is applied (undo_apply for a recorded redo, redo_apply for a recorded
+          undo), which is exact in many cases but not all: e.g. erasing in an AdditiveLayerStore drops the oldest
+          layer, and adding to a SetLayerStore forgets the layer it replaces
+        - So the grid is checked against the hash recorded before the action; if it does not match, or no hash was
+          recorded, the segment of the action is restored from its keyframe instead (see _restore_segment)
+
+        Args:
+        - self
+        - grid of Grid class, in its state at the cursor
+        - index: the cursor - 1
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function + my_keyframe_interval . other_function), from _restore_segment
+        - Best case: O(other_function), from the action and state_hash of the grid, or restore of the LayerStores
+        """
+
+        temp_tuple = self.my_replay_log[index]
+        if self.my_segment_start <= index < self.my_segment_start + len(self.my_segment):
+            temp_before = self.my_segment[index - self.my_segment_start]
+            if temp_tuple[0].is_special:
+                grid.restore(temp_before)
+            else:
+                for x, y, state in temp_before:
+                    grid[x][y].restore(state)
+            self.my_cursor = index
+            return
+
+        temp_expected = 0 if index == 0 else self.my_hashes[index - 1]
+        if temp_expected != self.NO_HASH:
+            if temp_tuple[1] == False:
+                temp_tuple[0].undo_apply(grid)
+            else:
+                temp_tuple[0].redo_apply(grid)
+            if grid.state_hash() == temp_expected:
+                self.my_cursor = index
+                return
+
+        self._restore_segment(grid, index)
+
+
+    def _restore_segment(self, grid: Grid, index: int) -> None:
+
+        """
+        Brings the grid to the state after the first index actions of the log from the nearest keyframe at or before
+        index, like seek, and keeps in my_segment what every action played on the way overwrote
+        - For an action, that is the state of every square it paints, before it; for a special action, which changes
+          the whole grid, a snapshot of the grid
+
+        Args:
+        - self
+        - grid of Grid class
+        - index: index of the log
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function + my_keyframe_interval . (other_function + snapshot of the grid)), from restore of
+          the grid and _play, and snapshot of the grid for special actions
+        - Best case: O(other_function), from restore of the grid, when index is the index of the keyframe
+        """
+
+        temp_keyframe = self._keyframe_before(index)
+        grid.restore(temp_keyframe.value)
+        self.my_cursor = temp_keyframe.key
+        self.my_segment_start = self.my_cursor
+        self.my_segment = []
+        while self.my_cursor < index:
+            temp_action = self.my_replay_log[self.my_cursor][0]
+            if temp_action.is_special:
+                self.my_segment.append(grid.snapshot())
+            else:
+                temp_steps = temp_action.packed_steps
+                temp_squares = {(temp_steps[step_index], temp_steps[step_index + 1]) for step_index in range(0, len(temp_steps), 3)}
+                self.my_segment.append(tuple((x, y, grid[x][y].snapshot()) for x, y in temp_squares))
+            self._play(grid, self.my_cursor)
+
+
+    def _thin_keyframes(self) -> None:
+
+        """
+        Doubles the keyframe interval and drops the keyframes that are not on it anymore
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(len(self.my_keyframes) ^ 2), from delete_at_index
+        - Best case: O(len(self.my_keyframes) ^ 2)
+        """
+
+        self.my_keyframe_interval *= 2
+        temp_index = 0
+        while temp_index < len(self.my_keyframes):
+            if self.my_keyframes[temp_index].key % self.my_keyframe_interval != 0:
+                self.my_keyframes.delete_at_index(temp_index)
+            else:
+                temp_index += 1
+
+
+    def play_frame(self, grid: Grid, delta_time: float) -> bool:
+
+        """
+        Plays the actions due in a frame that lasted delta_time seconds, according to the playback mode
+        - Whatever the mode, applying actions stops once the frame budget is spent; the actions left over are
+          played in the next frames, so a heavy replay slows down instead of dropping frames
+        - In the BUDGET mode at least one action is played every frame
+
+        Args:
+        - self
+        - grid of Grid class
+        - delta_time: seconds since the previous frame
+
+        Raises:
+        - None
+
+        Returns:
+        - boolean value True if there are no more actions to play
+        - otherwise return false
+
+        Complexity:
+        - Worst case: O(actions due . other_function), other_function from play_next_action
+        - Best case: O(1)
+        """
+
+        if self.my_playback == self.PLAYBACK_MULTIPLIER:
+            self.my_due += delta_time * self.my_playback_value / self.ACTION_INTERVAL
+        elif self.my_playback == self.PLAYBACK_DURATION:
+            self.my_due += delta_time * self.my_rate
+        else:
+            self.my_due = 1
+
+        temp_deadline = self.my_clock.now() + self.my_frame_budget
+        while self.my_due >= 1:
+            if self.play_next_action(grid):
+                return True
+            if self.my_playback != self.PLAYBACK_BUDGET:
+                self.my_due -= 1
+            if self.my_clock.now() >= temp_deadline:
+                break
+        if self.my_playback == self.PLAYBACK_BUDGET:
+            self.my_due = 0
+
+        if self._actions_left() == 0:
+            self.my_start_replay = False
+            return True
         return False
-        
-        
+
 
 if __name__ == "__main__":
     action1 = PaintAction([], is_special=True)
@@ -0,0 +1,151 @@
+"""
+Growable replay log.
+
+Actions are appended to chunks of CHUNK_ACTIONS entries. Full chunks are written to a segment
+file, and only a few of them are kept in memory: reading an action of a chunk that is not
+resident streams the chunk back in, evicting the least recently used one. So the length of
+a log is bounded by the disk, not by memory.
+
+A chunk is stored in the segment file as uint32 words in the native byte order (the file only
+lives as long as the log), per entry:
+- flags (FLAG_SPECIAL, FLAG_UNDO) and step count
+- the packed (x, y, layer index) steps of the action
+"""
+
+from __future__ import annotations
+import tempfile
+from array import array
+from action import PaintAction
+
+FLAG_SPECIAL = 1
+FLAG_UNDO = 2
+
+
+class ReplayLog:
+    """
+    Indexable, append-only sequence of (action, is_undo) entries, spilled to a segment file in chunks.
+    """
+
+    CHUNK_ACTIONS = 4096
+    MAX_RESIDENT_CHUNKS = 4
+
+    def __init__(self, path: str | None = None, chunk_actions: int = CHUNK_ACTIONS, max_resident_chunks: int = MAX_RESIDENT_CHUNKS) -> None:
+        """
+        Args:
+        - path: segment file, an anonymous temporary file if None
+        - chunk_actions: entries per chunk
+        - max_resident_chunks: full chunks kept in memory, besides the one being appended to
+        """
+        self.path = path
+        # opened with the first full chunk, so short logs never touch the disk
+        self.file = None
+        self.chunk_actions = chunk_actions
+        self.max_resident_chunks = max(1, max_resident_chunks)
+        self.length = 0
+        # the chunk being appended to, never written yet
+        self.tail = []
+        # per full chunk: offset and size of its words in the segment file
+        self.offsets = array("Q")
+        self.sizes = array("Q")
+        # resident full chunks by index, least recently used first
+        self.resident = {}
+
+    def __len__(self) -> int:
+        """Number of entries in the log."""
+        return self.length
+
+    def __getitem__(self, index: int) -> tuple[PaintAction, bool]:
+        """
+        Entry with the given index, read back from the segment file if its chunk is not resident.
+
+        Complexity:
+        - Worst case: O(chunk_actions + steps of the chunk), when the chunk is streamed in
+        - Best case: O(1)
+        """
+        if not 0 <= index < self.length:
+            raise IndexError("Index out of range")
+        chunk_index, entry_index = divmod(index, self.chunk_actions)
+        if chunk_index == len(self.offsets):
+            return self.tail[entry_index]
+        chunk = self.resident.pop(chunk_index, None)
+        if chunk is None:
+            chunk = self._read_chunk(chunk_index)
+        # (re)inserted last, as the most recently used
+        self.resident[chunk_index] = chunk
+        self._evict()
+        return chunk[entry_index]
+
+    def append(self, action: PaintAction, is_undo: bool) -> None:
+        """
+        Adds an entry at the end; the chunk is written to the segment file once it is full.
+
+        Complexity:
+        - Worst case: O(chunk_actions + steps of the chunk), when the chunk is written
+        - Best case: O(1)
+        """
+        self.tail.append((action, is_undo))
+        self.length += 1
+        if len(self.tail) == self.chunk_actions:
+            self._write_chunk(self.tail)
+            self.resident[len(self.offsets) - 1] = self.tail
+            self.tail = []
+            self._evict()
+
+    def clear(self) -> None:
+        """Empties the log and its segment file."""
+        if self.file is not None:
+            self.file.seek(0)
+            self.file.truncate()
+        self.length = 0
+        self.tail = []
+        self.offsets = array("Q")
+        self.sizes = array("Q")
+        self.resident = {}
+
+    def resident_count(self) -> int:
+        """Number of entries held in memory."""
+        return len(self.tail) + self.chunk_actions * len(self.resident)
+
+    def close(self) -> None:
+        """Closes the segment file; an anonymous one is deleted."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _evict(self) -> None:
+        """Drops the least recently used chunks while more than max_resident_chunks are in memory."""
+        while len(self.resident) > self.max_resident_chunks:
+            del self.resident[next(iter(self.resident))]
+
+    def _write_chunk(self, chunk: list) -> None:
+        """Appends a full chunk to the segment file."""
+        words = array("I")
+        for action, is_undo in chunk:
+            flags = (FLAG_SPECIAL if action.is_special else 0) | (FLAG_UNDO if is_undo else 0)
+            words.append(flags)
+            words.append(action.step_count())
+            words.extend(action.packed_steps)
+        data = words.tobytes()
+        if self.file is None:
+            self.file = tempfile.TemporaryFile() if self.path is None else open(self.path, "w+b")
+        offset = self.offsets[-1] + self.sizes[-1] if len(self.offsets) > 0 else 0
+        self.file.seek(offset)
+        self.file.write(data)
+        self.offsets.append(offset)
+        self.sizes.append(len(data))
+
+    def _read_chunk(self, chunk_index: int) -> list:
+        """Reads a full chunk back from the segment file."""
+        self.file.seek(self.offsets[chunk_index])
+        words = array("I")
+        words.frombytes(self.file.read(self.sizes[chunk_index]))
+        chunk = []
+        position = 0
+        while position < len(words):
+            flags, step_count = words[position], words[position + 1]
+            position += 2
+            action = PaintAction([], bool(flags & FLAG_SPECIAL))
+            action.packed_steps = words[position:position + 3 * step_count]
+            position += 3 * step_count
+            chunk.append((action, bool(flags & FLAG_UNDO)))
+        return chunk
@@ -0,0 +1,164 @@
+"""
+Command scripts: batches of painting operations applied to a PaintSession without a window.
+
+    python script.py commands.txt --size 256x256 --pixels
+
+A script is a text file with one command per line; blank lines and everything after a # are ignored:
+- paint LAYER X Y [SIZE]  paints a layer (by name or index) at square (X, Y), with the given brush size
+                          (the current one if omitted)
+- undo [N]                undoes the last N actions (1 if omitted)
+- redo [N]                redoes N actions (1 if omitted)
+- special                 applies the special action
+- style STYLE             switches to a draw style of Grid.DRAW_STYLE_OPTIONS, which resets the session
+                          as the draw mode button of the window does
+The whole script is parsed before any of it is run, so a mistake anywhere is reported (as a ValueError
+naming the line) before the session is touched, and parsing is not part of the measured time.
+"""
+
+from __future__ import annotations
+import argparse
+import sys
+import zlib
+from dataclasses import dataclass
+from time import perf_counter
+from grid import Grid
+from layer_util import get_layers
+from paint_session import PaintSession
+from render import render_frame
+import layers  # registers the layers
+
+OP_PAINT = 0
+OP_UNDO = 1
+OP_REDO = 2
+OP_SPECIAL = 3
+OP_STYLE = 4
+
+
+@dataclass
+class ScriptResult:
+    """
+    Outcome of run_script: the number of commands run and how long they took,
+    and checksums of the final grid.
+    """
+    operations: int
+    seconds: float
+    state_hash: int
+    # CRC-32 of the colours of the grid (see render.render_frame), None if not asked for
+    pixel_checksum: int | None = None
+
+    @property
+    def operations_per_second(self) -> float:
+        return self.operations / self.seconds if self.seconds > 0 else float("inf")
+
+
+def _parse_int(text: str, number: int, low: int, high: int | None = None) -> int:
+    try:
+        value = int(text)
+    except ValueError:
+        raise ValueError("line {0}: not a number: {1}".format(number, text))
+    if value < low or (high is not None and value > high):
+        raise ValueError("line {0}: out of range: {1}".format(number, text))
+    return value
+
+
+def parse_script(lines) -> list[tuple]:
+    """
+    Compiles the lines of a script to a list of (op, *arguments) tuples for run_script,
+    with the layers and draw styles resolved.
+    """
+    layer_list = [layer for layer in get_layers() if layer is not None]
+    layer_by_name = {layer.name: layer for layer in layer_list}
+    styles = {style.lower(): style for style in Grid.DRAW_STYLE_OPTIONS}
+    commands = []
+    for number, line in enumerate(lines, 1):
+        words = line.split("#", 1)[0].split()
+        if len(words) == 0:
+            continue
+        name, args = words[0].lower(), words[1:]
+        if name == "paint" and len(args) in (3, 4):
+            if args[0] in layer_by_name:
+                layer = layer_by_name[args[0]]
+            else:
+                layer = layer_list[_parse_int(args[0], number, 0, len(layer_list) - 1)]
+            size = _parse_int(args[3], number, Grid.MIN_BRUSH, Grid.MAX_BRUSH) if len(args) == 4 else -1
+            commands.append((OP_PAINT, layer, _parse_int(args[1], number, 0), _parse_int(args[2], number, 0), size))
+        elif name in ("undo", "redo") and len(args) <= 1:
+            count = _parse_int(args[0], number, 1) if len(args) == 1 else 1
+            commands.append((OP_UNDO if name == "undo" else OP_REDO, count))
+        elif name == "special" and len(args) == 0:
+            commands.append((OP_SPECIAL,))
+        elif name == "style" and len(args) == 1:
+            if args[0].lower() not in styles:
+                raise ValueError("line {0}: unknown draw style: {1}".format(number, args[0]))
+            commands.append((OP_STYLE, styles[args[0].lower()]))
+        else:
+            raise ValueError("line {0}: unknown command: {1}".format(number, line.strip()))
+    return commands
+
+
+def run_script(commands: list[tuple], session: PaintSession, pixels: bool = False) -> ScriptResult:
+    """
+    Runs the commands of parse_script on a session, as fast as it goes.
+    The checksum of the colours (at the timestamp of the session) is only computed if pixels is True.
+    """
+    start = perf_counter()
+    for command in commands:
+        op = command[0]
+        if op == OP_PAINT:
+            _, layer, x, y, size = command
+            if size >= 0:
+                session.grid.brush_size = size
+            session.on_paint(layer, x, y)
+        elif op == OP_UNDO:
+            if command[1] == 1:
+                session.on_undo()
+            else:
+                session.on_undo_many(command[1])
+        elif op == OP_REDO:
+            if command[1] == 1:
+                session.on_redo()
+            else:
+                session.on_redo_many(command[1])
+        elif op == OP_SPECIAL:
+            session.on_special()
+        elif op == OP_STYLE:
+            session.draw_style = command[1]
+            session.reset()
+    session.on_stroke_end()
+    seconds = perf_counter() - start
+
+    grid = session.grid
+    pixel_checksum = zlib.crc32(render_frame(grid, session.timestamp, 1)) if pixels else None
+    return ScriptResult(len(commands), seconds, grid.state_hash(), pixel_checksum)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Runs a command script on a grid without a window.")
+    parser.add_argument("script", help="script file, - for stdin")
+    parser.add_argument("--size", default="{0}x{1}".format(PaintSession.GRID_SIZE_X, PaintSession.GRID_SIZE_Y), help="grid size, COLUMNSxROWS")
+    parser.add_argument("--style", default=Grid.DRAW_STYLE_SET, choices=Grid.DRAW_STYLE_OPTIONS, help="initial draw style")
+    parser.add_argument("--pixels", action="store_true", help="also print a checksum of the colours of the grid")
+    args = parser.parse_args(argv)
+    try:
+        x, y = (int(value) for value in args.size.lower().split("x"))
+    except ValueError:
+        parser.error("--size must look like 32x32")
+
+    try:
+        if args.script == "-":
+            commands = parse_script(sys.stdin)
+        else:
+            with open(args.script) as file:
+                commands = parse_script(file)
+    except ValueError as error:
+        parser.error(str(error))
+
+    result = run_script(commands, PaintSession(args.style, x, y), args.pixels)
+    print("{0} operations in {1:.3f} s ({2:.0f} ops/s)".format(result.operations, result.seconds, result.operations_per_second))
+    print("state hash {0:016x}".format(result.state_hash))
+    if result.pixel_checksum is not None:
+        print("pixel crc32 {0:08x}".format(result.pixel_checksum))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Session files: a replay log saved to disk.
+
+A session file starts with a header:
+- MAGIC, then the format version
+- (version 2) header flags: HEADER_HASHES if every record is followed by a state hash
+- the draw style, the number of columns and of rows of the grid
+- the layer table: the number of layers, then their names, so a file is read back
+  correctly even if layers were registered in another order
+and goes on with one record per action of the log, until the end of the file:
+- (step count << 2) | FLAG_SPECIAL | FLAG_UNDO
+- per step: x and y as the difference from the previous step of the file (zigzag encoded,
+  so small moves of either sign are small numbers), then the index of its layer in the table
+- with HEADER_HASHES: Grid.state_hash after the action, as 8 little-endian bytes
+  (ReplayTracker.NO_HASH if it was not recorded)
+All numbers are unsigned varints (7 bits per byte, low bits first, high bit set on every byte
+but the last) and strings are a varint length followed by UTF-8 bytes.
+
+SessionWriter and SessionReader stream the records, so neither needs the whole log in memory.
+"""
+
+from __future__ import annotations
+import struct
+from array import array
+from action import PaintAction
+from grid import Grid
+from layer_util import get_layers
+from replay import ReplayTracker
+
+MAGIC = b"PSES"
+VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+
+HEADER_HASHES = 1
+
+FLAG_SPECIAL = 1
+FLAG_UNDO = 2
+
+
+def _encode_varint(value: int, out: bytearray) -> None:
+    """Appends an unsigned varint."""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value: int) -> int:
+    """Maps a signed int to an unsigned one: 0, -1, 1, -2, ... to 0, 1, 2, 3, ..."""
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value: int) -> int:
+    """Inverse of _zigzag."""
+    return value >> 1 if value & 1 == 0 else -(value >> 1) - 1
+
+
+def _encode_string(value: str, out: bytearray) -> None:
+    data = value.encode("utf-8")
+    _encode_varint(len(data), out)
+    out += data
+
+
+def _layer_names() -> list[str]:
+    """Names of the registered layers, by index."""
+    names = []
+    for layer in get_layers():
+        if layer is None:
+            break
+        names.append(layer.name)
+    return names
+
+
+class SessionWriter:
+    """
+    Writes a session file, one action at a time.
+    """
+
+    # encoded bytes kept before they are written to the file
+    BUFFER_BYTES = 1 << 16
+
+    def __init__(self, path: str, draw_style: str, x: int, y: int, hashes: bool = False) -> None:
+        self.file = open(path, "wb")
+        self.hashes = hashes
+        self.buffer = bytearray()
+        self.prev_x = 0
+        self.prev_y = 0
+        self.count = 0
+        self.buffer += MAGIC
+        _encode_varint(VERSION, self.buffer)
+        _encode_varint(HEADER_HASHES if hashes else 0, self.buffer)
+        _encode_string(draw_style, self.buffer)
+        _encode_varint(x, self.buffer)
+        _encode_varint(y, self.buffer)
+        names = _layer_names()
+        _encode_varint(len(names), self.buffer)
+        for name in names:
+            _encode_string(name, self.buffer)
+
+    def __enter__(self) -> SessionWriter:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(self, action: PaintAction, is_undo: bool, state_hash: int | None = None) -> None:
+        """
+        Appends an action of the log, and the hash of the grid after it if the file has hashes.
+
+        Complexity:
+        - Worst case: O(action.step_count())
+        - Best case: O(action.step_count())
+        """
+        buffer = self.buffer
+        packed = action.packed_steps
+        step_count = len(packed) // 3
+        flags = (FLAG_SPECIAL if action.is_special else 0) | (FLAG_UNDO if is_undo else 0)
+        _encode_varint(step_count << 2 | flags, buffer)
+        prev_x, prev_y = self.prev_x, self.prev_y
+        for i in range(0, len(packed), 3):
+            x, y = packed[i], packed[i + 1]
+            _encode_varint(_zigzag(x - prev_x), buffer)
+            _encode_varint(_zigzag(y - prev_y), buffer)
+            _encode_varint(packed[i + 2], buffer)
+            prev_x, prev_y = x, y
+        self.prev_x, self.prev_y = prev_x, prev_y
+        if self.hashes:
+            buffer += struct.pack("<Q", ReplayTracker.NO_HASH if state_hash is None else state_hash)
+        self.count += 1
+        if len(buffer) >= self.BUFFER_BYTES:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered records to the file."""
+        self.file.write(self.buffer)
+        self.buffer = bytearray()
+        self.file.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self.file.close()
+
+
+class SessionReader:
+    """
+    Reads a session file: the header when opened, then the actions by iterating over the reader.
+
+    Iterating yields (action, is_undo) pairs, decoding the file a block at a time; state_hash is the hash
+    recorded after the last one yielded, None if there is none. A record cut short at the end of the file
+    (e.g. the writer was interrupted) ends the iteration; a step whose square is outside of the grid, or whose
+    layer is not in the layer table, raises ValueError.
+
+    tell and seek save and restore the position of the next record, so another reader of the same file can
+    start decoding there without going through the records before it.
+    """
+
+    # bytes read from the file at a time
+    BLOCK_BYTES = 1 << 16
+
+    def __init__(self, path: str) -> None:
+        self.file = open(path, "rb")
+        self.data = b""
+        self.offset = 0
+        self.state_hash = None
+        # position of the last step decoded, which the next step is relative to
+        self.prev_x = 0
+        self.prev_y = 0
+        try:
+            self._read_header(path)
+        except (EOFError, ValueError) as error:
+            self.file.close()
+            if isinstance(error, EOFError):
+                raise ValueError("Truncated session file: {0}".format(path))
+            raise
+
+    def _read_header(self, path: str) -> None:
+        if self._read_bytes(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a session file: {0}".format(path))
+        self.version = self._read_varint()
+        if self.version not in SUPPORTED_VERSIONS:
+            raise ValueError("Unsupported session version: {0}".format(self.version))
+        self.has_hashes = self.version >= 2 and self._read_varint() & HEADER_HASHES != 0
+        self.draw_style = self._read_string()
+        if self.draw_style not in Grid.DRAW_STYLE_OPTIONS:
+            raise ValueError("Unknown draw style: {0}".format(self.draw_style))
+        self.x = self._read_varint()
+        self.y = self._read_varint()
+
+        # the index of every layer of the table among the registered layers
+        indices = {name: index for index, name in enumerate(_layer_names())}
+        self.layer_names = [self._read_string() for _ in range(self._read_varint())]
+        self.layer_map = array("I")
+        for name in self.layer_names:
+            if name not in indices:
+                raise ValueError("Unknown layer: {0}".format(name))
+            self.layer_map.append(indices[name])
+
+    def __enter__(self) -> SessionReader:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def make_grid(self) -> Grid:
+        """An empty grid of the draw style and size of the session."""
+        return Grid(self.draw_style, self.x, self.y)
+
+    def tell(self) -> tuple[int, int, int]:
+        """The position of the next record: its byte offset in the file, and the position of the step before it."""
+        return self.file.tell() - (len(self.data) - self.offset), self.prev_x, self.prev_y
+
+    def seek(self, position: tuple[int, int, int]) -> None:
+        """Goes to a position returned by tell of a reader of the same file; iterating goes on from there."""
+        offset, self.prev_x, self.prev_y = position
+        self.file.seek(offset)
+        self.data = b""
+        self.offset = 0
+        self.state_hash = None
+
+    def _fill(self) -> bool:
+        """Reads the next block of the file after the unread bytes; False at the end of the file."""
+        block = self.file.read(self.BLOCK_BYTES)
+        if not block:
+            return False
+        self.data = self.data[self.offset:] + block
+        self.offset = 0
+        return True
+
+    def _read_bytes(self, count: int) -> bytes:
+        while len(self.data) - self.offset < count:
+            if not self._fill():
+                raise EOFError()
+        value = self.data[self.offset:self.offset + count]
+        self.offset += count
+        return value
+
+    def _read_varint(self) -> int:
+        value = 0
+        shift = 0
+        while True:
+            if self.offset == len(self.data) and not self._fill():
+                raise EOFError()
+            byte = self.data[self.offset]
+            self.offset += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def _read_string(self) -> str:
+        return self._read_bytes(self._read_varint()).decode("utf-8")
+
+    def __iter__(self):
+        prev_x, prev_y = self.prev_x, self.prev_y
+        layer_map = self.layer_map
+        while True:
+            try:
+                header = self._read_varint()
+                packed = array("I")
+                for _ in range(header >> 2):
+                    prev_x += _unzigzag(self._read_varint())
+                    prev_y += _unzigzag(self._read_varint())
+                    # grid[x][y]: x is a row of the grid, y a column
+                    if not (0 <= prev_x < self.y and 0 <= prev_y < self.x):
+                        raise ValueError("Square outside of the grid in session file: ({0}, {1})".format(prev_x, prev_y))
+                    packed.append(prev_x)
+                    packed.append(prev_y)
+                    layer_index = self._read_varint()
+                    if layer_index >= len(layer_map):
+                        raise ValueError("Unknown layer index in session file: {0}".format(layer_index))
+                    packed.append(layer_map[layer_index])
+                state_hash = struct.unpack("<Q", self._read_bytes(8))[0] if self.has_hashes else ReplayTracker.NO_HASH
+            except EOFError:
+                return
+            action = PaintAction([], bool(header & FLAG_SPECIAL))
+            action.packed_steps = packed
+            self.prev_x, self.prev_y = prev_x, prev_y
+            self.state_hash = None if state_hash == ReplayTracker.NO_HASH else state_hash
+            yield action, bool(header & FLAG_UNDO)
+
+
+def save_session(path: str, replay: ReplayTracker, grid: Grid, hashes: bool = True) -> int:
+    """
+    Writes the whole log of a ReplayTracker to a session file, with the draw style and size of grid,
+    and the hashes it recorded unless hashes is False.
+    Returns the number of actions written.
+    """
+    with SessionWriter(path, grid.my_draw_style, grid.num_of_cols, grid.num_of_rows, hashes) as writer:
+        for index in range(replay.action_count()):
+            action, is_undo = replay.my_replay_log[index]
+            writer.write(action, is_undo, replay.state_hash(index))
+        return writer.count
+
+
+def load_session(path: str, replay: ReplayTracker) -> Grid:
+    """
+    Replaces the log of a ReplayTracker with the actions of a session file, streamed in (the log spills
+    them to its segment file), and rewinds it.
+    The file is decoded into a temporary log first, so the replay is left as it was if the file is not valid.
+    Returns an empty grid to play the session on.
+    """
+    loaded = ReplayTracker()
+    try:
+        with SessionReader(path) as reader:
+            for action, is_undo in reader:
+                loaded.add_action(action, is_undo, reader.state_hash)
+            grid = reader.make_grid()
+        replay.clear_replay()
+        for index in range(loaded.action_count()):
+            action, is_undo = loaded.my_replay_log[index]
+            replay.add_action(action, is_undo, loaded.state_hash(index))
+    finally:
+        loaded.my_replay_log.close()
+    return grid
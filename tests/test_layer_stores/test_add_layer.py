@@ -62,4 +62,17 @@ class TestAddLayer(unittest.TestCase):
         s.erase(black)
         s.add(invert)
         self.assertEqual(s.get_color((100, 100, 100), 7, 0, 0), (255-91, 255-214, 255-104))
-  
\ No newline at end of file
+  
+    @number("2.6")
+    def test_clear(self):
+        s = AdditiveLayerStore()
+        # The list grows past its initial capacity as layers are added.
+        for i in range(3 * AdditiveLayerStore.INITIAL_CAPACITY + 1):
+            s.add([black, lighten][i % 2])
+        self.assertEqual(len(s.snapshot()), 3 * AdditiveLayerStore.INITIAL_CAPACITY + 1)
+        s.special()
+        s.clear()
+        self.assertEqual(s.snapshot(), AdditiveLayerStore.EMPTY_STATE)
+        self.assertEqual(s.get_color((100, 100, 100), 0, 0, 0), (100, 100, 100))
+        s.add(rainbow)
+        self.assertEqual(s.get_color((100, 100, 100), 7, 0, 0), (91, 214, 104))
@@ -0,0 +1,207 @@
+"""
+Golden frames: canonical scenes rendered square by square with get_color (the reference path),
+checked against the frames stored in golden_frames.json, and every other way of reaching the same
+grids (replay seeks and reverse play, session files, render_session, undo / redo folding, cleared
+and pooled grids) checked against the reference.
+
+After an intended change of the colours, regenerate the golden file from the repository root with
+    python -m tests.test_misc.test_golden --update
+"""
+
+import base64
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+import zlib
+from ed_utils.decorators import number
+
+from grid import Grid
+from layer_util import get_layers
+from paint_session import PaintSession
+from render import render_frame, render_session, run_headless
+from replay import ReplayTracker
+from script import parse_script, run_script
+from session import load_session
+import layers  # registers the layers
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "golden_frames.json")
+VISUALS = ("basic", "complex", "styles")
+
+SIZE = 8
+# painted with every layer, in every draw style; {0} is the layer
+LAYER_SCENE = [
+    "paint {0} 3 3 2",
+    "paint red 5 4 1",
+    "special",
+    "paint {0} 1 6 0",
+    "undo",
+    "redo",
+    "paint {0} 6 1 1",
+]
+# timestamp of the frames taken after every command, and of the last grid
+STEP_TIMESTAMP = 1.25
+FINAL_TIMESTAMPS = (0, 2.5, 11)
+# one frame per simulated second of the visual scripts
+VISUAL_EVERY = 60
+
+
+def layer_names() -> list[str]:
+    return [layer.name for layer in get_layers() if layer is not None]
+
+
+def play_layer_scene(style: str, name: str, session: PaintSession = None) -> tuple[list[bytes], dict[int, tuple]]:
+    """
+    Plays the layer scene of a layer in a draw style.
+    Returns its frames, and the snapshot of the grid per number of actions in the replay log.
+    """
+    if session is None:
+        session = PaintSession(style, SIZE, SIZE)
+    frames = []
+    states = {0: session.grid.snapshot()}
+    for command in parse_script([line.format(name) for line in LAYER_SCENE]):
+        run_script([command], session)
+        frames.append(render_frame(session.grid, STEP_TIMESTAMP, 1))
+        states[session.my_replay_tracker.action_count()] = session.grid.snapshot()
+    for timestamp in FINAL_TIMESTAMPS:
+        frames.append(render_frame(session.grid, timestamp, 1))
+    return frames, states
+
+
+def play_visual(script: str) -> list[bytes]:
+    """Frames of a script of visuals/, played headless."""
+    module = __import__("visuals." + script, fromlist=["_"])
+    func = next(value for key, value in vars(module).items() if key.startswith("test_") and callable(value))
+    raw = io.BytesIO()
+    frames = run_headless(func, raw=raw, every=VISUAL_EVERY, scale=1)
+    frame_size = 3 * PaintSession.GRID_SIZE_X * PaintSession.GRID_SIZE_Y
+    data = raw.getvalue()
+    return [data[i:i + frame_size] for i in range(0, frames // VISUAL_EVERY * frame_size, frame_size)]
+
+
+def render_scenes() -> dict[str, list[bytes]]:
+    """Frames of every scene, by the reference path."""
+    scenes = {}
+    for style in Grid.DRAW_STYLE_OPTIONS:
+        for name in layer_names():
+            scenes["{0}/{1}".format(style, name)] = play_layer_scene(style, name)[0]
+    for script in VISUALS:
+        scenes["visuals/" + script] = play_visual(script)
+    return scenes
+
+
+def encode_frames(frames: list[bytes]) -> dict:
+    return {"frames": len(frames), "data": base64.b64encode(zlib.compress(b"".join(frames), 9)).decode("ascii")}
+
+
+def decode_frames(entry: dict) -> list[bytes]:
+    data = zlib.decompress(base64.b64decode(entry["data"]))
+    size = len(data) // entry["frames"] if entry["frames"] > 0 else 0
+    return [data[i * size:(i + 1) * size] for i in range(entry["frames"])]
+
+
+class TestGolden(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(GOLDEN_PATH) as file:
+            cls.golden = {name: decode_frames(entry) for name, entry in json.load(file).items()}
+
+    @number("7.1")
+    def test_layer_scenes(self):
+        for style in Grid.DRAW_STYLE_OPTIONS:
+            for name in layer_names():
+                scene = "{0}/{1}".format(style, name)
+                self.assertFramesEqual(scene, play_layer_scene(style, name)[0], self.golden[scene])
+
+    @number("7.2")
+    def test_visual_scenes(self):
+        for script in VISUALS:
+            scene = "visuals/" + script
+            self.assertFramesEqual(scene, play_visual(script), self.golden[scene])
+
+    @number("7.3")
+    def test_replay_paths(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for style in Grid.DRAW_STYLE_OPTIONS:
+                for name in layer_names():
+                    scene = "{0}/{1}".format(style, name)
+                    session = PaintSession(style, SIZE, SIZE)
+                    _, states = play_layer_scene(style, name, session)
+                    expected = {count: self.render_state(style, state, STEP_TIMESTAMP) for count, state in states.items()}
+                    path = os.path.join(directory, "scene.pses")
+                    session.save(path)
+
+                    # Seeking from keyframes, forwards then backwards.
+                    replay = ReplayTracker()
+                    grid = load_session(path, replay)
+                    for count in sorted(states) + sorted(states, reverse=True):
+                        replay.seek(grid, count)
+                        self.assertEqual(render_frame(grid, STEP_TIMESTAMP, 1), expected[count], "{0}: seek to {1}".format(scene, count))
+
+                    # Playing backwards from the end.
+                    replay.set_reverse(True)
+                    replay.start_replay()
+                    while not replay.play_next_action(grid):
+                        if replay.position() in expected:
+                            self.assertEqual(render_frame(grid, STEP_TIMESTAMP, 1), expected[replay.position()], "{0}: reverse".format(scene))
+                    replay.clear_replay()
+
+                    # render_session shows the grid after action f + 1 at frame f.
+                    raw = io.BytesIO()
+                    frames = render_session(path, raw=raw, every=1, scale=1)
+                    frame_size = 3 * SIZE * SIZE
+                    for frame in range(frames):
+                        if frame + 1 in states:
+                            self.assertEqual(
+                                raw.getvalue()[frame * frame_size:(frame + 1) * frame_size],
+                                self.render_state(style, states[frame + 1], frame * ReplayTracker.ACTION_INTERVAL),
+                                "{0}: render_session frame {1}".format(scene, frame),
+                            )
+                    session.my_replay_tracker.my_replay_log.close()
+
+    @number("7.4")
+    def test_history_paths(self):
+        for style in Grid.DRAW_STYLE_OPTIONS:
+            for name in layer_names():
+                scene = "{0}/{1}".format(style, name)
+                session = PaintSession(style, SIZE, SIZE)
+                frames, _ = play_layer_scene(style, name, session)
+                final = frames[-len(FINAL_TIMESTAMPS)]
+
+                # Undoing everything at once, then redoing it at once.
+                count = session.my_undo_tracker.undo_count()
+                session.on_undo_many(count)
+                self.assertEqual(render_frame(session.grid, FINAL_TIMESTAMPS[0], 1), self.render_state(style, None, 0), scene)
+                session.on_redo_many(count)
+                self.assertEqual(render_frame(session.grid, FINAL_TIMESTAMPS[0], 1), final, "{0}: undo / redo many".format(scene))
+
+                # The grid cleared in place, then swapped for pooled stores through every draw style.
+                session.reset()
+                self.assertFramesEqual(scene + " after reset", play_layer_scene(style, name, session)[0], self.golden[scene])
+                stores = {id(session.grid[x][y]) for x in range(SIZE) for y in range(SIZE)}
+                for _ in Grid.DRAW_STYLE_OPTIONS:
+                    session.change_draw_mode()
+                self.assertEqual({id(session.grid[x][y]) for x in range(SIZE) for y in range(SIZE)}, stores, scene)
+                self.assertFramesEqual(scene + " on pooled stores", play_layer_scene(style, name, session)[0], self.golden[scene])
+
+    def render_state(self, style: str, snapshot: tuple, timestamp: float) -> bytes:
+        grid = Grid(style, SIZE, SIZE)
+        grid.restore(snapshot)
+        return render_frame(grid, timestamp, 1)
+
+    def assertFramesEqual(self, scene: str, frames: list[bytes], golden: list[bytes]):
+        self.assertEqual(len(frames), len(golden), "{0}: number of frames".format(scene))
+        for index in range(len(frames)):
+            self.assertEqual(frames[index], golden[index], "{0}: frame {1} differs".format(scene, index))
+
+
+if __name__ == "__main__":
+    if "--update" in sys.argv:
+        with open(GOLDEN_PATH, "w") as file:
+            json.dump({name: encode_frames(frames) for name, frames in render_scenes().items()}, file, indent=0, sort_keys=True)
+            file.write("\n")
+    else:
+        unittest.main()
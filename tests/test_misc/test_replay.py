@@ -1,9 +1,16 @@
+import os
+import tempfile
 import unittest
 from ed_utils.decorators import number
 
 from action import PaintAction, PaintStep
 from replay import ReplayTracker
-from layers import blue, green, red, invert
+from replay_log import ReplayLog
+from session import SessionReader, SessionWriter, save_session, load_session
+import render
+from render import render_frame, render_session
+from clock import VirtualClock
+from layers import blue, green, red, invert, rainbow
 from grid import Grid
 
 class TestReplay(unittest.TestCase):
@@ -102,6 +109,45 @@ class TestReplay(unittest.TestCase):
         self.assertGridEqual(grid, control_grid)
         self.assertEqual(replay.play_next_action(grid), True) # Finished.
 
+    @number("5.4")
+    def test_playback_modes(self):
+        actions = [PaintAction([PaintStep((i % 10, i // 10), green)]) for i in range(100)]
+
+        def replay_with(mode, value):
+            replay = ReplayTracker()
+            for action in actions:
+                replay.add_action(action)
+            # a generous budget, so only the mode decides how many actions a frame plays
+            replay.set_playback(mode, value, frame_budget=10)
+            replay.start_replay()
+            return replay
+
+        # One action every ACTION_INTERVAL, times the multiplier.
+        replay = replay_with(ReplayTracker.PLAYBACK_MULTIPLIER, 4)
+        grid = Grid(Grid.DRAW_STYLE_SET, 10, 10)
+        self.assertFalse(replay.play_frame(grid, ReplayTracker.ACTION_INTERVAL * 2.5))
+        self.assertEqual(replay.remaining_count(), 90)
+
+        # The whole replay over a set duration: 100 actions in 2 seconds.
+        replay = replay_with(ReplayTracker.PLAYBACK_DURATION, 2)
+        frames = 0
+        while not replay.play_frame(grid, 0.1):
+            frames += 1
+        self.assertEqual(frames, 19)
+
+        # A frame budget of zero still plays one action per frame.
+        replay = replay_with(ReplayTracker.PLAYBACK_BUDGET, 1)
+        replay.set_playback(ReplayTracker.PLAYBACK_BUDGET, 1, frame_budget=0)
+        grid = Grid(Grid.DRAW_STYLE_SET, 10, 10)
+        control_grid = Grid(Grid.DRAW_STYLE_SET, 10, 10)
+        for action in actions[:3]:
+            replay.play_frame(grid, 1)
+            action.redo_apply(control_grid)
+        self.assertGridEqual(grid, control_grid)
+
+        with self.assertRaises(ValueError):
+            replay.set_playback("FASTER", 1)
+
     def assertGridEqual(self, grid1: Grid, grid2: Grid):
         for x in range(len(grid1.store_array)):
             for y in range(len(grid1[x])):
@@ -113,4 +159,379 @@ class TestReplay(unittest.TestCase):
                     "Grid not the same after apply has been made."
                 )
 
- 
\ No newline at end of file
+ 
+
+    @number("5.5")
+    def test_seek(self):
+        class SmallReplayTracker(ReplayTracker):
+            KEYFRAME_INTERVAL = 4
+            MAX_KEYFRAMES = 4
+
+        for style in [Grid.DRAW_STYLE_SET, Grid.DRAW_STYLE_ADD, Grid.DRAW_STYLE_SEQUENCE]:
+            actions = []
+            for i in range(40):
+                if i % 7 == 6:
+                    actions.append((PaintAction([], True), False))
+                else:
+                    layer = [green, red][i % 2]
+                    actions.append((PaintAction([PaintStep((i % 5, i % 3), layer), PaintStep((i % 4, 2), layer)]), i % 5 == 4))
+
+            def state(index):
+                grid = Grid(style, 5, 5)
+                for action, is_undo in actions[:index]:
+                    if is_undo:
+                        action.undo_apply(grid)
+                    else:
+                        action.redo_apply(grid)
+                return grid
+
+            replay = SmallReplayTracker()
+            for action, is_undo in actions:
+                replay.add_action(action, is_undo)
+            replay.start_replay()
+            grid = Grid(style, 5, 5)
+            while not replay.play_next_action(grid):
+                pass
+            self.assertGridEqual(grid, state(40))
+            # Playing did not consume the log; keyframes were thinned out to stay within MAX_KEYFRAMES.
+            self.assertEqual(replay.action_count(), 40)
+            self.assertLessEqual(len(replay.my_keyframes), SmallReplayTracker.MAX_KEYFRAMES)
+
+            for index in [13, 3, 40, 0, 27, 28, 9]:
+                replay.seek(grid, index)
+                self.assertEqual(replay.remaining_count(), 40 - index)
+                self.assertGridEqual(grid, state(index))
+
+            # Rewatch from the start on a new grid.
+            replay.rewind()
+            replay.start_replay()
+            grid = Grid(style, 5, 5)
+            for index in range(1, 41):
+                replay.play_next_action(grid)
+            self.assertGridEqual(grid, state(40))
+            self.assertTrue(replay.play_next_action(grid))
+
+            # Given the grid the actions are recorded from, keyframes are there before the log is ever played,
+            # so seeking only plays the actions after the nearest one.
+            recorded = SmallReplayTracker()
+            live = Grid(style, 5, 5)
+            for action, is_undo in actions:
+                if is_undo:
+                    action.undo_apply(live)
+                else:
+                    action.redo_apply(live)
+                recorded.add_action(action, is_undo, live.state_hash(), live)
+            self.assertGreater(len(recorded.my_keyframes), 1)
+            grid = Grid(style, 5, 5)
+            played = []
+            play = recorded._play
+            recorded._play = lambda grid, index: (played.append(index), play(grid, index))
+            recorded.seek(grid, 38)
+            self.assertGridEqual(grid, state(38))
+            self.assertLess(len(played), recorded.my_keyframe_interval)
+
+    @number("5.6")
+    def test_streaming_log(self):
+        log = ReplayLog(chunk_actions=8, max_resident_chunks=2)
+        replay = ReplayTracker(log)
+        actions = []
+        for i in range(200):
+            if i % 11 == 10:
+                actions.append((PaintAction([], True), False))
+            else:
+                steps = [PaintStep((i % 6, (i // 6) % 6), [green, red][i % 2]) for _ in range(i % 3)]
+                actions.append((PaintAction(steps), i % 4 == 3))
+        control_grid = Grid(Grid.DRAW_STYLE_SET, 6, 6)
+        for action, is_undo in actions:
+            replay.add_action(action, is_undo)
+            if is_undo:
+                action.undo_apply(control_grid)
+            else:
+                action.redo_apply(control_grid)
+
+        # Full chunks were spilled to the segment file, only a few are kept in memory.
+        self.assertEqual(replay.action_count(), 200)
+        self.assertLessEqual(log.resident_count(), 3 * 8)
+
+        replay.start_replay()
+        grid = Grid(Grid.DRAW_STYLE_SET, 6, 6)
+        while not replay.play_next_action(grid):
+            self.assertLessEqual(log.resident_count(), 3 * 8)
+        self.assertGridEqual(grid, control_grid)
+
+        # Entries read back from the file are the same actions.
+        for index in [0, 9, 100, 199]:
+            action, is_undo = log[index]
+            self.assertEqual(action.packed_steps, actions[index][0].packed_steps)
+            self.assertEqual(action.is_special, actions[index][0].is_special)
+            self.assertEqual(is_undo, actions[index][1])
+
+        replay.clear_replay()
+        self.assertEqual(replay.action_count(), 0)
+        log.close()
+
+    @number("5.7")
+    def test_session_file(self):
+        replay = ReplayTracker()
+        grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 8, 8)
+        actions = []
+        for i in range(300):
+            if i % 13 == 12:
+                actions.append((PaintAction([], True), False))
+            else:
+                steps = [PaintStep(((i + j) % 8, (i * 3 + j) % 8), [green, red, blue][j % 3]) for j in range(i % 5)]
+                actions.append((PaintAction(steps), i % 6 == 5))
+        for action, is_undo in actions:
+            replay.add_action(action, is_undo)
+            if is_undo:
+                action.undo_apply(grid)
+            else:
+                action.redo_apply(grid)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "session.pses")
+            self.assertEqual(save_session(path, replay, grid, hashes=False), 300)
+            # Small steps take a few bytes each.
+            self.assertLess(os.path.getsize(path), 4 * sum(action.step_count() + 1 for action, _ in actions))
+            save_session(path, replay, grid)
+
+            with SessionReader(path) as reader:
+                self.assertEqual((reader.draw_style, reader.x, reader.y), (Grid.DRAW_STYLE_SEQUENCE, 8, 8))
+                read = list(reader)
+            self.assertEqual(len(read), 300)
+            for (action, is_undo), (expected, expected_undo) in zip(read, actions):
+                self.assertEqual(action.packed_steps, expected.packed_steps)
+                self.assertEqual((action.is_special, is_undo), (expected.is_special, expected_undo))
+
+            # Another reader picks up from a saved position, without the records before it.
+            with SessionReader(path) as reader:
+                for _ in zip(range(120), reader):
+                    pass
+                position = reader.tell()
+            with SessionReader(path) as reader:
+                reader.seek(position)
+                rest = list(reader)
+            self.assertEqual([action.packed_steps for action, _ in rest], [action.packed_steps for action, _ in read[120:]])
+
+            # Loading feeds the replay, which plays the session again on the grid it returns.
+            loaded = ReplayTracker()
+            replay_grid = load_session(path, loaded)
+            loaded.start_replay()
+            while not loaded.play_next_action(replay_grid):
+                pass
+            self.assertGridEqual(replay_grid, grid)
+
+            # A record cut short ends the session; a file that is not a session is refused.
+            with open(path, "r+b") as file:
+                file.truncate(os.path.getsize(path) - 1)
+            with SessionReader(path) as reader:
+                self.assertEqual(len(list(reader)), 299)
+
+            # A layer index outside the layer table is refused, and loading leaves the replay as it was.
+            save_session(path, replay, grid)
+            with open(path, "ab") as file:
+                file.write(bytes([1 << 2, 0, 0, 0xFF, 0x7F]) + bytes(8))
+            with SessionReader(path) as reader:
+                with self.assertRaises(ValueError):
+                    list(reader)
+            with self.assertRaises(ValueError):
+                load_session(path, loaded)
+            self.assertEqual(loaded.action_count(), 300)
+            # So is a step moving outside the grid, either way.
+            for delta in [0x28, 0x7F]:
+                save_session(path, replay, grid)
+                with open(path, "ab") as file:
+                    file.write(bytes([1 << 2, delta, 0, 0]) + bytes(8))
+                with SessionReader(path) as reader:
+                    with self.assertRaises(ValueError):
+                        list(reader)
+                with self.assertRaises(ValueError):
+                    load_session(path, loaded)
+                self.assertEqual(loaded.action_count(), 300)
+            with open(path, "wb") as file:
+                file.write(b"nope")
+            with self.assertRaises(ValueError):
+                SessionReader(path)
+
+    @number("5.8")
+    def test_render(self):
+        replay = ReplayTracker()
+        grid = Grid(Grid.DRAW_STYLE_ADD, 6, 6)
+        expected = []
+        for i in range(50):
+            action = PaintAction([], True) if i % 9 == 8 else PaintAction([PaintStep((i % 6, i // 6 % 6), [green, red, blue][i % 3])])
+            replay.add_action(action, i % 7 == 6)
+            if i % 7 == 6:
+                action.undo_apply(grid)
+            else:
+                action.redo_apply(grid)
+            # One frame every 3 actions, plus one for the end.
+            if i % 3 == 2 or i == 49:
+                expected.append(render_frame(grid, len(expected) * ReplayTracker.ACTION_INTERVAL, 2))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "session.pses")
+            save_session(path, replay, grid)
+
+            raw_path = os.path.join(directory, "single.raw")
+            with open(raw_path, "wb") as raw:
+                self.assertEqual(render_session(path, raw=raw, every=3, scale=2), 17)
+            with open(raw_path, "rb") as raw:
+                self.assertEqual(raw.read(), b"".join(expected))
+
+            # Segments rendered by worker processes from keyframes give the same frames.
+            raw_path = os.path.join(directory, "parallel.raw")
+            with open(raw_path, "wb") as raw:
+                render_session(path, raw=raw, every=3, scale=2, workers=2)
+            with open(raw_path, "rb") as raw:
+                self.assertEqual(raw.read(), b"".join(expected))
+
+            frames = os.path.join(directory, "frames")
+            render_session(path, output=frames, every=3, scale=2, workers=2)
+            self.assertEqual(len(os.listdir(frames)), 17)
+            with open(os.path.join(frames, "frame_000016.png"), "rb") as png:
+                self.assertEqual(png.read(8), b"\x89PNG\r\n\x1a\n")
+
+            # A grid that is not square: 6 columns of 5 rows, grid[x][y] with x over the rows.
+            replay = ReplayTracker()
+            grid = Grid(Grid.DRAW_STYLE_SET, 6, 5)
+            for x, y in [(0, 0), (4, 5), (4, 0), (2, 3)]:
+                action = PaintAction([PaintStep((x, y), red)])
+                action.redo_apply(grid)
+                replay.add_action(action)
+            frame = render_frame(grid, 0, 1)
+            self.assertEqual(len(frame), 3 * 6 * 5)
+            # The top row of the frame is y = 5, the fifth pixel of it x = 4.
+            self.assertEqual(frame[3 * 4:3 * 5], bytes(grid[4][5].get_color(list(render.BG), 0, 4, 5)))
+            self.assertNotEqual(frame[3 * 4:3 * 5], bytes(render.BG))
+            path = os.path.join(directory, "wide.pses")
+            save_session(path, replay, grid)
+            raw_path = os.path.join(directory, "wide.raw")
+            with open(raw_path, "wb") as raw:
+                self.assertEqual(render_session(path, raw=raw, every=2, scale=1, workers=2), 2)
+            with open(raw_path, "rb") as raw:
+                self.assertEqual(raw.read()[-len(frame):], frame)
+            render_session(path, output=frames, every=4, scale=1)
+            with open(os.path.join(frames, "frame_000000.png"), "rb") as png:
+                # IHDR: width then height
+                self.assertEqual(png.read(24)[16:24], bytes([0, 0, 0, 5, 0, 0, 0, 6]))
+
+    @number("5.9")
+    def test_verify(self):
+        replay = ReplayTracker()
+        grid = Grid(Grid.DRAW_STYLE_ADD, 5, 5)
+        actions = [PaintAction([PaintStep((i % 5, i % 4), [green, red][i % 2])]) for i in range(20)]
+        for action in actions:
+            action.redo_apply(grid)
+            replay.add_action(action, False, grid.state_hash())
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "session.pses")
+            save_session(path, replay, grid)
+            loaded = ReplayTracker()
+            replay_grid = load_session(path, loaded)
+        self.assertEqual(loaded.state_hash(19), grid.state_hash())
+
+        loaded.set_verify(True)
+        loaded.start_replay()
+        while not loaded.play_next_action(replay_grid):
+            pass
+        self.assertIsNone(loaded.first_divergence())
+
+        # A grid that differs from the start of action 7 is reported there.
+        loaded.seek(replay_grid, 7)
+        replay_grid[4][4].add(blue)
+        loaded.set_verify(True)
+        loaded.start_replay()
+        while not loaded.play_next_action(replay_grid):
+            pass
+        self.assertEqual(loaded.first_divergence(), 7)
+
+    @number("5.10")
+    def test_reverse(self):
+        class SmallReplayTracker(ReplayTracker):
+            KEYFRAME_INTERVAL = 4
+
+        for style in [Grid.DRAW_STYLE_SET, Grid.DRAW_STYLE_ADD, Grid.DRAW_STYLE_SEQUENCE]:
+            for with_hashes in [True, False]:
+                actions = []
+                for i in range(30):
+                    if i % 7 == 6:
+                        actions.append((PaintAction([], True), False))
+                    else:
+                        layer = [green, red, blue][i % 3]
+                        actions.append((PaintAction([PaintStep((i % 3, i % 4), layer), PaintStep((2, i % 2), layer)]), i % 5 == 4))
+
+                replay = SmallReplayTracker()
+                live = Grid(style, 4, 4)
+                states = [live.snapshot()]
+                for action, is_undo in actions:
+                    if is_undo:
+                        action.undo_apply(live)
+                    else:
+                        action.redo_apply(live)
+                    states.append(live.snapshot())
+                    replay.add_action(action, is_undo, live.state_hash() if with_hashes else None)
+
+                grid = Grid(style, 4, 4)
+                replay.start_replay()
+                while not replay.play_next_action(grid):
+                    pass
+
+                # Walk back one action at a time, counting the restores from keyframes.
+                restores = []
+                restore = grid.restore
+                grid.restore = lambda snapshot: (restores.append(snapshot), restore(snapshot))
+                replay.set_reverse(True)
+                replay.start_replay()
+                for index in reversed(range(30)):
+                    self.assertFalse(replay.play_next_action(grid))
+                    self.assertEqual(replay.position(), index)
+                    self.assertEqual(grid.snapshot(), states[index])
+                self.assertTrue(replay.play_next_action(grid))
+                # Exact inverses are used where they exist, e.g. for the specials of the set and additive styles;
+                # otherwise each segment is restored from its keyframe once, and the actions of that segment are
+                # taken back from the squares they overwrote (a snapshot of the grid for the 4 special actions).
+                segments = -(-30 // SmallReplayTracker.KEYFRAME_INTERVAL)
+                self.assertLessEqual(len(restores), segments + 4)
+
+                # And forwards again from the start.
+                replay.set_reverse(False)
+                replay.start_replay()
+                while not replay.play_next_action(grid):
+                    pass
+                self.assertEqual(grid.snapshot(), states[30])
+
+    @number("5.11")
+    def test_virtual_clock(self):
+        def driver(window):
+            window.on_paint(red, 3, 3)
+            window.on_paint(rainbow, 8, 8)
+            window.clock.sleep(0.5)
+            hashes.append(window.grid.state_hash())
+            window.start_replay()
+            # 2 actions at ACTION_INTERVAL each
+            window.clock.sleep(0.2)
+            self.assertFalse(window.replaying)
+            hashes.append(window.grid.state_hash())
+
+        outputs = []
+        with tempfile.TemporaryDirectory() as directory:
+            for run in range(2):
+                hashes = []
+                output = os.path.join(directory, str(run))
+                # Seconds of simulated time take no wall clock time, and every frame is rendered.
+                self.assertEqual(render.run_headless(driver, output, scale=1), 42)
+                self.assertEqual(hashes[0], hashes[1])
+                outputs.append([open(render.frame_path(output, frame), "rb").read() for frame in range(42)])
+        # The same frames every run, and the animated layer moves from frame to frame.
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertNotEqual(outputs[0][0], outputs[0][29])
+
+        clock = VirtualClock(0.25)
+        steps = []
+        clock.add_listener(steps.append)
+        clock.sleep(0.6)
+        clock.sleep(0.15)
+        self.assertEqual(steps, [0.25, 0.25, 0.25])
+        self.assertEqual(clock.now(), 0.75)
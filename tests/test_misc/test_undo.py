@@ -1,10 +1,15 @@
+import os
+from array import array
+import tempfile
 import unittest
 from ed_utils.decorators import number
 
 from action import PaintAction, PaintStep
 from undo import UndoTracker
+from journal import UndoJournal, KIND_STEP
 from layers import green, red, blue
 from grid import Grid
+from paint_session import PaintSession
 
 class TestUndo(unittest.TestCase):
 
@@ -34,7 +39,7 @@ class TestUndo(unittest.TestCase):
 
         action = undo.undo(grid)
         self.assertNotEqual(action, None, "Wrong return value")
-        self.assertEqual(action.steps, steps2, "Wrong steps undone")
+        self.assertEqual(list(action.steps), steps2, "Wrong steps undone")
         for step in steps2:
             step.undo_apply(control_grid)
         self.assertGridEqual(grid, control_grid)
@@ -50,14 +55,14 @@ class TestUndo(unittest.TestCase):
 
         action = undo.undo(grid)
         self.assertNotEqual(action, None, "Wrong return value")
-        self.assertEqual(action.steps, steps3, "Wrong steps undone")
+        self.assertEqual(list(action.steps), steps3, "Wrong steps undone")
         for step in steps3:
             step.undo_apply(control_grid)
         self.assertGridEqual(grid, control_grid)
 
         action = undo.undo(grid)
         self.assertNotEqual(action, None, "Wrong return value")
-        self.assertEqual(action.steps, steps1, "Wrong steps undone")
+        self.assertEqual(list(action.steps), steps1, "Wrong steps undone")
         for step in steps1:
             step.undo_apply(control_grid)
         self.assertGridEqual(grid, control_grid)
@@ -65,6 +70,511 @@ class TestUndo(unittest.TestCase):
         action = undo.undo(grid)
         self.assertEqual(action, None)
 
+    @number("4.2")
+    def test_open_action(self):
+        grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 10, 10)
+        control_grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 10, 10)
+
+        steps1 = [PaintStep((4, 4), green), PaintStep((4, 5), green)]
+        steps2 = [PaintStep((4, 5), green), PaintStep((5, 5), green)]
+        steps3 = [PaintStep((1, 1), red)]
+
+        undo = UndoTracker()
+        undo.add_action(PaintAction(steps3[:], False))
+
+        # A stroke made of two actions, with a repeated step.
+        undo.begin_action(grid.add_is_idempotent())
+        self.assertTrue(undo.is_action_open())
+        undo.add_action(PaintAction(steps1[:], False))
+        undo.add_action(PaintAction(steps2[:], False))
+        action = undo.end_action()
+        self.assertFalse(undo.is_action_open())
+        self.assertEqual(list(action.steps), steps1 + steps2[1:], "Repeated step not merged")
+
+        for step in steps3 + steps1 + steps2:
+            step.redo_apply(grid)
+            step.redo_apply(control_grid)
+
+        # One undo reverts the whole stroke.
+        self.assertEqual(undo.undo(grid), action)
+        for step in steps1 + steps2[1:]:
+            step.undo_apply(control_grid)
+        self.assertGridEqual(grid, control_grid)
+        self.assertEqual(undo.redo(grid), action)
+        for step in steps1 + steps2[1:]:
+            step.redo_apply(control_grid)
+        self.assertGridEqual(grid, control_grid)
+
+        # Nothing added to a stroke means no action at all.
+        undo.begin_action()
+        self.assertEqual(undo.end_action(), None)
+
+    @number("4.3")
+    def test_packed_action(self):
+        steps = [PaintStep((4, 4), green), PaintStep((0, 9), red), PaintStep((4, 4), blue)]
+        action = PaintAction(steps[:])
+        self.assertEqual(action.step_count(), 3)
+        self.assertEqual(list(action.steps), steps)
+        # Rebuilt from the packed steps, so it can not be appended to as if it was the action's own list.
+        self.assertIsInstance(action.steps, tuple)
+        self.assertEqual(list(action.packed_steps), [4, 4, green.index, 0, 9, red.index, 4, 4, blue.index])
+
+        grid = Grid(Grid.DRAW_STYLE_ADD, 10, 10)
+        control_grid = Grid(Grid.DRAW_STYLE_ADD, 10, 10)
+        action.redo_apply(grid)
+        for step in steps:
+            step.redo_apply(control_grid)
+        self.assertGridEqual(grid, control_grid)
+        action.undo_apply(grid)
+        for step in steps:
+            step.undo_apply(control_grid)
+        self.assertGridEqual(grid, control_grid)
+
+    @number("4.4")
+    def test_bounded_history(self):
+        grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 10, 10)
+        actions = [PaintAction([PaintStep((i, i), green)]) for i in range(5)]
+
+        # Only the 3 newest actions are kept, the new ones are never refused.
+        undo = UndoTracker(max_actions=3)
+        for action in actions:
+            action.redo_apply(grid)
+            undo.add_action(action)
+        self.assertEqual((undo.undo_count(), undo.redo_count()), (3, 0))
+        for action in reversed(actions[2:]):
+            self.assertEqual(undo.undo(grid), action)
+        self.assertEqual(undo.undo(grid), None)
+        for action in actions[2:]:
+            self.assertEqual(undo.redo(grid), action)
+        self.assertEqual(undo.redo(grid), None)
+
+        # Budget in bytes: room for two of these actions.
+        undo = UndoTracker(max_bytes=2 * actions[0].estimated_bytes())
+        for action in actions:
+            undo.add_action(action)
+        self.assertEqual(undo.undo_count(), 2)
+        self.assertEqual(undo.undo(grid), actions[4])
+        self.assertEqual(undo.undo(grid), actions[3])
+        self.assertEqual(undo.undo(grid), None)
+
+    @number("4.5")
+    def test_seek(self):
+        for draw_style in Grid.DRAW_STYLE_OPTIONS:
+            grid = Grid(draw_style, 10, 10)
+            replayed_grid = Grid(draw_style, 10, 10)
+            undo = UndoTracker()
+            undo.my_checkpoint_interval = 3
+
+            actions = [PaintAction([PaintStep((i % 4, 2), layer), PaintStep((3, i % 5), layer)])
+                       for i, layer in enumerate([green, red, blue, green, red, blue, red, green])]
+            actions.insert(5, PaintAction([], True))
+            states = [grid.snapshot()]
+            for action in actions:
+                action.redo_apply(grid)
+                undo.add_action(action, grid)
+                states.append(grid.snapshot())
+            replayed_grid.restore(grid.snapshot())
+
+            # Stepwise undo is lossy in some styles, seek always lands on the state first seen at that index.
+            for _ in range(4):
+                undo.undo(grid)
+            for index in [7, 2, 9, 0, 6, 6, 4]:
+                replayed_grid.restore(grid.snapshot())
+                for action, is_undo in undo.seek(grid, index):
+                    if is_undo:
+                        action.undo_apply(replayed_grid)
+                    else:
+                        action.redo_apply(replayed_grid)
+                self.assertEqual(grid.snapshot(), states[index], "Wrong state after seek")
+                self.assertEqual(replayed_grid.snapshot(), states[index], "Replay entries do not match the seek")
+                self.assertEqual((undo.undo_count(), undo.redo_count()), (index, len(actions) - index))
+
+            # Evicted actions take their checkpoints with them.
+            undo = UndoTracker(max_actions=4)
+            undo.my_checkpoint_interval = 2
+            grid.restore(None)
+            for action in actions:
+                action.redo_apply(grid)
+                undo.add_action(action, grid)
+            evicted = len(actions) - 4
+            self.assertGreater(undo.seek_start(), 0)
+            undo.seek(grid, 0)
+            self.assertEqual(undo.undo_count(), undo.seek_start())
+            self.assertEqual(grid.snapshot(), states[evicted + undo.seek_start()])
+            undo.seek(grid, 4)
+            self.assertEqual(grid.snapshot(), states[-1])
+
+    @number("4.6")
+    def test_scrub(self):
+        grid = Grid(Grid.DRAW_STYLE_SET, 20, 20)
+        replayed_grid = Grid(Grid.DRAW_STYLE_SET, 20, 20)
+        undo = UndoTracker()
+        undo.my_checkpoint_interval = 8
+
+        states = [grid.snapshot()]
+        for i in range(40):
+            action = PaintAction([PaintStep((i % 20, i // 2), [green, red, blue][i % 3]), PaintStep((0, 0), [green, red][i % 2])])
+            action.redo_apply(grid)
+            undo.add_action(action, grid)
+            states.append(grid.snapshot())
+        replayed_grid.restore(grid.snapshot())
+
+        # Back and forth over the timeline, only the squares painted in between are part of the change.
+        previous = 40
+        for index in [39, 30, 31, 3, 37, 12, 12, 0, 40]:
+            entries = undo.seek(grid, index)
+            for action, is_undo in entries:
+                if is_undo:
+                    action.undo_apply(replayed_grid)
+                else:
+                    action.redo_apply(replayed_grid)
+            self.assertEqual(grid.snapshot(), states[index], "Wrong state after seek")
+            self.assertEqual(replayed_grid.snapshot(), states[index], "Replay entries do not match the seek")
+            self.assertLessEqual(sum(action.step_count() for action, _ in entries), 2 * (abs(index - previous) + 1))
+            previous = index
+
+        # The same square painted over and over only shows up once.
+        entries = undo.seek(grid, 0)
+        self.assertEqual(sum(1 for action, _ in entries for step in action.steps if step.affected_grid_square == (0, 0)), 1)
+
+    @number("4.7")
+    def test_undo_redo_many(self):
+        for draw_style in Grid.DRAW_STYLE_OPTIONS:
+            grid = Grid(draw_style, 6, 6)
+            control_grid = Grid(draw_style, 6, 6)
+            undo = UndoTracker()
+            control_undo = UndoTracker()
+
+            layers = [green, red, blue]
+            actions = []
+            for i in range(30):
+                if i % 7 in (3, 4) or i == 20:
+                    actions.append(PaintAction([], True))
+                else:
+                    actions.append(PaintAction([PaintStep((i % 6, (i * 5) % 6), layers[i % 3]),
+                                                PaintStep((2, 2), layers[(i + 1) % 3])]))
+            for action in actions:
+                for g, u in ((grid, undo), (control_grid, control_undo)):
+                    action.redo_apply(g)
+                    u.add_action(action, g)
+
+            # Same actions, in the same order, and the same (lossy) result as one undo / redo at a time.
+            for count, is_undo in [(4, True), (9, True), (6, False), (40, True), (12, False), (1, True), (40, False)]:
+                if is_undo:
+                    done = undo.undo_many(grid, count)
+                    control_done = [control_undo.undo(control_grid) for _ in range(min(count, control_undo.undo_count()))]
+                else:
+                    done = undo.redo_many(grid, count)
+                    control_done = [control_undo.redo(control_grid) for _ in range(min(count, control_undo.redo_count()))]
+                self.assertEqual(done, control_done)
+                self.assertEqual(grid.snapshot(), control_grid.snapshot(), "Net change differs from one step at a time")
+                self.assertEqual(undo.undo_count(), control_undo.undo_count())
+
+    @number("4.8")
+    def test_branches(self):
+        for draw_style in Grid.DRAW_STYLE_OPTIONS:
+            grid = Grid(draw_style, 10, 10)
+            replayed_grid = Grid(draw_style, 10, 10)
+            undo = UndoTracker()
+            a, b, c, d, e = [PaintAction([PaintStep((i, i), layer), PaintStep((4, 4), layer)])
+                             for i, layer in enumerate([green, red, blue, red, green])]
+
+            def add(action):
+                action.redo_apply(grid)
+                undo.add_action(action, grid)
+
+            def state(*actions):
+                # undo is lossy, so compare against the actions redone from an empty grid
+                fresh_grid = Grid(draw_style, 10, 10)
+                for action in actions:
+                    action.redo_apply(fresh_grid)
+                return fresh_grid.snapshot()
+
+            def checkout(node):
+                replayed_grid.restore(grid.snapshot())
+                for action, is_undo in undo.checkout(grid, node):
+                    if is_undo:
+                        action.undo_apply(replayed_grid)
+                    else:
+                        action.redo_apply(replayed_grid)
+                self.assertEqual(replayed_grid.snapshot(), grid.snapshot(), "Replay entries do not match the checkout")
+
+            add(a)
+            add(b)
+            add(c)
+            undo.undo(grid)
+            undo.undo(grid)
+            add(d)
+            undo.undo(grid)
+
+            # b is kept as a branch next to d.
+            self.assertEqual([node.action for node in undo.redo_branches()], [b, d])
+            undo.switch_branch(grid)
+            self.assertEqual((undo.undo_count(), undo.redo_count()), (2, 1), "Redo should continue along the branch")
+            self.assertEqual(undo.redo(grid), c)
+            self.assertEqual(grid.snapshot(), state(a, b, c))
+
+            # Back to d from the tip of the other branch, then a special on top of it.
+            undo.undo(grid)
+            undo.undo(grid)
+            checkout(undo.redo_branches()[1])
+            self.assertEqual(grid.snapshot(), state(a, d))
+            add(PaintAction([], True))
+            undo.seek(grid, 0)
+            checkout(undo.redo_branches()[0].children[0])
+            self.assertEqual((undo.undo_count(), undo.redo_count()), (2, 1))
+            undo.redo(grid)
+            self.assertEqual(grid.snapshot(), state(a, b, c))
+
+        # The least recently used branch goes first once the history is full.
+        undo = UndoTracker(max_actions=4)
+        undo.add_action(a)
+        for action in [b, c, d, e]:
+            undo.add_action(action)
+            undo.undo(grid)
+        self.assertEqual([node.action for node in undo.redo_branches()], [c, d, e])
+        self.assertEqual(undo.undo_count() + undo.redo_count(), 2)
+
+    @number("4.10")
+    def test_branches_after_eviction(self):
+        grid = Grid(Grid.DRAW_STYLE_SET, 10, 10)
+        replayed_grid = Grid(Grid.DRAW_STYLE_SET, 10, 10)
+        big = PaintAction([PaintStep((i % 10, i // 10), green) for i in range(50)])
+        small = [PaintAction([PaintStep((i, 9), red)]) for i in range(4)]
+        undo = UndoTracker(max_bytes=big.estimated_bytes() + 2 * small[0].estimated_bytes())
+
+        def add(action):
+            action.redo_apply(grid)
+            undo.add_action(action, grid)
+
+        add(big)
+        undo.undo(grid)
+        undo.redo(grid)
+        for action in small[:3]:
+            add(action)
+        undo.undo(grid)
+        add(small[3])
+        undo.undo(grid)
+
+        # The oldest action and its checkpoint were evicted: the branch is reached one action at a time.
+        self.assertIsNone(undo._checkpoint_before(0))
+        self.assertEqual([node.action for node in undo.redo_branches()], [small[2], small[3]])
+        replayed_grid.restore(grid.snapshot())
+        for action, is_undo in undo.switch_branch(grid):
+            if is_undo:
+                action.undo_apply(replayed_grid)
+            else:
+                action.redo_apply(replayed_grid)
+        self.assertEqual(replayed_grid.snapshot(), grid.snapshot(), "Replay entries do not match the switch")
+        self.assertEqual((undo.undo_count(), undo.redo_count()), (3, 0))
+        self.assertEqual(undo.undo(grid), small[2])
+
+        # Cold branches are evicted before the actions of the active branch, also when the active branch is full.
+        undo = UndoTracker(max_actions=3)
+        for action in small[:3]:
+            undo.add_action(action)
+        undo.undo(grid)
+        undo.add_action(small[3])
+        self.assertEqual(undo.redo_branches(), [])
+        self.assertEqual([undo.undo(grid) for _ in range(4)], [small[3], small[1], small[0], None])
+
+    @number("4.9")
+    def test_journal(self):
+        class SmallUndoTracker(UndoTracker):
+            HOT_WINDOW = 2
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "undo.journal")
+            grid = Grid(Grid.DRAW_STYLE_ADD, 10, 10)
+            undo = SmallUndoTracker(journal=UndoJournal(path))
+            actions = [PaintAction([PaintStep((i, i), layer), PaintStep((4, 4), layer)])
+                       for i, layer in enumerate([green, red, blue, red, green])]
+
+            for action in actions[:3]:
+                action.redo_apply(grid)
+                undo.add_action(action, grid)
+            undo.undo(grid)
+            undo.undo(grid)
+            for action in actions[3:] + [PaintAction([], True)]:
+                action.redo_apply(grid)
+                undo.add_action(action, grid)
+            undo.begin_action()
+            stroke = PaintAction([PaintStep((0, 9), blue)])
+            stroke.redo_apply(grid)
+            undo.add_action(stroke, grid)
+            undo.end_action(grid)
+            undo.undo(grid)
+
+            # Only the hot window is in memory, the rest is read back from the journal.
+            self.assertLessEqual(undo.my_bytes, 2 * max(action.estimated_bytes() for action in actions))
+            self.assertEqual(undo.redo_branches()[0].action, stroke)
+
+            # Crash: the journal is left as it is, with the steps of an action that was never committed.
+            undo.my_journal._write(array("I", [KIND_STEP, 1, 1, 1]))
+            undo.seek(grid, undo.undo_count())
+            expected = grid.snapshot()
+            expected_counts = (undo.undo_count(), undo.redo_count())
+            expected_branches = [node.action for node in undo.redo_branches()]
+            undo.my_journal.close()
+
+            recovered_grid = Grid(Grid.DRAW_STYLE_ADD, 10, 10)
+            recovered = SmallUndoTracker(journal=UndoJournal(path))
+            self.assertTrue(recovered.recover(recovered_grid))
+            self.assertEqual(recovered_grid.snapshot(), expected)
+            self.assertEqual((recovered.undo_count(), recovered.redo_count()), expected_counts)
+            self.assertEqual([node.action for node in recovered.redo_branches()], expected_branches)
+            recovered.seek(recovered_grid, 1)
+            recovered.checkout(recovered_grid, recovered.redo_branches()[0])
+            self.assertEqual(recovered.redo(recovered_grid), actions[2])
+            recovered.my_journal.close()
+
+            self.assertFalse(UndoTracker().recover(grid))
+
+    @number("4.11")
+    def test_journal_depth(self):
+        class SmallUndoTracker(UndoTracker):
+            HOT_WINDOW = 4
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "undo.journal")
+            grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 10, 10)
+            undo = SmallUndoTracker(max_actions=40, journal=UndoJournal(path))
+            undo.clear_undo(grid)
+            actions = [PaintAction([PaintStep((i % 10, i // 10 % 10), [green, red, blue][i % 3])]) for i in range(50)]
+            states = [grid.snapshot()]
+            for action in actions:
+                action.redo_apply(grid)
+                undo.add_action(action, grid)
+                states.append(grid.snapshot())
+
+            # Only the journal limits the depth: the older nodes of the active branch are only kept as journal ids.
+            self.assertEqual((undo.undo_count(), len(undo.my_history)), (50, 4))
+            for index in [3, 49, 0, 17]:
+                undo.seek(grid, index)
+                self.assertEqual(grid.snapshot(), states[index])
+
+            # A branch off a spilled node, and back.
+            other = PaintAction([PaintStep((9, 9), blue)])
+            other.redo_apply(grid)
+            undo.add_action(other, grid)
+            undo.undo(grid)
+            self.assertEqual([node.action for node in undo.redo_branches()], [actions[17], other])
+            undo.switch_branch(grid)
+            self.assertEqual((undo.undo_count(), undo.redo_count()), (18, 32))
+            self.assertEqual(grid.snapshot(), states[18])
+
+            # Redo actions that could never fit in the budget of the other branches are dropped instead.
+            undo.seek(grid, 5)
+            last = PaintAction([PaintStep((8, 8), green)])
+            last.redo_apply(grid)
+            undo.add_action(last, grid)
+            undo.undo(grid)
+            self.assertEqual([node.action for node in undo.redo_branches()], [last])
+            undo.seek(grid, 3)
+            undo.my_journal.close()
+
+            # The grid it was recorded on is in the journal.
+            recovered = SmallUndoTracker(max_actions=40, journal=UndoJournal(path))
+            self.assertEqual(recovered.recover_grid(), (Grid.DRAW_STYLE_SEQUENCE, 10, 10))
+            recovered_grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 10, 10)
+            self.assertTrue(recovered.recover(recovered_grid))
+            self.assertEqual((recovered.undo_count(), recovered.redo_count()), (3, 3))
+            self.assertEqual(recovered_grid.snapshot(), states[3])
+            recovered.seek(recovered_grid, 0)
+            self.assertEqual(recovered_grid.snapshot(), states[0])
+            self.assertEqual(recovered.redo_many(recovered_grid, 6)[-1], last)
+            recovered.my_journal.close()
+
+        # A session recovers onto a grid of the draw style and size of the journal.
+        with tempfile.TemporaryDirectory() as directory:
+            class JournalSession(PaintSession):
+                UNDO_JOURNAL_PATH = os.path.join(directory, "undo.journal")
+
+            session = JournalSession(Grid.DRAW_STYLE_SET, 6, 6)
+            session.change_draw_mode()
+            session.on_paint(green, 2, 3)
+            expected = session.grid.snapshot()
+            session.close()
+
+            session = JournalSession(Grid.DRAW_STYLE_SET, 32, 32)
+            self.assertEqual((session.draw_style, session.size_x, session.size_y), (Grid.DRAW_STYLE_ADD, 6, 6))
+            self.assertEqual(session.grid.my_draw_style, Grid.DRAW_STYLE_ADD)
+            self.assertEqual(session.grid.snapshot(), expected)
+            self.assertEqual(session.my_undo_tracker.undo_count(), 1)
+            session.close()
+
+    @number("4.12")
+    def test_checkpoint_thinning(self):
+        class SmallUndoTracker(UndoTracker):
+            CHECKPOINT_INTERVAL = 2
+            MAX_CHECKPOINTS = 4
+
+        grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 8, 8)
+        undo = SmallUndoTracker()
+        states = [grid.snapshot()]
+        action_bytes = 0
+        for i in range(40):
+            action = PaintAction([PaintStep((i % 8, i // 8), [green, red, blue][i % 3])])
+            action.redo_apply(grid)
+            undo.add_action(action, grid)
+            action_bytes += action.estimated_bytes()
+            states.append(grid.snapshot())
+
+        # Every other checkpoint is dropped at a time, so they stay spread over the whole history.
+        keys = [undo.my_checkpoints[i].key for i in range(len(undo.my_checkpoints))]
+        self.assertLessEqual(len(keys), 4)
+        self.assertEqual(keys[0], 0)
+        self.assertEqual(undo.my_checkpoint_interval, 16)
+        self.assertEqual(keys, list(range(0, 41, 16)))
+        snapshot_bytes = sum(Grid.snapshot_bytes(undo.my_checkpoints[i].value) for i in range(len(keys)))
+        self.assertGreater(snapshot_bytes, 0)
+        self.assertEqual(undo.my_bytes, action_bytes + snapshot_bytes)
+        for index in [3, 37, 20, 0]:
+            undo.seek(grid, index)
+            self.assertEqual(grid.snapshot(), states[index])
+
+        # Checkpoints count in the byte budget, and go before any action.
+        undo = SmallUndoTracker(max_bytes=action_bytes + Grid.snapshot_bytes(states[-1]) // 2)
+        grid.restore(None)
+        for i in range(40):
+            action = PaintAction([PaintStep((i % 8, i // 8), [green, red, blue][i % 3])])
+            action.redo_apply(grid)
+            undo.add_action(action, grid)
+        self.assertEqual(undo.undo_count(), 40)
+        self.assertEqual(len(undo.my_checkpoints), 1)
+        self.assertLessEqual(undo.my_bytes, undo.my_max_bytes)
+        undo.seek(grid, 5)
+        self.assertEqual(grid.snapshot(), states[5])
+
+    @number("4.13")
+    def test_journal_dropped_redo(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "undo.journal")
+            grid = Grid(Grid.DRAW_STYLE_ADD, 10, 10)
+            undo = UndoTracker(max_actions=3, journal=UndoJournal(path))
+            for i in range(4):
+                action = PaintAction([PaintStep((i, i), green)])
+                action.redo_apply(grid)
+                undo.add_action(action, grid)
+            undo.seek(grid, 0)
+
+            # The 4 actions to redo do not fit in the budget of the cold branches, so they are dropped.
+            last = PaintAction([PaintStep((5, 5), red)])
+            last.redo_apply(grid)
+            undo.add_action(last, grid)
+            undo.undo(grid)
+            self.assertEqual([node.action for node in undo.redo_branches()], [last])
+            self.assertEqual(undo.switch_branch(grid), [(last, False)])
+            self.assertEqual((undo.undo_count(), undo.redo_count()), (1, 0))
+            self.assertGreaterEqual(undo.my_bytes, 0)
+            undo.my_journal.close()
+
+            recovered = UndoTracker(max_actions=3, journal=UndoJournal(path))
+            self.assertTrue(recovered.recover(Grid(Grid.DRAW_STYLE_ADD, 10, 10)))
+            self.assertEqual((recovered.undo_count(), recovered.redo_count()), (1, 0))
+            self.assertEqual(len(recovered.redo_branches()), 0)
+            recovered.my_journal.close()
+
     def assertGridEqual(self, grid1: Grid, grid2: Grid):
         for x in range(len(grid1.store_array)):
             for y in range(len(grid1[x])):
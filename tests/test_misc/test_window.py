@@ -3,30 +3,20 @@ from ed_utils.decorators import number
 
 from layers import green, red, blue
 from grid import Grid
-from main import MyWindow
-
-class FakeWindow:
-    def __init__(self, grid: Grid):
-        self.grid = grid
-
-FakeWindow.on_init = MyWindow.on_init
-FakeWindow.on_reset = MyWindow.on_reset
-FakeWindow.on_paint = MyWindow.on_paint
-FakeWindow.on_increase_brush_size = MyWindow.on_increase_brush_size
-FakeWindow.on_decrease_brush_size = MyWindow.on_decrease_brush_size
+from paint_session import PaintSession
+from script import parse_script, run_script
+from benchmarks.run import BENCHMARKS, run_benchmarks
 
 class TestGrid(unittest.TestCase):
 
     @number("6.1")
     def test_basic(self):
-        grid = Grid(Grid.DRAW_STYLE_SET, 5, 5)
+        session = PaintSession(Grid.DRAW_STYLE_SET, 5, 5)
+        grid = session.grid
         control_grid = Grid(Grid.DRAW_STYLE_SET, 5, 5)
 
-        fw = FakeWindow(grid)
-        fw.on_init()
-        fw.on_reset()
         # Check default brush size of 2
-        fw.on_paint(red, 2, 2)
+        session.on_paint(red, 2, 2)
         expected_change = [
             (2, 2),  # distance 0
             (1, 2), (3, 2), (2, 1), (2, 3),  # distance 1
@@ -39,31 +29,29 @@ class TestGrid(unittest.TestCase):
 
     @number("6.2")
     def test_increase_decrease(self):
-        grid = Grid(Grid.DRAW_STYLE_SET, 5, 5)
+        session = PaintSession(Grid.DRAW_STYLE_SET, 5, 5)
+        grid = session.grid
         control_grid = Grid(Grid.DRAW_STYLE_SET, 5, 5)
 
-        fw = FakeWindow(grid)
-        fw.on_init()
-        fw.on_reset()
 
-        fw.on_decrease_brush_size()
-        fw.on_decrease_brush_size()
-        fw.on_paint(green, 1, 4)
+        session.on_decrease_brush_size()
+        session.on_decrease_brush_size()
+        session.on_paint(green, 1, 4)
         control_grid[1][4].add(green)
         self.assertGridEqual(grid, control_grid)
 
         # Decrease past 0 - not possible.
-        fw.on_decrease_brush_size()
-        fw.on_paint(green, 2, 2)
+        session.on_decrease_brush_size()
+        session.on_paint(green, 2, 2)
         control_grid[2][2].add(green)
         self.assertGridEqual(grid, control_grid)
 
         # Increase up to 4
-        fw.on_increase_brush_size()
-        fw.on_increase_brush_size()
-        fw.on_increase_brush_size()
-        fw.on_increase_brush_size()
-        fw.on_paint(blue, 2, 2)
+        session.on_increase_brush_size()
+        session.on_increase_brush_size()
+        session.on_increase_brush_size()
+        session.on_increase_brush_size()
+        session.on_paint(blue, 2, 2)
         for x in range(5):
             for y in range(5):
                 control_grid[x][y].add(blue)
@@ -71,18 +59,220 @@ class TestGrid(unittest.TestCase):
         self.assertGridEqual(grid, control_grid)
 
         # Increase past maximum
-        fw.on_increase_brush_size()
-        fw.on_increase_brush_size()
-        fw.on_increase_brush_size()
-        fw.on_increase_brush_size()
-        fw.on_paint(green, 1, 1)
+        for _ in range(Grid.MAX_BRUSH):
+            session.on_increase_brush_size()
+        self.assertEqual(grid.brush_size, Grid.MAX_BRUSH)
+        session.on_paint(green, 1, 1)
         for x in range(5):
             for y in range(5):
                 control_grid[x][y].add(green)
-        control_grid[4][4].add(blue)
 
         self.assertGridEqual(grid, control_grid) 
 
+    @number("6.3")
+    def test_brush_shapes(self):
+        session = PaintSession(Grid.DRAW_STYLE_SET, 7, 7)
+        grid = session.grid
+        control_grid = Grid(Grid.DRAW_STYLE_SET, 7, 7)
+
+
+        # Square brush of size 1 in the corner.
+        session.on_change_brush_shape()
+        self.assertEqual(grid.brush_shape, Grid.BRUSH_SHAPE_SQUARE)
+        session.on_decrease_brush_size()
+        session.on_paint(red, 0, 0)
+        for x, y in [(0, 0), (0, 1), (1, 0), (1, 1)]:
+            control_grid[x][y].add(red)
+        self.assertGridEqual(grid, control_grid)
+
+        # Disc brush of size 3 covers everything within euclidean distance 3.
+        session.on_change_brush_shape()
+        self.assertEqual(grid.brush_shape, Grid.BRUSH_SHAPE_DISC)
+        session.on_increase_brush_size()
+        session.on_increase_brush_size()
+        session.on_paint(blue, 3, 3)
+        for x in range(7):
+            for y in range(7):
+                if (x - 3) ** 2 + (y - 3) ** 2 <= 9:
+                    control_grid[x][y].add(blue)
+        self.assertGridEqual(grid, control_grid)
+
+        # And back to the diamond.
+        session.on_change_brush_shape()
+        self.assertEqual(grid.brush_shape, Grid.BRUSH_SHAPE_DIAMOND)
+
+    @number("6.4")
+    def test_stroke(self):
+        session = PaintSession(Grid.DRAW_STYLE_ADD, 6, 6)
+        grid = session.grid
+        control_grid = Grid(Grid.DRAW_STYLE_ADD, 6, 6)
+
+        session.on_decrease_brush_size()
+        # Overlapping footprints along the stroke only paint each square once.
+        session.on_paint_stroke(red, [(1, 1), (1, 2), (2, 2), (3, 2)])
+        painted = set()
+        for px, py in [(1, 1), (1, 2), (2, 2), (3, 2)]:
+            for x, y in [(px, py), (px-1, py), (px+1, py), (px, py-1), (px, py+1)]:
+                painted.add((x, y))
+        for x, y in painted:
+            control_grid[x][y].add(red)
+        self.assertGridEqual(grid, control_grid)
+        # As one action.
+        self.assertEqual(session.my_undo_tracker.undo_count(), 1)
+
+        def replayed(session):
+            grid = Grid(session.draw_style, session.size_x, session.size_y)
+            replay = session.my_replay_tracker
+            for index in range(replay.action_count()):
+                action, is_undo = replay.my_replay_log[index]
+                if is_undo:
+                    action.undo_apply(grid)
+                else:
+                    action.redo_apply(grid)
+            return grid.snapshot()
+
+        # A square that changes layer within a stroke keeps its last one, through undo / redo and the replay.
+        session = PaintSession(Grid.DRAW_STYLE_SET, 6, 6)
+        session.grid.brush_size = 0
+        session.on_stroke_start()
+        for layer in [red, blue, red]:
+            session.on_paint_stroke(layer, [(2, 2)])
+        session.on_stroke_end()
+        expected = session.grid.snapshot()
+        session.on_undo()
+        session.on_redo()
+        self.assertEqual(session.grid.snapshot(), expected)
+        self.assertEqual(replayed(session), expected)
+
+        # A press while a stroke is still going ends that stroke, which is recorded for the replay as well.
+        session = PaintSession(Grid.DRAW_STYLE_ADD, 6, 6)
+        session.grid.brush_size = 0
+        session.on_stroke_start()
+        session.on_paint_stroke(red, [(1, 1), (1, 2)])
+        session.on_stroke_start()
+        session.on_paint_stroke(blue, [(3, 3)])
+        session.on_stroke_end()
+        self.assertEqual(session.my_undo_tracker.undo_count(), 2)
+        self.assertEqual(session.my_replay_tracker.action_count(), 2)
+        self.assertEqual(replayed(session), session.grid.snapshot())
+
+    @number("6.5")
+    def test_replay_verify(self):
+        for style in [Grid.DRAW_STYLE_SET, Grid.DRAW_STYLE_ADD, Grid.DRAW_STYLE_SEQUENCE]:
+            session = PaintSession(style, 6, 6)
+            grid = session.grid
+            for i in range(12):
+                session.on_paint([red, green, blue][i % 3], i % 6, i // 2 % 6)
+                if i % 4 == 3:
+                    session.on_undo()
+                if i % 5 == 4:
+                    session.on_special()
+            session.on_undo_many(3)
+            session.on_redo()
+            session.on_seek(2)
+
+            # Every action was recorded with the hash of the grid after it; replaying matches all of them.
+            replay = session.my_replay_tracker
+            replay.set_verify(True)
+            replay.start_replay()
+            replay_grid = Grid(style, 6, 6)
+            while not replay.play_next_action(replay_grid):
+                pass
+            self.assertIsNone(replay.first_divergence())
+            self.assertEqual(replay_grid.state_hash(), session.grid.state_hash())
+
+    @number("6.6")
+    def test_clear_and_pool(self):
+        for style in [Grid.DRAW_STYLE_SET, Grid.DRAW_STYLE_ADD, Grid.DRAW_STYLE_SEQUENCE]:
+            session = PaintSession(style, 5, 5)
+            grid = session.grid
+            session.on_paint(red, 2, 2)
+            session.on_special()
+            stores = [grid[x][y] for x in range(5) for y in range(5)]
+
+            # Cleared in place: the same stores, as empty as a new grid.
+            grid.clear()
+            self.assertEqual([grid[x][y] for x in range(5) for y in range(5)], stores)
+            self.assertEqual(grid.snapshot(), Grid(style, 5, 5).snapshot())
+            self.assertEqual(grid.state_hash(), 0)
+
+            # A reset clears the grid in place, with the brush back to the default as on a new grid;
+            # seeking back to the empty grid keeps the brush.
+            session.on_increase_brush_size()
+            session.on_change_brush_shape()
+            session.on_paint(red, 2, 2)
+            session.on_seek(0)
+            self.assertEqual((grid.brush_size, grid.brush_shape), (Grid.DEFAULT_BRUSH_SIZE + 1, Grid.BRUSH_SHAPE_SQUARE))
+            session.reset()
+            self.assertIs(session.grid, grid)
+            self.assertEqual((grid.brush_size, grid.brush_shape), (Grid.DEFAULT_BRUSH_SIZE, Grid.DEFAULT_BRUSH_SHAPE))
+
+            # Stores released by a mode change go to the pool of the session, and are reused by the next grid of the style.
+            session.on_paint(green, 1, 1)
+            for _ in Grid.DRAW_STYLE_OPTIONS:
+                session.change_draw_mode()
+            reused = session.grid
+            self.assertEqual(set(map(id, (reused[x][y] for x in range(5) for y in range(5)))), set(map(id, stores)))
+            self.assertEqual(reused.snapshot(), Grid(style, 5, 5).snapshot())
+            reused[0][0].add(blue)
+            self.assertNotEqual(reused.state_hash(), 0)
+            # The pool holds one grid's worth per other style, and is dropped with a new size; grids without a pool
+            # share nothing.
+            self.assertEqual(sorted(len(pool) for pool in session.store_pool.values()), [0, 25, 25])
+            session.size_x = 6
+            session.reset()
+            self.assertEqual(session.store_pool, {})
+            Grid(style, 5, 5).release()
+            self.assertEqual(session.store_pool, {})
+
+    @number("6.7")
+    def test_script(self):
+        commands = parse_script([
+            "# comments and blank lines are skipped",
+            "",
+            "style sequence",
+            "paint red 1 1",
+            "paint 5 3 3 1  # green, brush size 1",
+            "undo",
+            "redo 1",
+            "special",
+            "paint blue 4 0 0",
+            "undo 2",
+            "redo 2",
+        ])
+        self.assertEqual(len(commands), 9)
+        result = run_script(commands, PaintSession(Grid.DRAW_STYLE_SET, 6, 6), pixels=True)
+
+        # The same operations, made by hand.
+        session = PaintSession(Grid.DRAW_STYLE_SEQUENCE, 6, 6)
+        session.on_paint(red, 1, 1)
+        session.grid.brush_size = 1
+        session.on_paint(green, 3, 3)
+        session.on_undo()
+        session.on_redo()
+        session.on_special()
+        session.grid.brush_size = 0
+        session.on_paint(blue, 4, 0)
+        session.on_undo_many(2)
+        session.on_redo_many(2)
+        self.assertEqual(result.operations, 9)
+        self.assertEqual(result.state_hash, session.grid.state_hash())
+        self.assertIsNotNone(result.pixel_checksum)
+
+        for line in ["paint red 1", "paint nothing 1 1", "undo 0", "style NONE", "paint red 1 1 -1", "jump"]:
+            with self.assertRaises(ValueError):
+                parse_script([line])
+
+    @number("6.8")
+    def test_benchmarks(self):
+        results = run_benchmarks([4], Grid.DRAW_STYLE_OPTIONS, BENCHMARKS, 3, [0, 1], 4)
+        # Every benchmark reported for every draw style, with ordered statistics.
+        self.assertEqual({(result["benchmark"], result["style"]) for result in results},
+                         {(name, style) for name in BENCHMARKS for style in Grid.DRAW_STYLE_OPTIONS})
+        for result in results:
+            self.assertEqual(result["samples"], 3)
+            self.assertTrue(result["min"] <= result["p10"] <= result["median"] <= result["p90"] <= result["max"])
+
     def assertGridEqual(self, grid1: Grid, grid2: Grid):
         for x in range(len(grid1.store_array)):
             for y in range(len(grid1[x])):
@@ -1,22 +1,1473 @@
 from __future__ import annotations
+import weakref
+from array import array
 from action import PaintAction
 from grid import Grid
-from data_structures.stack_adt import ArrayStack
+from layer_util import get_layers
+from data_structures.ring_buffer import RingBuffer
+from data_structures.array_sorted_list import ArraySortedList
+from data_structures.sorted_list_adt import ListItem
+from journal import UndoJournal
+
+class HistoryNode:
+
+    """
+    A node of the undo tree: the action that leads to it from its parent, and every branch that continues from it
+    - The action object is shared, never copied, whichever branch it is on
+    - The root holds no action; it stands for the oldest state still in the history
+    - With a journal, the action may only be on disk: it is read back the first time it is needed
+    """
+
+    def __init__(self, action: PaintAction|None, parent: HistoryNode|None, depth: int) -> None:
+
+        """
+        defining the magic method : __init__
+
+        Args:
+        - self
+        - action of PaintAction class, None for the root
+        - parent of HistoryNode class, None for the root
+        - depth: absolute history index of the state this node stands for
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        self.my_action = action
+        self.parent = parent
+        self.children = []
+        self.depth = depth
+        # tick of the UndoTracker when this node was last on the active branch
+        self.last_used = 0
+        # id of the action in the journal of its UndoTracker (-1 if not written), and that UndoTracker
+        self.record = -1
+        self.owner = None
+
+
+    @property
+    def action(self) -> PaintAction|None:
+
+        """
+        Returns the action of the node, reading it back from the journal if it is not in memory
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - PaintAction, None for the root
+
+        Complexity:
+        - Worst case: O(other_function), from read_action of the journal
+        - Best case: O(1)
+        """
+
+        if self.my_action is None and self.owner is not None:
+            self.owner._load(self)
+        return self.my_action
+
+
+    @action.setter
+    def action(self, action: PaintAction|None) -> None:
+        self.my_action = action
+
 
 class UndoTracker:
 
-    MAX_CAPACITY = 10000
+    # default budget of the history: number of actions and estimated bytes
+    MAX_CAPACITY = 10000
+    MAX_BYTES = 64 * 1024 * 1024
+
+    # a grid checkpoint is taken every my_checkpoint_interval actions, or sooner once my_checkpoint_squares squares were
+    # changed, starting with CHECKPOINT_INTERVAL and CHECKPOINT_SQUARES; both double whenever the checkpoints are thinned
+    # (see _thin_checkpoints)
+    CHECKPOINT_INTERVAL = 64
+    CHECKPOINT_SQUARES = 16384
+    MAX_CHECKPOINTS = 32
+
+    # with a journal, only the actions of this many nodes used last are kept in memory,
+    # and only this many nodes of the active branch (the older ones are spilled, see _spill)
+    HOT_WINDOW = 256
+
+    def __init__(self, max_actions: int = MAX_CAPACITY, max_bytes: int = MAX_BYTES, journal: UndoJournal = None) -> None:
+        """
+        defining the magic method : __init__
+        - This initialises an object of the Undotracker class;
+        - The history is a tree of HistoryNode, so adding an action after undoing keeps the actions it replaces as a branch
+        - The data structure used for the active branch is RingBuffer, holding its nodes from the oldest to the newest;
+          actions before my_position can be undone, actions from my_position onwards can be redone
+        - Branches hanging off the active branch are cold: they are kept in my_cold_branches, and when the history goes over
+          its budget the least recently used ones are evicted first, then the oldest actions, so new actions are never refused
+        - With a journal, every action is also written to disk and only HOT_WINDOW of them stay in memory
+          (my_bytes then only counts those); the history can be rebuilt from the journal with recover
+        - With a journal, the active branch is only limited by the disk: my_history only holds its newest HOT_WINDOW nodes,
+          the older ones are kept in my_spilled as their journal ids, and turned back into nodes when they are needed
+        - Grid checkpoints are kept in an ArraySortedList keyed by their absolute history index (my_base + position),
+          starting with the empty grid at index 0, so seek can jump anywhere by replaying only a few actions;
+          their snapshots count in my_bytes
+
+        Args:
+        - self
+        - max_actions: maximum number of actions kept in the history, over all branches;
+          with a journal, only over the branches other than the active one
+        - max_bytes: maximum estimated size of the actions kept in the history (see PaintAction.estimated_bytes)
+        - journal of UndoJournal class, optional
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function) where other_function is complexity of initialising the RingBuffer
+        - Best case: O(other_function)
+        """
+
+        self.my_max_bytes = max_bytes
+        self.my_max_actions = max_actions
+        self.my_journal = journal
+        self.my_history = RingBuffer(max_actions if journal is None else self.HOT_WINDOW)
+        # journal ids of the oldest nodes of the active branch, before those of my_history, and the nodes
+        # made for them that are still in use
+        self.my_spilled = array("i")
+        self.my_spilled_nodes = weakref.WeakValueDictionary()
+        self.my_position = 0
+        self.my_bytes = 0
+
+        self.my_root = HistoryNode(None, None, 0)
+        # first node of each cold branch -> None, and the number of nodes over all branches (the root excluded)
+        self.my_cold_branches = {}
+        self.my_node_count = 0
+        self.my_tick = 0
+
+        self.my_hot_nodes = RingBuffer(self.HOT_WINDOW)
+        # node of the open action, written to the journal once the action is closed
+        self.my_open_node = None
+
+        # number of actions evicted so far, position i of the history has the absolute index my_base + i
+        self.my_base = 0
+        self.my_checkpoints = ArraySortedList(self.MAX_CHECKPOINTS + 1)
+        self.my_checkpoints.add(ListItem(None, 0))
+        self.my_checkpoint_interval = self.CHECKPOINT_INTERVAL
+        self.my_checkpoint_squares = self.CHECKPOINT_SQUARES
+        self.my_squares_since_checkpoint = 0
+        # whether the grid is exactly in the state it had when the history first reached my_position
+        self.my_exact = True
+
+        # open-action mode: every action added between begin_action and end_action is merged into one
+        self.my_action_open = False
+        self.my_open_action = None
+        self.my_open_steps = None
+
+    def clear_undo(self, grid: Grid = None) -> None:
+
+        """
+        Completely empties the history
+        - Given the grid, the journal (if any) records its draw style and size, so recover_grid can rebuild it
+
+        Args:
+        - self
+        - grid of Grid class, optional
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function)
+        - Best case: O(other_function)
+        """
+
+        self.my_history.clear()
+        self.my_spilled = array("i")
+        self.my_spilled_nodes = weakref.WeakValueDictionary()
+        self.my_position = 0
+        self.my_bytes = 0
+        self.my_root = HistoryNode(None, None, 0)
+        self.my_cold_branches = {}
+        self.my_node_count = 0
+        self.my_hot_nodes.clear()
+        self.my_base = 0
+        self.my_checkpoints.clear()
+        self.my_checkpoints.add(ListItem(None, 0))
+        self.my_checkpoint_interval = self.CHECKPOINT_INTERVAL
+        self.my_checkpoint_squares = self.CHECKPOINT_SQUARES
+        self.my_squares_since_checkpoint = 0
+        self.my_exact = True
+        self.end_action()
+        self.my_open_node = None
+        if self.my_journal is not None and grid is not None:
+            self.my_journal.reset(Grid.DRAW_STYLE_OPTIONS.index(grid.my_draw_style) + 1, grid.num_of_cols, grid.num_of_rows)
+        elif self.my_journal is not None:
+            self.my_journal.reset()
+
+
+    def recover_grid(self) -> tuple[str, int, int]|None:
+
+        """
+        Returns the draw style and size of the grid the history in the journal was recorded on, so the grid recover
+        is given can be made alike
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - (draw style, number of columns, number of rows)
+        - None if there is no journal, nothing to recover, or the journal does not say (written by an older version)
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        temp_journal = self.my_journal
+        if temp_journal is None or len(temp_journal) == 0 or not 0 < temp_journal.draw_style <= len(Grid.DRAW_STYLE_OPTIONS):
+            return None
+        return Grid.DRAW_STYLE_OPTIONS[temp_journal.draw_style - 1], temp_journal.size_x, temp_journal.size_y
+
+
+    def undo_count(self) -> int:
+
+        """
+        Returns the number of actions that can currently be undone
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - number of actions before the current position in the history
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        return self.my_position
+
+
+    def redo_count(self) -> int:
+
+        """
+        Returns the number of actions that can currently be redone
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - number of actions after the current position in the history
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        return self._line_length() - self.my_position
+
+
+    def begin_action(self, merge_duplicates: bool = False) -> None:
+
+        """
+        Opens an action: every paint action added until end_action is merged into a single action,
+        so that e.g. a whole brush stroke is undone and redone in one go
+        - If merge_duplicates is set, a step that repeats the layer of the previous step of the open action on the same
+          square is dropped; only use this when adding a layer twice in a row changes nothing (see
+          LayerStore.ADD_IS_IDEMPOTENT). A step whose square got another layer in between is kept, since e.g. in a
+          SetLayerStore red, blue, red does not end the same as red, blue
+        - Any action that is already open is closed first
+
+        Args:
+        - self
+        - merge_duplicates: whether steps repeating the previous layer of their square can be dropped
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        self.end_action()
+        self.my_action_open = True
+        if merge_duplicates:
+            # square -> layer index of its last step in the open action
+            self.my_open_steps = {}
+
+
+    def end_action(self, grid: Grid = None) -> PaintAction|None:
+
+        """
+        Closes the open action, if any
+        - No checkpoint is taken while an action is open, since it is still growing; given the grid, one may be taken now
+
+        Args:
+        - self
+        - grid of Grid class, optional
+
+        Raises:
+        - None
+
+        Returns:
+        - The merged action that was built since begin_action
+        - None if no action was open or nothing was added to it
+
+        Complexity:
+        - Worst case: O(other_function) - from _maybe_checkpoint
+        - Best case: O(1)
+        """
+
+        temp_action = self.my_open_action
+        self.my_action_open = False
+        self.my_open_action = None
+        self.my_open_steps = None
+        if self.my_open_node is not None:
+            self._write_node(self.my_open_node)
+            self.my_open_node = None
+        if temp_action is not None:
+            self._maybe_checkpoint(grid)
+        return temp_action
+
+
+    def is_action_open(self) -> bool:
+
+        """
+        Returns whether actions are currently being merged into an open action
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - boolean value True between begin_action and end_action, False otherwise
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        return self.my_action_open
+
+
+    def add_action(self, action: PaintAction, grid: Grid = None) -> None:
+
+        """
+        - Adds the input action, already applied to the grid, to the history right after the current position
+        - The actions that could be redone are not dropped: they become a cold branch, which checkout can switch back to
+        - Evicts cold branches and the oldest actions if the history goes over its budget
+        - While an action is open (see begin_action), the steps of a paint action are merged into the open action instead
+        - Given the grid, a checkpoint of it is taken when one is due
+
+        Args:
+        - self
+        - action of PaintAction class
+        - grid of Grid class, optional
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(redo_count + evicted + action.step_count() + other_function), other_function from _maybe_checkpoint
+        - Best case: O(1)
+        """
+
+        if self.my_action_open and not action.is_special:
+            temp_is_first = self.my_open_action is None
+            self._merge_into_open_action(action)
+            if not temp_is_first:
+                return
+            # the first action of the stroke pushes the (still growing) open action
+            action = self.my_open_action
+        elif self.my_action_open:
+            self.end_action(grid)
+
+        self._detach_redo_branch()
+
+        temp_parent = self._line_node(self.my_position)
+        temp_node = HistoryNode(action, temp_parent, temp_parent.depth + 1)
+        temp_parent.children.append(temp_node)
+        self.my_tick += 1
+        temp_node.last_used = self.my_tick
+        self.my_node_count += 1
+        self.my_bytes += action.estimated_bytes()
+
+        if action is self.my_open_action:
+            self.my_open_node = temp_node
+        else:
+            self._write_node(temp_node)
+
+        # checkpoints and cold branches go before any action of the active branch, also when the active branch is full
+        self._thin_checkpoints()
+        self._evict_cold_branches()
+        self._append_line(temp_node)
+        self.my_position = self._line_length()
+        self._enforce_budget()
+        self._count_changed_squares(action, grid)
+        self._maybe_checkpoint(grid)
+
+
+    def _merge_into_open_action(self, action: PaintAction) -> None:
+
+        """
+        Adds the steps of the action to the open action, dropping the steps that repeat the previous layer of their
+        square if requested (see begin_action)
+        - The open action is created by the first action added after begin_action
+
+        Args:
+        - self
+        - action of PaintAction class
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(action.step_count())
+        - Best case: O(action.step_count())
+        """
+
+        temp_is_first = self.my_open_action is None
+        if temp_is_first:
+            self.my_open_action = PaintAction([], False)
+        else:
+            self.my_bytes -= self.my_open_action.estimated_bytes()
+
+        temp_steps_before = self.my_open_action.step_count()
+        temp_packed = action.packed_steps
+        for step_index in range(0, len(temp_packed), 3):
+            temp_x, temp_y, temp_layer_index = temp_packed[step_index], temp_packed[step_index + 1], temp_packed[step_index + 2]
+            if self.my_open_steps is not None:
+                temp_square = (temp_x, temp_y)
+                if self.my_open_steps.get(temp_square) == temp_layer_index:
+                    continue
+                self.my_open_steps[temp_square] = temp_layer_index
+            self.my_open_action.add_square(temp_x, temp_y, temp_layer_index)
+
+        if not temp_is_first:
+            # the open action is already in the history, so its growth counts against the budget
+            self.my_bytes += self.my_open_action.estimated_bytes()
+            self.my_squares_since_checkpoint += self.my_open_action.step_count() - temp_steps_before
+            self._enforce_budget()
+
+
+    def _enforce_budget(self) -> None:
+
+        """
+        Thins the checkpoints, then evicts the least recently used cold branches, then the oldest actions, until the
+        history fits in its budget
+        - Checkpoints only make seek faster, so they go first; the oldest one is always kept (see _thin_checkpoints)
+        - The newest action is always kept, even if it is bigger than the whole budget on its own
+        - With a journal, the actions of the active branch are on disk, so they are never evicted
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(evicted . cold branches + other_function), other_function from _thin_checkpoints
+        - Best case: O(1)
+        """
+
+        self._thin_checkpoints()
+        self._evict_cold_branches()
+        while self.my_journal is None and self.my_bytes > self.my_max_bytes and len(self.my_history) > 1:
+            self._evicted(self.my_history.serve())
+
+
+    def _evict_cold_branches(self) -> None:
+
+        """
+        Evicts the least recently used cold branches until the history fits in its budget, or there are none left
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(evicted . cold branches)
+        - Best case: O(1)
+        """
+
+        while self._over_budget() and len(self.my_cold_branches) > 0:
+            temp_coldest = None
+            for temp_branch in self.my_cold_branches:
+                if temp_coldest is None or temp_branch.last_used < temp_coldest.last_used:
+                    temp_coldest = temp_branch
+            self._drop_branch(temp_coldest)
+
+
+    def _over_budget(self) -> bool:
+
+        """
+        Returns whether the history is over its budget; with a journal, the nodes of the active branch are not counted
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - bool
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        temp_count = self.my_node_count
+        if self.my_journal is not None:
+            temp_count -= self._line_length()
+        return self.my_bytes > self.my_max_bytes or temp_count > self.my_max_actions
+
+
+    def _append_line(self, node: HistoryNode) -> None:
+
+        """
+        Adds a node at the end of the active branch
+        - Without a journal, the oldest node is evicted if the active branch is full;
+          with one, it is spilled instead (see _spill)
+
+        Args:
+        - self
+        - node of HistoryNode class, a child of the last node of the active branch
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function), from _evicted
+        - Best case: O(1)
+        """
+
+        if self.my_journal is not None and self.my_history.is_full():
+            self._spill()
+        temp_evicted = self.my_history.append(node)
+        if temp_evicted is not None:
+            self._evicted(temp_evicted)
+
+
+    def _spill(self) -> None:
+
+        """
+        Moves the oldest node of my_history to my_spilled, where it is only kept as its journal id
+        - It is unlinked from the node before it, so the nodes of my_spilled are not held in memory by each other:
+          a node of my_spilled only lives on while something else uses it (a branch hanging off it, the hot window,
+          or the next node while it is the last one spilled), and _line_node makes a new one when it is needed again
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(children)
+        - Best case: O(1)
+        """
+
+        temp_node = self.my_history.serve()
+        if temp_node.parent is not None:
+            temp_node.parent.children.remove(temp_node)
+            temp_node.parent = None
+        self.my_spilled.append(temp_node.record)
+        self.my_spilled_nodes[temp_node.record] = temp_node
+
+
+    def _line_length(self) -> int:
+
+        """
+        Returns the number of nodes of the active branch (the root excluded)
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - int
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        return len(self.my_spilled) + len(self.my_history)
+
+
+    def _evicted(self, node: HistoryNode) -> None:
+
+        """
+        Book-keeping for a node evicted from the bottom of the active branch
+        - It becomes the new root; the other branches starting at the old root can not be reached anymore and are dropped
+
+        Args:
+        - self
+        - node: the evicted node of HistoryNode class
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(nodes of the dropped branches)
+        - Best case: O(1)
+        """
+
+        for temp_child in self.my_root.children[:]:
+            if temp_child is not node:
+                self._drop_branch(temp_child)
+        self.my_bytes -= self._resident_bytes(node)
+        self.my_node_count -= 1
+        node.action = None
+        node.owner = None
+        node.parent = None
+        self.my_root = node
+        if self.my_journal is not None:
+            self.my_journal.record_root(node.record)
+        self.my_position = max(0, self.my_position - 1)
+        self.my_base += 1
+        while len(self.my_checkpoints) > 0 and self.my_checkpoints[0].key < self.my_base:
+            self._delete_checkpoint(0)
+
+
+    def _resident_bytes(self, node: HistoryNode) -> int:
+
+        """
+        Returns the estimated bytes of the action of a node that are held in memory (0 if it is only in the journal)
+
+        Args:
+        - self
+        - node of HistoryNode class
+
+        Raises:
+        - None
+
+        Returns:
+        - int
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        if node.my_action is None:
+            return 0
+        return node.my_action.estimated_bytes()
+
+
+    def _write_node(self, node: HistoryNode) -> None:
+
+        """
+        Writes the (final) action of a node to the journal, if there is one; from then on it can leave memory
+
+        Args:
+        - self
+        - node of HistoryNode class
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(node.action.step_count())
+        - Best case: O(1), without a journal
+        """
+
+        if self.my_journal is None:
+            return
+        node.record = self.my_journal.append_action(node.my_action, node.parent.record)
+        node.owner = self
+        self._make_hot(node)
+
+
+    def _make_hot(self, node: HistoryNode) -> None:
+
+        """
+        Marks the action of a node as just used, so it stays in memory; the action used the longest ago leaves memory
+        if there are more than HOT_WINDOW
+
+        Args:
+        - self
+        - node of HistoryNode class
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        temp_cold = self.my_hot_nodes.append(node)
+        if temp_cold is not None and temp_cold.owner is self and temp_cold.my_action is not None:
+            self.my_bytes -= temp_cold.my_action.estimated_bytes()
+            temp_cold.my_action = None
+
+
+    def _load(self, node: HistoryNode) -> None:
+
+        """
+        Reads the action of a node back from the journal
+
+        Args:
+        - self
+        - node of HistoryNode class, written to the journal
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function), from read_action of the journal
+        - Best case: O(other_function)
+        """
+
+        node.my_action = self.my_journal.read_action(node.record)
+        self.my_bytes += node.my_action.estimated_bytes()
+        self._make_hot(node)
+
+
+    def _record_position(self) -> None:
+
+        """
+        Records the current position in the journal, if there is one, so recover finds the grid where it was left
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        if self.my_journal is not None:
+            self.my_journal.record_position(self._line_node(self.my_position).record)
+
+
+    def recover(self, grid: Grid) -> bool:
+
+        """
+        Rebuilds the history from the journal (e.g. after a crash), and brings the grid to the state it was left in
+        - Every branch still in the journal is rebuilt, with the actions left on disk until they are needed;
+          of the active branch, only the newest HOT_WINDOW nodes are made (see _spill)
+        - The grid is expected to be empty; the actions leading to the recovered position are redone on it
+
+        Args:
+        - self
+        - grid of Grid class
+
+        Raises:
+        - None
+
+        Returns:
+        - boolean value True if a history was recovered, False if there is no journal or it is empty
+
+        Complexity:
+        - Worst case: O(journal actions + steps of the actions leading to the recovered position)
+        - Best case: O(1), when there is nothing to recover
+        """
+
+        temp_journal = self.my_journal
+        if temp_journal is None or len(temp_journal) == 0:
+            return False
+
+        temp_count = len(temp_journal)
+        temp_root_id = temp_journal.recovered_root - 1
+        temp_current_id = temp_journal.recovered_position - 1
+        temp_dropped = set(temp_journal.recovered_drops)
+
+        # ids only ever follow their parents, so one pass in id order finds every live node, its depth,
+        # and the newest live child of each node (by parent id + 1)
+        temp_depths = array("I", bytes(4 * temp_count))
+        temp_live = bytearray(temp_count)
+        temp_newest_child = array("i", [-1]) * (temp_count + 1)
+        for action_id in range(temp_count):
+            temp_parent_id = temp_journal.parent_of(action_id)
+            temp_depths[action_id] = 1 if temp_parent_id == -1 else temp_depths[temp_parent_id] + 1
+            temp_parent_live = temp_parent_id == temp_root_id or (temp_parent_id != -1 and temp_live[temp_parent_id])
+            if temp_parent_live and action_id not in temp_dropped:
+                temp_live[action_id] = 1
+                temp_newest_child[temp_parent_id + 1] = action_id
+
+        # redo everything leading to the recovered position, from the very first action
+        temp_path = array("i")
+        temp_id = temp_current_id
+        while temp_id != -1:
+            temp_path.append(temp_id)
+            temp_id = temp_journal.parent_of(temp_id)
+        temp_path.reverse()
+        grid.restore(None)
+        temp_root_snapshot = None
+        for action_id in temp_path:
+            temp_journal.read_action(action_id).redo_apply(grid)
+            if action_id == temp_root_id:
+                temp_root_snapshot = grid.snapshot()
+
+        self.my_journal = None
+        self.clear_undo()
+        self.my_journal = temp_journal
+
+        self.my_base = 0 if temp_root_id == -1 else temp_depths[temp_root_id]
+        self.my_root.depth = self.my_base
+        self.my_root.record = temp_root_id
+        self.my_checkpoints.clear()
+        self.my_checkpoints.add(ListItem(temp_root_snapshot, self.my_base))
+        self.my_bytes += Grid.snapshot_bytes(temp_root_snapshot)
+
+        # the active branch goes through the recovered position, then follows the newest children
+        temp_on_line = bytearray(temp_count)
+        temp_position = 0 if temp_current_id == temp_root_id else temp_depths[temp_current_id] - self.my_base
+        for action_id in temp_path[len(temp_path) - temp_position:]:
+            temp_on_line[action_id] = 1
+            self._recover_line_node(action_id, temp_depths[action_id])
+        self.my_position = temp_position
+        temp_id = temp_current_id
+        while temp_newest_child[temp_id + 1] != -1:
+            temp_id = temp_newest_child[temp_id + 1]
+            temp_on_line[temp_id] = 1
+            self._recover_line_node(temp_id, temp_depths[temp_id])
+
+        # every other live node is on a cold branch, hanging off the active branch or another cold node
+        temp_nodes = {}
+        for action_id in range(temp_count):
+            if temp_live[action_id] and not temp_on_line[action_id]:
+                temp_parent_id = temp_journal.parent_of(action_id)
+                temp_parent = temp_nodes.get(temp_parent_id)
+                temp_is_head = temp_parent is None
+                if temp_is_head:
+                    temp_parent = self._line_node(0 if temp_parent_id == temp_root_id else temp_depths[temp_parent_id] - self.my_base)
+                temp_nodes[action_id] = self._recover_node(action_id, temp_parent, temp_depths[action_id])
+                if temp_is_head:
+                    self.my_cold_branches[temp_nodes[action_id]] = None
+        self.my_tick = temp_count
+        return True
+
+
+    def _recover_node(self, action_id: int, parent: HistoryNode, depth: int) -> HistoryNode:
+
+        """
+        Makes the node of an action of the journal, with its action left on disk, as a child of parent (used by recover)
+
+        Args:
+        - self
+        - action_id: id of the action in the journal
+        - parent of HistoryNode class
+        - depth: absolute history index of the state the node stands for
+
+        Raises:
+        - None
+
+        Returns:
+        - HistoryNode
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        temp_node = HistoryNode(None, parent, depth)
+        temp_node.record = action_id
+        temp_node.owner = self
+        temp_node.last_used = action_id
+        parent.children.append(temp_node)
+        self.my_node_count += 1
+        return temp_node
+
+
+    def _recover_line_node(self, action_id: int, depth: int) -> None:
+
+        """
+        Adds the node of an action of the journal at the end of the active branch (used by recover)
+
+        Args:
+        - self
+        - action_id: id of the action in the journal
+        - depth: absolute history index of the state the node stands for
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function), from _append_line
+        - Best case: O(1)
+        """
+
+        self._append_line(self._recover_node(action_id, self._line_node(self._line_length()), depth))
+
+
+    def _line_node(self, position: int) -> HistoryNode:
+
+        """
+        Returns the node of the active branch for the state at the given position: the root for 0,
+        otherwise the node of the action just before it
+        - A spilled node that is not in use anymore is made again, with its action left on disk and only
+          the branches hanging off it as children
+
+        Args:
+        - self
+        - position: history position, between 0 and _line_length
+
+        Raises:
+        - None
+
+        Returns:
+        - HistoryNode
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        if position == 0:
+            return self.my_root
+        temp_spilled = len(self.my_spilled)
+        if position > temp_spilled:
+            return self.my_history[position - 1 - temp_spilled]
+
+        temp_record = self.my_spilled[position - 1]
+        temp_node = self.my_spilled_nodes.get(temp_record)
+        if temp_node is None:
+            temp_node = HistoryNode(None, None, self.my_base + position)
+            temp_node.record = temp_record
+            temp_node.owner = self
+            self.my_spilled_nodes[temp_record] = temp_node
+        return temp_node
+
+
+    def _action_at(self, position: int) -> PaintAction:
+
+        """
+        Returns the action of the active branch that leads from position to position + 1
+
+        Args:
+        - self
+        - position: history position, between 0 and _line_length - 1
+
+        Raises:
+        - None
+
+        Returns:
+        - PaintAction
+
+        Complexity:
+        - Worst case: O(other_function), from read_action of the journal
+        - Best case: O(1)
+        """
+
+        return self._line_node(position + 1).action
+
+
+    def _is_on_line(self, node: HistoryNode) -> bool:
+
+        """
+        Returns whether the node is on the active branch
+
+        Args:
+        - self
+        - node of HistoryNode class
+
+        Raises:
+        - None
+
+        Returns:
+        - bool
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        temp_position = node.depth - self.my_base
+        if 0 < temp_position <= len(self.my_spilled):
+            return node.record != -1 and self.my_spilled[temp_position - 1] == node.record
+        return 0 <= temp_position <= self._line_length() and self._line_node(temp_position) is node
+
+
+    def _detach_redo_branch(self) -> None:
+
+        """
+        Turns the actions after the current position into a cold branch, so the active branch ends at the current position
+        - The cold branches hanging off those actions now hang off the new cold branch instead, so they are not tracked anymore
+        - Spilled nodes of those actions are made again and linked up, as cold branches are walked through their nodes;
+          with a journal, actions that could never fit in the budget of the cold branches are dropped right away instead
+        - Checkpoints after the current position only hold for the detached actions, so they are dropped
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(redo_count . children)
+        - Best case: O(1), when there is nothing to redo
+        """
+
+        if self.redo_count() == 0:
+            return
+
+        temp_spilled = len(self.my_spilled)
+        if self.my_journal is not None and self.redo_count() > self.my_max_actions:
+            self._drop_redo_actions()
+        else:
+            self.my_tick += 1
+            temp_previous = self._line_node(self.my_position)
+            for position in range(self.my_position + 1, self._line_length() + 1):
+                temp_node = self._line_node(position)
+                for temp_child in temp_node.children:
+                    self.my_cold_branches.pop(temp_child, None)
+                if position <= temp_spilled:
+                    temp_node.parent = temp_previous
+                    temp_previous.children.append(temp_node)
+                    # a node made again lost when it was last used, but it was on the active branch until now
+                    temp_node.last_used = self.my_tick
+                temp_previous = temp_node
+            temp_branch = self._line_node(self.my_position + 1)
+            temp_branch.last_used = self.my_tick
+            self.my_cold_branches[temp_branch] = None
+
+        if self.my_position >= temp_spilled:
+            self.my_history.truncate(self.my_position - temp_spilled)
+        else:
+            self.my_history.clear()
+            del self.my_spilled[self.my_position:]
+        self._drop_checkpoints_after(self.my_base + self.my_position)
+
+
+    def _drop_redo_actions(self) -> None:
+
+        """
+        Drops the actions after the current position, with the branches hanging off them, without making their nodes
+        - Only used with a journal; the active branch is truncated by the caller
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(redo_count + nodes of the dropped branches)
+        - Best case: O(redo_count)
+        """
+
+        temp_spilled = len(self.my_spilled)
+        if self.my_position < temp_spilled:
+            temp_first = self.my_spilled_nodes.get(self.my_spilled[self.my_position])
+            self.my_journal.record_drop(self.my_spilled[self.my_position])
+        else:
+            temp_first = self.my_history[self.my_position - temp_spilled]
+            self.my_journal.record_drop(temp_first.record)
+        # unlinked first, so the dropped actions can not be found as a branch of the current node anymore
+        if temp_first is not None and temp_first.parent is not None:
+            temp_first.parent.children.remove(temp_first)
+            temp_first.parent = None
+        for position in range(self.my_position + 1, self._line_length() + 1):
+            if position <= temp_spilled:
+                # only the spilled nodes still in use can have branches or an action in memory
+                temp_node = self.my_spilled_nodes.get(self.my_spilled[position - 1])
+            else:
+                temp_node = self.my_history[position - 1 - temp_spilled]
+            self.my_node_count -= 1
+            if temp_node is None:
+                continue
+            for temp_child in temp_node.children[:]:
+                if temp_child in self.my_cold_branches:
+                    self._drop_branch(temp_child)
+            self.my_bytes -= self._resident_bytes(temp_node)
+            temp_node.owner = None
+
+
+    def _drop_branch(self, node: HistoryNode) -> None:
+
+        """
+        Drops a node that is not on the active branch, with everything that continues from it
+
+        Args:
+        - self
+        - node of HistoryNode class
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(nodes of the branch)
+        - Best case: O(1)
+        """
+
+        self.my_cold_branches.pop(node, None)
+        node.parent.children.remove(node)
+        node.parent = None
+        if self.my_journal is not None:
+            self.my_journal.record_drop(node.record)
+
+        temp_stack = [node]
+        while len(temp_stack) > 0:
+            temp_node = temp_stack.pop()
+            self.my_bytes -= self._resident_bytes(temp_node)
+            temp_node.owner = None
+            self.my_node_count -= 1
+            temp_stack.extend(temp_node.children)
+
+
+    def redo_branches(self) -> list[HistoryNode]:
+
+        """
+        Returns the nodes the history can continue with from the current position, the oldest branch first;
+        one of them is the next action redo would apply, the others start alternative branches
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - list of HistoryNode
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        temp_branches = self._line_node(self.my_position).children[:]
+        if self.my_position < len(self.my_spilled):
+            # spilled nodes are not linked to the next node of the active branch
+            temp_branches.append(self._line_node(self.my_position + 1))
+        if self.my_journal is not None:
+            temp_branches.sort(key=lambda branch: branch.record)
+        return temp_branches
+
+
+    def switch_branch(self, grid: Grid) -> list[tuple[PaintAction, bool]]:
+
+        """
+        Redoes into the next branch at the current position, after the one redo would currently follow (cycling around)
+        - Branches checkout can not reach anymore are skipped
+
+        Args:
+        - self
+        - grid of Grid class
+
+        Raises:
+        - None
+
+        Returns:
+        - The (action, is_undo) entries of the change, as in checkout; empty if there is no branch to switch to
+
+        Complexity:
+        - Worst case: O(other_function), from checkout
+        - Best case: O(1), when there is no branch
+        """
+
+        temp_current = self._line_node(self.my_position + 1) if self.redo_count() > 0 else None
+        temp_branches = [branch for branch in self.redo_branches() if branch is temp_current or self._fork_of(branch) is not None]
+        if len(temp_branches) == 0:
+            return []
+        temp_next_index = 0
+        if temp_current is not None:
+            temp_next_index = (temp_branches.index(temp_current) + 1) % len(temp_branches)
+        return self.checkout(grid, temp_branches[temp_next_index])
+
+
+    def _fork_of(self, node: HistoryNode) -> HistoryNode|None:
+
+        """
+        Returns the nearest ancestor of node (node included) that is on the active branch
+
+        Args:
+        - self
+        - node of HistoryNode class
+
+        Raises:
+        - None
+
+        Returns:
+        - HistoryNode, None if node is not connected to the active branch anymore (it was evicted)
+
+        Complexity:
+        - Worst case: O(path length)
+        - Best case: O(1)
+        """
+
+        temp_fork = node
+        while temp_fork is not None and not self._is_on_line(temp_fork):
+            temp_fork = temp_fork.parent
+        return temp_fork
+
+
+    def checkout(self, grid: Grid, node: HistoryNode) -> list[tuple[PaintAction, bool]]:
+
+        """
+        Makes the branch leading to node the active one, and moves the grid to exactly the state node stands for
+        - Only the path from the current node to the common ancestor and from there down to node is walked:
+          the nearest checkpoint before the common ancestor is restored (only for the squares painted on the path,
+          when no special is on it) and the actions down to node are redone
+        - Without a checkpoint before the common ancestor (it was evicted), it falls back to undoing / redoing one action
+          at a time to the common ancestor, then redoing the path down to node, as seek does
+        - Past node, the active branch follows the most recently used children, so redo continues where that branch left off
+
+        Args:
+        - self
+        - grid of Grid class
+        - node of HistoryNode class, from redo_branches or earlier histories; must still be in the tree
+
+        Raises:
+        - ValueError if the node was evicted from the history
+
+        Returns:
+        - The (action, is_undo) entries that take a grid from its previous state to the new one, as in seek
+
+        Complexity:
+        - Worst case: O(path length . children + other_function), other_function from _rebuild
+        - Best case: O(path length . children + len(squares) . other_function)
+        """
+
+        self.end_action(grid)
+        if self._is_on_line(node):
+            return self.seek(grid, node.depth - self.my_base)
+
+        temp_fork = self._fork_of(node)
+        if temp_fork is None:
+            raise ValueError("Node is not in the history anymore")
+        temp_path = []
+        temp_node = node
+        while temp_node is not temp_fork:
+            temp_path.append(temp_node)
+            temp_node = temp_node.parent
+        temp_path.reverse()
+        temp_fork_position = temp_fork.depth - self.my_base
+
+        if self._checkpoint_before(temp_fork_position) is None:
+            temp_entries = []
+            while self.my_position > temp_fork_position:
+                temp_entries.append((self.undo(grid), True))
+            while self.my_position < temp_fork_position:
+                temp_entries.append((self.redo(grid), False))
+            self._relink(temp_path)
+            for _ in temp_path:
+                temp_entries.append((self.redo(grid), False))
+            return temp_entries
+
+        temp_low, temp_high = min(temp_fork_position, self.my_position), max(temp_fork_position, self.my_position)
+        temp_only_squares = self.my_exact and not self._has_special(temp_low, temp_high)
+        for temp_node in temp_path:
+            temp_only_squares = temp_only_squares and not self._is_special(temp_node)
+
+        if temp_only_squares:
+            temp_squares = self._touched_squares(temp_low, temp_high)
+            temp_seen = set(temp_squares)
+            for temp_node in temp_path:
+                temp_packed = temp_node.action.packed_steps
+                for step_index in range(0, len(temp_packed), 3):
+                    temp_square = (temp_packed[step_index], temp_packed[step_index + 1])
+                    if temp_square not in temp_seen:
+                        temp_seen.add(temp_square)
+                        temp_squares.append(temp_square)
+            temp_before = [grid[x][y].snapshot() for x, y in temp_squares]
+        else:
+            temp_squares, temp_before = self._grid_states(grid)
+
+        self.my_position = temp_fork_position
+        self._relink(temp_path)
+        return self._rebuild(grid, node.depth - self.my_base, temp_squares, temp_before, temp_only_squares)
+
+
+    def _relink(self, path: list[HistoryNode]) -> None:
+
+        """
+        Makes the active branch go through the given path, which starts with a child of the node at the current position;
+        past its end, the active branch follows the most recently used children
+        - Only the history is changed, not the grid nor the current position
+
+        Args:
+        - self
+        - path: list of HistoryNode, each the parent of the next
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(redo_count . children + new branch length . children)
+        - Best case: O(len(path))
+        """
+
+        self._detach_redo_branch()
+        self.my_cold_branches.pop(path[0], None)
+        temp_next = path[0]
+        temp_path_index = 0
+        while temp_next is not None:
+            self.my_tick += 1
+            temp_next.last_used = self.my_tick
+            self._append_line(temp_next)
+            temp_path_index += 1
+            temp_follow = path[temp_path_index] if temp_path_index < len(path) else None
+            if temp_follow is None:
+                for temp_child in temp_next.children:
+                    if temp_follow is None or temp_child.last_used > temp_follow.last_used:
+                        temp_follow = temp_child
+            for temp_child in temp_next.children:
+                if temp_child is not temp_follow:
+                    self.my_cold_branches[temp_child] = None
+            temp_next = temp_follow
+
+
+    def _count_changed_squares(self, action: PaintAction, grid: Grid) -> None:
+
+        """
+        Adds the squares changed by an action to the count since the last checkpoint; a special changes every square
+
+        Args:
+        - self
+        - action of PaintAction class
+        - grid of Grid class, optional
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        if action.is_special:
+            if grid is not None:
+                self.my_squares_since_checkpoint += grid.square_count()
+        else:
+            self.my_squares_since_checkpoint += action.step_count()
+
+
+    def _maybe_checkpoint(self, grid: Grid) -> None:
+
+        """
+        Takes a checkpoint of the grid at the current position if one is due
+        - Only when the grid is exactly in its historical state for this position, and no action is open
+
+        Args:
+        - self
+        - grid of Grid class, or None to skip checkpointing
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(other_function), where other_function is the complexity of snapshot of the grid
+        - Best case: O(1)
+        """
+
+        if grid is None or not self.my_exact or self.my_action_open:
+            return
+
+        temp_index = self.my_base + self.my_position
+        if len(self.my_checkpoints) > 0:
+            temp_last = self.my_checkpoints[len(self.my_checkpoints) - 1].key
+            if temp_last >= temp_index:
+                return
+            if temp_index - temp_last < self.my_checkpoint_interval and self.my_squares_since_checkpoint < self.my_checkpoint_squares:
+                return
+
+        temp_snapshot = grid.snapshot()
+        self.my_checkpoints.add(ListItem(temp_snapshot, temp_index))
+        self.my_bytes += Grid.snapshot_bytes(temp_snapshot)
+        self.my_squares_since_checkpoint = 0
+        self._thin_checkpoints()
+
+
+    def _thin_checkpoints(self) -> None:
 
-    def __init__(self) -> None:
         """
-        defining the magic method : __init__ 
-        - This initialises an object of the Undotracker class; 
-        - The data structure used is ArrayStack
-        - Two stacks are declared to keep track of the actions to be undone/redone
+        Drops every other checkpoint, and doubles the checkpoint interval, until there are at most MAX_CHECKPOINTS of them
+        and the history fits in its byte budget
+        - So the checkpoints stay spread evenly over the whole history, the oldest one (which decides how far back seek can
+          go) always kept, and seek never replays more than about twice the interval
 
         Args:
         - self
-        
+
         Raises:
         - None
 
@@ -24,21 +1475,28 @@ class UndoTracker:
         - None
 
         Complexity:
-        - Worst case: O(other_function) where other_function is complexity of initialising the ArrayStack
-        - Best case: O(other_function) 
+        - Worst case: O(thinnings . MAX_CHECKPOINTS ^ 2), from delete_at_index
+        - Best case: O(1), when nothing has to be dropped
         """
 
-        self.my_undo_stack = ArrayStack(self.MAX_CAPACITY)
-        self.my_redo_stack = ArrayStack(self.MAX_CAPACITY)
+        while len(self.my_checkpoints) > self.MAX_CHECKPOINTS or (self.my_bytes > self.my_max_bytes and len(self.my_checkpoints) > 1):
+            self.my_checkpoint_interval *= 2
+            self.my_checkpoint_squares *= 2
+            temp_index = 1
+            while temp_index < len(self.my_checkpoints):
+                self._delete_checkpoint(temp_index)
+                temp_index += 1
 
-    def clear_undo(self) -> None:
+
+    def _delete_checkpoint(self, index: int) -> None:
 
         """
-        Completely empties the undo and redo stacks
+        Deletes the checkpoint at the given index of my_checkpoints, and takes its snapshot out of my_bytes
 
         Args:
         - self
-        
+        - index: index in my_checkpoints
+
         Raises:
         - None
 
@@ -46,25 +1504,23 @@ class UndoTracker:
         - None
 
         Complexity:
-        - Worst case: O(other_function)
-        - Best case: O(other_function) 
+        - Worst case: O(x . y + len(self.my_checkpoints)), from snapshot_bytes and delete_at_index
+        - Best case: O(len(self.my_checkpoints))
         """
 
-        self.my_undo_stack.clear()
-        self.my_redo_stack.clear()
-        
+        self.my_bytes -= Grid.snapshot_bytes(self.my_checkpoints[index].value)
+        self.my_checkpoints.delete_at_index(index)
+
 
-    def add_action(self, action: PaintAction) -> None:
+    def _drop_checkpoints_after(self, index: int) -> None:
 
         """
-        - Adds/pushes the input action into the undo stack and 
-        - Clears the redo stack since adding a new action moves the UndoTracker into a different branch, 
-           thus the actions in the redo stack become irrelevant
-        
+        Drops the checkpoints with an absolute history index above index, as those states can not be reached anymore
+
         Args:
         - self
-        - action of PaintAction class
-        
+        - index: absolute history index
+
         Raises:
         - None
 
@@ -72,86 +1528,581 @@ class UndoTracker:
         - None
 
         Complexity:
-        - Worst case: O(other_function)
-        - Best case: O(other_function) 
+        - Worst case: O(len(self.my_checkpoints))
+        - Best case: O(1)
         """
-        
-        if not self.my_undo_stack.is_full():
-            self.my_undo_stack.push(action)
-            self.my_redo_stack.clear()
 
+        while len(self.my_checkpoints) > 0 and self.my_checkpoints[len(self.my_checkpoints) - 1].key > index:
+            self._delete_checkpoint(len(self.my_checkpoints) - 1)
 
 
     def undo(self, grid: Grid) -> PaintAction|None:
 
         """
-        - Pops the top most action from the undo stack and the undone action is applied on the grid
-        - Adds the action that was popped, into the redo stack
+        - Moves the current position one action back in the history and the undone action is applied on the grid
+        - The action stays in the history, so it can be redone
 
         Args:
         - self
         - grid of Grid class
-        
+
         Raises:
         - None
 
         Returns:
-        - The top most action of the undo stack
-        - None if the undo stack is empty or if the redo stack is full
+        - The action that was undone
+        - None if there is nothing to undo
 
         Complexity:
         - Worst case: O(other_function)
-        - Best case: O(other_function) 
+        - Best case: O(other_function)
         """
 
-        if self.my_undo_stack.is_empty():
+        self.end_action(grid)
+        if self.undo_count() == 0:
             return None
 
-        if not self.my_redo_stack.is_full():
-            temp_action = self.my_undo_stack.pop()
-            self.my_redo_stack.push(temp_action)
-        
-            temp_action.undo_apply(grid)
-                    
-            return temp_action
+        self.my_position -= 1
+        temp_action = self._action_at(self.my_position)
+        temp_action.undo_apply(grid)
+        # erase does not always restore what was there before (e.g. in a SetLayerStore)
+        self.my_exact = False
+        self._record_position()
 
-        return None
+        return temp_action
 
 
     def redo(self, grid: Grid) -> PaintAction|None:
 
         """
-        - Pops the top most action from the redo stack and the redone action is applied on the grid
-        - Adds the action that was popped, into the undo stack
-        
+        - Moves the current position one action forward in the history and the redone action is applied on the grid
+
         Args:
         - self
         - grid of Grid class
-        
+
         Raises:
         - None
 
         Returns:
-        - The top most action of the redo stack
-        - None if the redo stack is empty or if the undo stack is full
+        - The action that was redone
+        - None if there is nothing to redo
 
         Complexity:
         - Worst case: O(other_function)
-        - Best case: O(other_function) 
+        - Best case: O(other_function)
         """
 
-        if self.my_redo_stack.is_empty():
+        self.end_action(grid)
+        if self.redo_count() == 0:
             return None
 
-        if not self.my_undo_stack.is_full():
-            temp_action = self.my_redo_stack.pop()
-            self.my_undo_stack.push(temp_action)
-        
-            temp_action.redo_apply(grid)
-        
-            return temp_action
+        temp_action = self._action_at(self.my_position)
+        self.my_position += 1
+        temp_action.redo_apply(grid)
+        self._count_changed_squares(temp_action, grid)
+        self._maybe_checkpoint(grid)
+        self._record_position()
+
+        return temp_action
+
+
+    def undo_many(self, grid: Grid, count: int) -> list[PaintAction]:
+
+        """
+        - Undoes up to count actions at once, leaving the grid exactly as count calls of undo would
+        - The actions are folded into one change per square first (see _apply_folded), so specials that cancel out are
+          never applied and each square is only visited once
+
+        Args:
+        - self
+        - grid of Grid class
+        - count: number of actions to undo
+
+        Raises:
+        - None
+
+        Returns:
+        - The actions that were undone, newest first (the order undo would have returned them in)
+
+        Complexity:
+        - Worst case: O(total steps + x . y . other_function), the grid being walked once if an uncancelled special is undone
+        - Best case: O(1), when there is nothing to undo
+        """
+
+        self.end_action(grid)
+        count = min(count, self.undo_count())
+        temp_actions = [self._action_at(self.my_position - 1 - offset) for offset in range(count)]
+        self._apply_folded(grid, temp_actions, True)
+        self.my_position -= count
+        if count > 0:
+            self.my_exact = False
+        self._record_position()
+
+        return temp_actions
+
+
+    def redo_many(self, grid: Grid, count: int) -> list[PaintAction]:
+
+        """
+        - Redoes up to count actions at once, leaving the grid exactly as count calls of redo would
+        - The actions are folded into one change per square first (see _apply_folded)
+
+        Args:
+        - self
+        - grid of Grid class
+        - count: number of actions to redo
+
+        Raises:
+        - None
+
+        Returns:
+        - The actions that were redone, oldest first (the order redo would have returned them in)
+
+        Complexity:
+        - Worst case: O(total steps + x . y . other_function), the grid being walked once if an uncancelled special is redone
+        - Best case: O(1), when there is nothing to redo
+        """
+
+        self.end_action(grid)
+        count = min(count, self.redo_count())
+        temp_actions = [self._action_at(self.my_position + offset) for offset in range(count)]
+        self._apply_folded(grid, temp_actions, False)
+        self.my_position += count
+        for temp_action in temp_actions:
+            self._count_changed_squares(temp_action, grid)
+        self._maybe_checkpoint(grid)
+        self._record_position()
+
+        return temp_actions
+
+
+    def _apply_folded(self, grid: Grid, actions: list[PaintAction], is_undo: bool) -> None:
+
+        """
+        Applies a sequence of actions (undone or redone, in the given order) as one net change per square
+        - A special is applied to every square, so it only has to reach a square before the next step on it, and at the end;
+          the specials are counted instead, and each square catches up on them when it is next painted
+        - Where the LayerStore allows it, pending specials cancel in pairs (SPECIAL_IS_INVOLUTION),
+          and a repeated step with no special in between is dropped (ADD_IS_IDEMPOTENT / ERASE_IS_IDEMPOTENT)
+        - Squares never painted only get the specials left over, in one pass over the grid, and only if any are left
+
+        Args:
+        - self
+        - grid of Grid class
+        - actions: list of PaintAction, in the order they would be applied
+        - is_undo: whether to erase (undo) or add (redo) the steps
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(total steps . other_function + x . y . other_function), other_function from the LayerStore
+        - Best case: O(total steps . other_function), when the specials cancel out
+        """
+
+        temp_store_type = type(grid[0][0])
+        temp_is_involution = temp_store_type.SPECIAL_IS_INVOLUTION
+        temp_is_idempotent = temp_store_type.ERASE_IS_IDEMPOTENT if is_undo else temp_store_type.ADD_IS_IDEMPOTENT
+
+        # square -> list of (specials applied before the step, layer index)
+        temp_square_steps = {}
+        temp_specials = 0
+        for temp_action in actions:
+            if temp_action.is_special:
+                temp_specials += 1
+                continue
+            temp_packed = temp_action.packed_steps
+            for step_index in range(0, len(temp_packed), 3):
+                temp_square = (temp_packed[step_index], temp_packed[step_index + 1])
+                temp_steps = temp_square_steps.get(temp_square)
+                if temp_steps is None:
+                    temp_square_steps[temp_square] = [(temp_specials, temp_packed[step_index + 2])]
+                elif not (temp_is_idempotent and temp_steps[-1] == (temp_specials, temp_packed[step_index + 2])):
+                    temp_steps.append((temp_specials, temp_packed[step_index + 2]))
+
+        temp_layers = get_layers()
+        for (x, y), temp_steps in temp_square_steps.items():
+            temp_store = grid[x][y]
+            temp_applied = 0
+            for temp_specials_before, layer_index in temp_steps:
+                self._apply_specials(temp_store, temp_specials_before - temp_applied, temp_is_involution)
+                temp_applied = temp_specials_before
+                if is_undo:
+                    temp_store.erase(temp_layers[layer_index])
+                else:
+                    temp_store.add(temp_layers[layer_index])
+            self._apply_specials(temp_store, temp_specials - temp_applied, temp_is_involution)
+
+        temp_left_over = temp_specials % 2 if temp_is_involution else temp_specials
+        if temp_left_over == 0:
+            return
+        for row_index in range(len(grid.store_array)):
+            for col_index in range(len(grid[row_index])):
+                if (row_index, col_index) not in temp_square_steps:
+                    self._apply_specials(grid[row_index][col_index], temp_left_over, False)
+
+
+    @staticmethod
+    def _apply_specials(store, count: int, is_involution: bool) -> None:
+
+        """
+        Applies special count times to a LayerStore, only once or not at all if special is an involution
+
+        Args:
+        - store of LayerStore class
+        - count: number of specials
+        - is_involution: whether two specials in a row cancel out
+
+        Raises:
+        - None
+
+        Returns:
+        - None
+
+        Complexity:
+        - Worst case: O(count . other_function), where other_function is the complexity of special of the LayerStore
+        - Best case: O(1), when count is 0
+        """
+
+        if is_involution:
+            count %= 2
+        for _ in range(count):
+            store.special()
+
+
+    def seek_start(self) -> int:
+
+        """
+        Returns the lowest position seek can reach: the oldest checkpoint still in the history
+
+        Args:
+        - self
+
+        Raises:
+        - None
+
+        Returns:
+        - position of the oldest checkpoint, or 0 if there are none
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        if len(self.my_checkpoints) == 0:
+            return 0
+        return self.my_checkpoints[0].key - self.my_base
+
+
+    def seek(self, grid: Grid, index: int) -> list[tuple[PaintAction, bool]]:
+
+        """
+        Moves the grid to exactly the state it had when the history was at position index (clamped to [seek_start, len])
+        - From an exact state with no special in between, only the squares touched by the actions in between can differ,
+          so only those squares are restored from the nearest checkpoint and brought forward; consecutive seeks while
+          scrubbing stay proportional to the distance moved, not to the size of the grid
+        - Otherwise the nearest checkpoint at or before index is restored and only the actions after it are redone;
+          this is exact even where undo is not (e.g. erasing in a SetLayerStore does not bring back the layer below)
+        - Without any checkpoint, it falls back to undoing / redoing one action at a time
+
+        Args:
+        - self
+        - grid of Grid class
+        - index: the history position to move to, between 0 and undo_count + redo_count
+
+        Raises:
+        - None
+
+        Returns:
+        - The (action, is_undo) entries that take a grid from its previous state to the new one when played in order,
+          for the ReplayTracker; steps cancelling out between the two positions are left out
+
+        Complexity:
+        - Worst case: O(other_function + my_checkpoint_interval . action steps), other_function from snapshot and restore of the grid
+        - Best case: O(1), when already at index
+        """
+
+        self.end_action(grid)
+        index = max(self.seek_start(), min(index, self._line_length()))
+        if index == self.my_position and self.my_exact:
+            return []
+
+        temp_low, temp_high = min(index, self.my_position), max(index, self.my_position)
+        if self.my_exact and not self._has_special(temp_low, temp_high):
+            if index == self.my_position + 1:
+                return [(self.redo(grid), False)]
+            temp_squares = self._touched_squares(temp_low, temp_high)
+            temp_before = [grid[x][y].snapshot() for x, y in temp_squares]
+            if index < self.my_position:
+                return self._rebuild(grid, index, temp_squares, temp_before, True)
+            while self.my_position < index:
+                self.redo(grid)
+            return self._diff_entries(grid, temp_squares, temp_before, [grid[x][y].snapshot() for x, y in temp_squares])
+
+        temp_entries = []
+        if self.my_exact and index > self.my_position:
+            while self.my_position < index:
+                temp_entries.append((self.redo(grid), False))
+            return temp_entries
+
+        if self._checkpoint_before(index) is None:
+            while self.my_position > index:
+                temp_entries.append((self.undo(grid), True))
+            while self.my_position < index:
+                temp_entries.append((self.redo(grid), False))
+            return temp_entries
+
+        temp_squares, temp_before = self._grid_states(grid)
+        return self._rebuild(grid, index, temp_squares, temp_before, False)
+
+
+    def _grid_states(self, grid: Grid) -> tuple[list[tuple[int, int]], list]:
+
+        """
+        Returns every square of the grid, and the state of each (see LayerStore.snapshot)
+
+        Args:
+        - self
+        - grid of Grid class
+
+        Raises:
+        - None
+
+        Returns:
+        - list of (x, y) squares, and the list of their states
+
+        Complexity:
+        - Worst case: O(x . y . other_function), where other_function is the complexity of snapshot of the LayerStore
+        - Best case: O(x . y . other_function)
+        """
+
+        temp_squares = []
+        temp_states = []
+        for row_index, row in enumerate(grid.snapshot()):
+            for col_index, state in enumerate(row):
+                temp_squares.append((row_index, col_index))
+                temp_states.append(state)
+        return temp_squares, temp_states
+
+
+    def _rebuild(self, grid: Grid, index: int, squares: list[tuple[int, int]], before: list, only_squares: bool) -> list[tuple[PaintAction, bool]]:
+
+        """
+        Brings the grid to the exact state at position index: the nearest checkpoint at or before index is restored,
+        and the actions after it are redone
+        - With only_squares, only the given squares are restored and redone; they must include every square that differs
+
+        Args:
+        - self
+        - grid of Grid class
+        - index: the history position to move to, there has to be a checkpoint at or before it
+        - squares: list of (x, y) squares the change is recorded for
+        - before: state of each square before the change
+        - only_squares: whether the rest of the grid is known to be in its state at index already
+
+        Raises:
+        - None
+
+        Returns:
+        - The (action, is_undo) entries of the change, as in seek
+
+        Complexity:
+        - Worst case: O(other_function + my_checkpoint_interval . action steps), other_function from restore of the grid
+        - Best case: O(len(squares) . other_function), other_function from the LayerStore
+        """
+
+        temp_checkpoint = self._checkpoint_before(index)
+        temp_start = temp_checkpoint.key - self.my_base
+
+        if not only_squares:
+            grid.restore(temp_checkpoint.value)
+            for position in range(temp_start, index):
+                self._action_at(position).redo_apply(grid)
+        else:
+            temp_store_type = type(grid[0][0])
+            for x, y in squares:
+                grid[x][y].restore(temp_store_type.EMPTY_STATE if temp_checkpoint.value is None else temp_checkpoint.value[x][y])
+
+            temp_squares = set(squares)
+            temp_layers = get_layers()
+            for position in range(temp_start, index):
+                temp_action = self._action_at(position)
+                if temp_action.is_special:
+                    for x, y in squares:
+                        grid[x][y].special()
+                    continue
+                temp_packed = temp_action.packed_steps
+                for step_index in range(0, len(temp_packed), 3):
+                    if (temp_packed[step_index], temp_packed[step_index + 1]) in temp_squares:
+                        grid[temp_packed[step_index]][temp_packed[step_index + 1]].add(temp_layers[temp_packed[step_index + 2]])
+
+        self.my_position = index
+        self.my_exact = True
+        self.my_squares_since_checkpoint = 0
+        self._record_position()
+        return self._diff_entries(grid, squares, before, [grid[x][y].snapshot() for x, y in squares])
+
+
+    def _checkpoint_before(self, index: int) -> ListItem|None:
+
+        """
+        Returns the newest checkpoint at or before the given position, or None if there is none
+
+        Args:
+        - self
+        - index: history position
+
+        Raises:
+        - None
+
+        Returns:
+        - ListItem of the checkpoint: the grid snapshot as value, its absolute history index as key
+
+        Complexity:
+        - Worst case: O(MAX_CHECKPOINTS)
+        - Best case: O(1)
+        """
+
+        temp_checkpoint = None
+        for checkpoint_index in range(len(self.my_checkpoints)):
+            if self.my_checkpoints[checkpoint_index].key > self.my_base + index:
+                break
+            temp_checkpoint = self.my_checkpoints[checkpoint_index]
+        return temp_checkpoint
+
+
+    def _has_special(self, start: int, end: int) -> bool:
+
+        """
+        Returns whether any action of the history between positions start (included) and end (excluded) is a special
+
+        Args:
+        - self
+        - start, end: history positions
+
+        Raises:
+        - None
+
+        Returns:
+        - bool
+
+        Complexity:
+        - Worst case: O(end - start)
+        - Best case: O(1), when the first one is a special
+        """
+
+        temp_spilled = len(self.my_spilled)
+        for position in range(start, end):
+            if position < temp_spilled:
+                if self.my_journal.is_special(self.my_spilled[position]):
+                    return True
+            elif self._is_special(self.my_history[position - temp_spilled]):
+                return True
+        return False
+
+
+    def _is_special(self, node: HistoryNode) -> bool:
+
+        """
+        Returns whether the action of a node is a special, from the flags of the journal if it is not in memory
+
+        Args:
+        - self
+        - node of HistoryNode class, not the root
+
+        Raises:
+        - None
+
+        Returns:
+        - bool
+
+        Complexity:
+        - Worst case: O(1)
+        - Best case: O(1)
+        """
+
+        if node.my_action is None and node.owner is self:
+            return self.my_journal.is_special(node.record)
+        return node.action.is_special
+
+
+    def _touched_squares(self, start: int, end: int) -> list[tuple[int, int]]:
+
+        """
+        Returns every square painted by the actions between positions start (included) and end (excluded), once each
+
+        Args:
+        - self
+        - start, end: history positions
+
+        Raises:
+        - None
+
+        Returns:
+        - list of (x, y) squares
+
+        Complexity:
+        - Worst case: O(total steps of the actions)
+        - Best case: O(end - start)
+        """
+
+        temp_squares = {}
+        for position in range(start, end):
+            temp_packed = self._action_at(position).packed_steps
+            for step_index in range(0, len(temp_packed), 3):
+                temp_squares[(temp_packed[step_index], temp_packed[step_index + 1])] = None
+        return list(temp_squares)
+
+
+    def _diff_entries(self, grid: Grid, squares: list[tuple[int, int]], before: list, after: list) -> list[tuple[PaintAction, bool]]:
+
+        """
+        Expresses the change of some squares between two states as paint actions: one erasing, one adding and possibly a special
+        - Used to record a seek for the ReplayTracker, which only knows how to play actions
+
+        Args:
+        - self
+        - grid of Grid class, the grid the states were taken from
+        - squares: list of (x, y) squares
+        - before: state of each square before the change (see LayerStore.snapshot)
+        - after: state of each square after the change
+
+        Raises:
+        - None
+
+        Returns:
+        - list of (action, is_undo) entries; the erasing action is played as an undo
+
+        Complexity:
+        - Worst case: O(len(squares) . other_function), where other_function is the complexity of diff_states of the LayerStore
+        - Best case: O(len(squares) . comp), when nothing changed
+        """
 
-        return None
+        temp_store_type = type(grid[0][0])
+        temp_erase_action = PaintAction([], False)
+        temp_add_action = PaintAction([], False)
+        temp_special = False
 
+        for square_index in range(len(squares)):
+            if before[square_index] == after[square_index]:
+                continue
+            x, y = squares[square_index]
+            temp_erase, temp_add, temp_flip = temp_store_type.diff_states(before[square_index], after[square_index])
+            for layer_index in temp_erase:
+                temp_erase_action.add_square(x, y, layer_index)
+            for layer_index in temp_add:
+                temp_add_action.add_square(x, y, layer_index)
+            temp_special = temp_special or temp_flip
 
-   
+        temp_entries = []
+        if temp_erase_action.step_count() != 0:
+            temp_entries.append((temp_erase_action, True))
+        if temp_add_action.step_count() != 0:
+            temp_entries.append((temp_add_action, False))
+        if temp_special:
+            temp_entries.append((PaintAction([], True), False))
+        return temp_entries
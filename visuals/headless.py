@@ -0,0 +1,31 @@
+"""
+Runs a visual script without a window, on a virtual clock (see render.run_headless),
+optionally writing every frame as a PNG:
+
+    python -m visuals.headless complex frames/
+"""
+
+import argparse
+import importlib
+import time
+from render import run_headless
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs a visual script without a window.")
+    parser.add_argument("script", help="name of the script in visuals/, e.g. basic")
+    parser.add_argument("output", nargs="?", help="directory to write frame_NNNNNN.png files to")
+    parser.add_argument("--every", type=int, default=1, help="frames played per frame written")
+    parser.add_argument("--scale", type=int, default=8, help="pixels per grid square")
+    args = parser.parse_args(argv)
+
+    module = importlib.import_module("visuals." + args.script)
+    for name, func in vars(module).items():
+        if name.startswith("test_") and callable(func):
+            start = time.perf_counter()
+            frames = run_headless(func, args.output, every=args.every, scale=args.scale)
+            print("{0}: {1} frames in {2:.2f} s".format(name, frames, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()